@@ -11,6 +11,13 @@ CREATE TABLE Suppliers (
     Lead_Time INT
 );
 
+-- Locations Table (branches; store stock is kept per location and supply)
+CREATE TABLE Locations (
+    Location_ID INT PRIMARY KEY AUTO_INCREMENT,
+    Name VARCHAR(100) NOT NULL,
+    UNIQUE INDEX ix_locations_name (Name)
+);
+
 -- Supplies Table
 CREATE TABLE Supplies (
     Supply_ID INT PRIMARY KEY AUTO_INCREMENT,
@@ -29,10 +36,27 @@ CREATE TABLE Supply_Orders (
     Supply_ID INT,
     Quantity_Received DECIMAL(10,2),
     Total_Cost DECIMAL(10,2),
+    Expiry_Date DATE,
     FOREIGN KEY (Supplier_ID) REFERENCES Suppliers(Supplier_ID) ON DELETE CASCADE,
     FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE
 );
 
+-- Supply Lots (one per delivery with its own expiry, consumed first-expired-first-out; see lots.py)
+CREATE TABLE Supply_Lots (
+    Lot_ID INT PRIMARY KEY AUTO_INCREMENT,
+    Supply_ID INT NOT NULL,
+    Order_ID INT,
+    Received_Date DATE,
+    Expiry_Date DATE,
+    Quantity_Received FLOAT NOT NULL,
+    Quantity_Remaining FLOAT NOT NULL,
+    Is_Open BOOLEAN NOT NULL,
+    INDEX ix_supply_lots_open_expiry (Is_Open, Expiry_Date),
+    INDEX ix_supply_lots_supply_open_expiry (Supply_ID, Is_Open, Expiry_Date),
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Order_ID) REFERENCES Supply_Orders(Order_ID) ON DELETE CASCADE
+);
+
 -- Usage Records Table
 CREATE TABLE Usage_Records (
     Usage_ID INT PRIMARY KEY AUTO_INCREMENT,
@@ -40,7 +64,9 @@ CREATE TABLE Usage_Records (
     Supply_ID INT,
     Quantity_Used DECIMAL(10,2),
     Location VARCHAR(50),
-    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE
+    Location_ID INT,
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Location_ID) REFERENCES Locations(Location_ID) ON DELETE SET NULL
 );
 
 -- Expenses Table
@@ -57,7 +83,9 @@ CREATE TABLE Store_Stock (
     Supply_ID INT,
     Quantity_Available DECIMAL(10,2),
     Last_Updated DATETIME,
-    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE
+    Location_ID INT,
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Location_ID) REFERENCES Locations(Location_ID) ON DELETE SET NULL
 );
 
 -- Restock Requests Table
@@ -67,7 +95,10 @@ CREATE TABLE Restock_Requests (
     Supply_ID INT,
     Quantity_Requested DECIMAL(10,2),
     Request_Type ENUM('Transfer from Inventory', 'Purchase from Supplier'),
-    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE
+    Location_ID INT,
+    Status ENUM('Open', 'Received') NOT NULL DEFAULT 'Received',
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Location_ID) REFERENCES Locations(Location_ID) ON DELETE SET NULL
 );
 
 -- Market Purchases Table
@@ -80,12 +111,151 @@ CREATE TABLE Market_Purchases (
     Category VARCHAR(50)
 );
 
+-- Daily Usage Rollup (maintained by the API; rebuild with `flask rebuild-usage-rollup`)
+CREATE TABLE Usage_Daily (
+    Day DATE NOT NULL,
+    Supply_ID INT NOT NULL,
+    Location VARCHAR(100) NOT NULL DEFAULT '',
+    Quantity_Used DOUBLE NOT NULL DEFAULT 0,
+    Record_Count INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (Day, Supply_ID, Location),
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE
+);
+
+-- Monthly Spend Cube over Expenses, Supply_Orders and Market_Purchases (maintained by the API; see spend.py)
+-- '' and 0 stand for no category and no supplier; frozen months are never changed again
+CREATE TABLE Spend_Monthly (
+    Month DATE NOT NULL,
+    Source VARCHAR(16) NOT NULL,
+    Category VARCHAR(50) NOT NULL DEFAULT '',
+    Supplier_ID INT NOT NULL DEFAULT 0,
+    Amount DOUBLE NOT NULL DEFAULT 0,
+    Record_Count INT NOT NULL DEFAULT 0,
+    Frozen BOOLEAN NOT NULL DEFAULT FALSE,
+    PRIMARY KEY (Month, Source, Category, Supplier_ID),
+    INDEX ix_spend_monthly_source_month (Source, Month),
+    INDEX ix_spend_monthly_frozen_month (Frozen, Month)
+);
+
+-- Table Versions (bumped by the API after every write; used for ETags; one row per table)
+CREATE TABLE Table_Versions (
+    Table_Name VARCHAR(64) PRIMARY KEY,
+    Version BIGINT NOT NULL DEFAULT 0
+);
+
+INSERT INTO Table_Versions (Table_Name, Version) VALUES
+    ('Change_Events', 0), ('Expenses', 0), ('Expenses_Archive', 0), ('Locations', 0), ('Market_Purchases', 0),
+    ('Restock_Requests', 0), ('Spend_Monthly', 0), ('Stock_Movements', 0), ('Store_Stock', 0), ('Suppliers', 0),
+    ('Supplies', 0), ('Supply_Lots', 0), ('Supply_Orders', 0), ('Usage_Daily', 0), ('Usage_Records', 0),
+    ('Usage_Records_Archive', 0);
+
+-- Change Events (row-level change feed for GET /events; written by the API)
+CREATE TABLE Change_Events (
+    Event_ID BIGINT PRIMARY KEY AUTO_INCREMENT,
+    Created_At DATETIME NOT NULL,
+    Table_Name VARCHAR(64) NOT NULL,
+    Action VARCHAR(16) NOT NULL,
+    Row_ID INT,
+    Payload TEXT,
+    INDEX ix_change_events_created_at (Created_At)
+);
+
+-- Stock Movements (append-only ledger behind Total_Quantity and Quantity_Available; see ledger.py)
+CREATE TABLE Stock_Movements (
+    Movement_ID BIGINT PRIMARY KEY AUTO_INCREMENT,
+    Created_At DATETIME NOT NULL,
+    Supply_ID INT NOT NULL,
+    Balance VARCHAR(16) NOT NULL,
+    Quantity FLOAT NOT NULL,
+    Reason VARCHAR(32) NOT NULL,
+    Source_Table VARCHAR(64),
+    Source_ID INT,
+    Location_ID INT,
+    Lot_ID INT,
+    INDEX ix_stock_movements_supply_balance (Supply_ID, Balance),
+    INDEX ix_stock_movements_source (Source_Table, Source_ID),
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Location_ID) REFERENCES Locations(Location_ID) ON DELETE SET NULL,
+    FOREIGN KEY (Lot_ID) REFERENCES Supply_Lots(Lot_ID) ON DELETE SET NULL
+);
+
+-- Archive tables: closed months moved out of Usage_Records and Expenses (see archive.py)
+CREATE TABLE Usage_Records_Archive (
+    Usage_ID INT PRIMARY KEY,
+    Date DATE,
+    Supply_ID INT,
+    Quantity_Used FLOAT,
+    Location VARCHAR(100),
+    Location_ID INT,
+    INDEX ix_usage_records_archive_date (Date),
+    INDEX ix_usage_records_archive_supply_date (Supply_ID, Date),
+    FOREIGN KEY (Supply_ID) REFERENCES Supplies(Supply_ID) ON DELETE CASCADE,
+    FOREIGN KEY (Location_ID) REFERENCES Locations(Location_ID) ON DELETE SET NULL
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE Expenses_Archive (
+    Expense_ID INT PRIMARY KEY,
+    Date DATE,
+    Category VARCHAR(50),
+    Amount FLOAT,
+    INDEX ix_expenses_archive_date_category (Date, Category)
+) ROW_FORMAT=COMPRESSED;
+
+-- Indexes for the date-range, supply and category filters (migrations/0002_hot_path_indexes.py)
+CREATE INDEX ix_supplies_expiry_date ON Supplies (Expiry_Date);
+CREATE INDEX ix_supply_orders_date ON Supply_Orders (Date);
+CREATE INDEX ix_usage_records_supply_date ON Usage_Records (Supply_ID, Date);
+CREATE INDEX ix_usage_records_date ON Usage_Records (Date);
+CREATE INDEX ix_expenses_date_category ON Expenses (Date, Category);
+CREATE INDEX ix_store_stock_supply ON Store_Stock (Supply_ID);
+CREATE INDEX ix_store_stock_quantity ON Store_Stock (Quantity_Available);
+CREATE INDEX ix_restock_requests_date ON Restock_Requests (Date);
+CREATE INDEX ix_market_purchases_date ON Market_Purchases (Date);
+
+-- Per-location index ranges (migrations/0005_locations.py)
+CREATE UNIQUE INDEX ix_store_stock_location_supply ON Store_Stock (Location_ID, Supply_ID);
+CREATE INDEX ix_store_stock_location_quantity ON Store_Stock (Location_ID, Quantity_Available);
+CREATE INDEX ix_restock_requests_location ON Restock_Requests (Location_ID);
+CREATE INDEX ix_usage_daily_location_day ON Usage_Daily (Location, Day);
+
+-- Latest order per supply for the reorder plan (migrations/0008_supply_orders_supply_index.py)
+CREATE INDEX ix_supply_orders_supply_order ON Supply_Orders (Supply_ID, Order_ID);
+
+-- Open restock requests per supply, the reorder plan's scheduled receipts (migrations/0013_restock_status.py)
+CREATE INDEX ix_restock_requests_status_supply ON Restock_Requests (Status, Supply_ID);
+
+-- Schema Migrations (this script creates the schema of every migration below)
+CREATE TABLE Schema_Migrations (
+    Revision VARCHAR(32) PRIMARY KEY,
+    Description VARCHAR(200),
+    Applied_At DATETIME NOT NULL
+);
+
+INSERT INTO Schema_Migrations (Revision, Description, Applied_At) VALUES
+    ('0001', 'baseline schema', NOW()),
+    ('0002', 'hot path indexes', NOW()),
+    ('0003', 'change events', NOW()),
+    ('0004', 'stock movements ledger', NOW()),
+    ('0005', 'locations', NOW()),
+    ('0006', 'usage and expenses archive', NOW()),
+    ('0007', 'supply lots', NOW()),
+    ('0008', 'supply orders supply index', NOW()),
+    ('0009', 'spend cube', NOW()),
+    ('0010', 'unique store stock per location', NOW()),
+    ('0011', 'seed table versions', NOW()),
+    ('0012', 'sqlite foreign keys', NOW()),
+    ('0013', 'restock status', NOW());
+
 -- Sample Data
 INSERT INTO Suppliers (Name, Contact, Lead_Time) VALUES
     ('Fresh Produce Co.', '123-456-7890', 5),
     ('Dairy Partners', '987-654-3210', 3),
     ('Syrup & Co.', '456-789-0123', 4);
 
+INSERT INTO Locations (Name) VALUES
+    ('Main Store'),
+    ('Branch A');
+
 INSERT INTO Supplies (Name, Category, Expiry_Date, Total_Quantity, Cost_Per_Unit) VALUES
     ('Green Tea Leaves', 'Tea', '2025-12-31', 100.00, 5.50),
     ('Milk', 'Dairy', '2025-06-01', 50.00, 3.20),
@@ -95,22 +265,62 @@ INSERT INTO Supply_Orders (Date, Supplier_ID, Supply_ID, Quantity_Received, Tota
     ('2025-04-01', 1, 1, 30.00, 165.00),
     ('2025-04-02', 2, 2, 25.00, 80.00);
 
-INSERT INTO Usage_Records (Date, Supply_ID, Quantity_Used, Location) VALUES
-    ('2025-04-10', 1, 10.00, 'Main Store'),
-    ('2025-04-11', 2, 5.00, 'Branch A');
+INSERT INTO Usage_Records (Date, Supply_ID, Quantity_Used, Location, Location_ID) VALUES
+    ('2025-04-10', 1, 10.00, 'Main Store', 1),
+    ('2025-04-11', 2, 5.00, 'Branch A', 2);
 
 INSERT INTO Expenses (Date, Category, Amount) VALUES
     ('2025-04-01', 'Supply Purchase', 165.00),
     ('2025-04-02', 'Supply Purchase', 80.00);
 
-INSERT INTO Store_Stock (Supply_ID, Quantity_Available, Last_Updated) VALUES
-    (1, 90.00, '2025-04-12 10:00:00'),
-    (2, 45.00, '2025-04-12 10:00:00');
+INSERT INTO Store_Stock (Supply_ID, Location_ID, Quantity_Available, Last_Updated) VALUES
+    (1, 1, 90.00, '2025-04-12 10:00:00'),
+    (2, 2, 45.00, '2025-04-12 10:00:00');
 
-INSERT INTO Restock_Requests (Date, Supply_ID, Quantity_Requested, Request_Type) VALUES
-    ('2025-04-12', 1, 20.00, 'Purchase from Supplier'),
-    ('2025-04-13', 2, 10.00, 'Transfer from Inventory');
+INSERT INTO Restock_Requests (Date, Supply_ID, Quantity_Requested, Request_Type, Location_ID) VALUES
+    ('2025-04-12', 1, 20.00, 'Purchase from Supplier', 1),
+    ('2025-04-13', 2, 10.00, 'Transfer from Inventory', 2);
 
 INSERT INTO Market_Purchases (Date, Item_Name, Quantity, Cost, Category) VALUES
     ('2025-04-10', 'Strawberries', 5.00, 25.00, 'Fruits'),
     ('2025-04-11', 'Honey', 2.00, 15.00, 'Sweeteners');
+
+INSERT INTO Usage_Daily (Day, Supply_ID, Location, Quantity_Used, Record_Count)
+SELECT Date, Supply_ID, COALESCE(Location, ''), SUM(Quantity_Used), COUNT(*)
+FROM Usage_Records
+GROUP BY Date, Supply_ID, COALESCE(Location, '');
+
+INSERT INTO Spend_Monthly (Month, Source, Category, Supplier_ID, Amount, Record_Count)
+SELECT DATE_FORMAT(Date, '%Y-%m-01'), 'expenses', COALESCE(Category, ''), 0, SUM(Amount), COUNT(*)
+FROM Expenses
+GROUP BY DATE_FORMAT(Date, '%Y-%m-01'), COALESCE(Category, '')
+UNION ALL
+SELECT DATE_FORMAT(o.Date, '%Y-%m-01'), 'orders', COALESCE(s.Category, ''), COALESCE(o.Supplier_ID, 0),
+       SUM(o.Total_Cost), COUNT(*)
+FROM Supply_Orders o
+LEFT JOIN Supplies s ON s.Supply_ID = o.Supply_ID
+GROUP BY DATE_FORMAT(o.Date, '%Y-%m-01'), COALESCE(s.Category, ''), COALESCE(o.Supplier_ID, 0)
+UNION ALL
+SELECT DATE_FORMAT(Date, '%Y-%m-01'), 'purchases', COALESCE(Category, ''), 0, SUM(Cost), COUNT(*)
+FROM Market_Purchases
+GROUP BY DATE_FORMAT(Date, '%Y-%m-01'), COALESCE(Category, '');
+
+-- Open the stock ledger at the sample balances
+INSERT INTO Stock_Movements (Created_At, Supply_ID, Balance, Quantity, Reason)
+SELECT NOW(), Supply_ID, 'inventory', Total_Quantity, 'adjustment'
+FROM Supplies
+WHERE Total_Quantity <> 0;
+
+INSERT INTO Stock_Movements (Created_At, Supply_ID, Balance, Location_ID, Quantity, Reason)
+SELECT NOW(), Supply_ID, 'store', Location_ID, SUM(Quantity_Available), 'adjustment'
+FROM Store_Stock
+GROUP BY Supply_ID, Location_ID;
+
+-- Stock on hand as one opening lot per supply
+INSERT INTO Supply_Lots (Supply_ID, Received_Date, Expiry_Date, Quantity_Received, Quantity_Remaining, Is_Open)
+SELECT s.Supply_ID, CURDATE(), s.Expiry_Date,
+       s.Total_Quantity + COALESCE(st.Quantity, 0), s.Total_Quantity + COALESCE(st.Quantity, 0), TRUE
+FROM Supplies s
+LEFT JOIN (SELECT Supply_ID, SUM(Quantity_Available) AS Quantity FROM Store_Stock GROUP BY Supply_ID) st
+    ON st.Supply_ID = s.Supply_ID
+WHERE s.Total_Quantity + COALESCE(st.Quantity, 0) > 0;
@@ -1,4 +1,5 @@
 const API = "http://127.0.0.1:5000";
+const PAGE_SIZE = 500;
 let inventoryChart = null, expenseChart = null, trendChart = null, predictionChart = null, supplierChart = null;
 
 window.addEventListener("DOMContentLoaded", () => {
@@ -41,8 +42,59 @@ window.addEventListener("DOMContentLoaded", () => {
   
   // Update calendar display with the correct current date
   updateCalendarDisplay();
+  
+  // Refresh panels as other users' changes are committed
+  subscribeToChanges();
 });
 
+// Panels to reload when a table changes, as pushed by the /events feed
+const CHANGE_HANDLERS = {
+  Supplies: [loadSupplies, populateDropdowns, loadExpiringItems, loadDashboardSummary],
+  Suppliers: [loadSuppliers, populateDropdowns],
+  Expenses: [loadExpenses, loadSpendingTrends, loadDashboardSummary],
+  Usage_Records: [loadUsageRecords, loadStockAlerts, predictInventoryNeeds, loadDashboardSummary],
+  Supply_Orders: [loadSupplyOrders, loadDashboardSummary],
+  Store_Stock: [loadStoreStock, loadStockAlerts, loadExpiringItems, predictInventoryNeeds, loadDashboardSummary],
+  Restock_Requests: [loadRestockRequests, loadDashboardSummary],
+  Market_Purchases: [loadMarketPurchases, loadDashboardSummary]
+};
+
+// EventSource reconnects by itself and resumes from the last event id. Bursts
+// of changes (e.g. a bulk import) are coalesced into one reload per panel.
+// List panels reload from one /sync delta; the rest are cheap conditional
+// requests thanks to the ETag cache. A server with no room for another stream
+// answers 503, which closes the source for good: subscribe again later, and
+// reload everything once back since the events in between were not seen.
+function subscribeToChanges(resubscribed = false) {
+  if (!window.EventSource) return;
+  const pending = new Set();
+  let timer = null;
+  const schedule = handlers => {
+    handlers.forEach(fn => pending.add(fn));
+    clearTimeout(timer);
+    timer = setTimeout(() => {
+      pending.forEach(fn => fn());
+      pending.clear();
+    }, 300);
+  };
+  const source = new EventSource(`${API}/events`);
+  source.addEventListener("change", e => {
+    const change = JSON.parse(e.data);
+    schedule(CHANGE_HANDLERS[change.table] || []);
+  });
+  // Missed events were pruned: reload everything
+  source.addEventListener("reset", () => schedule(Object.values(CHANGE_HANDLERS).flat()));
+  source.onopen = () => {
+    if (resubscribed) schedule(Object.values(CHANGE_HANDLERS).flat());
+    resubscribed = false;
+  };
+  source.onerror = () => {
+    if (source.readyState === EventSource.CLOSED) {
+      setTimeout(() => subscribeToChanges(true), 30000);
+    }
+  };
+}
+
 function updateCalendarDisplay() {
   const calendarBadge = document.getElementById("current-date-badge");
   if (calendarBadge) {
@@ -71,8 +123,7 @@ function setDefaultDates() {
 
 function populateDropdowns() {
   // Populate supply dropdowns
-  fetch(`${API}/supplies`)
-    .then(res => res.json())
+  fetchAll("supplies")
     .then(data => {
       const supplies = Array.isArray(data) ? data : (data.items || []);
       ["usage-supply-id", "order-supply-id", "stock-supply-id", "restock-supply-id"]
@@ -88,8 +139,7 @@ function populateDropdowns() {
     });
   
   // Populate supplier dropdowns
-  fetch(`${API}/suppliers`)
-    .then(res => res.json())
+  fetchAll("suppliers")
     .then(data => {
       const suppliers = Array.isArray(data) ? data : (data.items || []);
       const select = document.getElementById("order-supplier-id");
@@ -102,9 +152,144 @@ function populateDropdowns() {
     });
 }
 
-function fetchList(endpoint, elementId, builder, chartCallback = null) {
-  fetch(`${API}/${endpoint}`)
+// GET with conditional requests: remember each URL's ETag and body, send
+// If-None-Match, and reuse the stored body when the server answers 304
+const etagCache = new Map();
+
+function fetchJSON(url) {
+  const cached = etagCache.get(url);
+  const headers = cached ? { "If-None-Match": cached.etag } : {};
+  return fetch(url, { headers, cache: "no-store" })
+    .then(res => {
+      if (res.status === 304 && cached) return cached.data;
+      return res.json().then(data => {
+        const etag = res.headers.get("ETag");
+        if (res.ok && etag) etagCache.set(url, { etag, data });
+        return data;
+      });
+    });
+}
+
+// The list tables are kept in a local store brought up to date by /sync,
+// which sends only the rows changed since the last token (plus the ids of
+// deleted ones), so panels sharing a table no longer download it each
+const SYNCED_LISTS = {
+  supplies: { table: "Supplies", key: "Supply_ID" },
+  suppliers: { table: "Suppliers", key: "Supplier_ID" },
+  expenses: { table: "Expenses", key: "Expense_ID", date: "Date" },
+  usage: { table: "Usage_Records", key: "Usage_ID", date: "Date" },
+  orders: { table: "Supply_Orders", key: "Order_ID", date: "Date" },
+  stock: { table: "Store_Stock", key: "Stock_ID" },
+  restocks: { table: "Restock_Requests", key: "Request_ID", date: "Date" },
+  purchases: { table: "Market_Purchases", key: "Purchase_ID", date: "Date" }
+};
+const SYNC_KEYS = Object.fromEntries(Object.values(SYNCED_LISTS).map(l => [l.table, l.key]));
+const SYNC_TABLES = Object.keys(SYNC_KEYS).join(",");
+const SYNC_STORAGE_KEY = `greatea-sync:${API}`;
+const store = loadStore();
+let syncing = null;
+
+// The store survives page loads in localStorage, so a reload only asks for
+// the changes since its token. A store saved for other tables, or one that
+// cannot be read, is dropped and the next /sync sends a snapshot.
+function loadStore() {
+  try {
+    const saved = JSON.parse(localStorage.getItem(SYNC_STORAGE_KEY));
+    if (saved && saved.synced === SYNC_TABLES) {
+      const tables = {};
+      Object.entries(saved.tables).forEach(([table, rows]) => {
+        tables[table] = new Map(rows.map(row => [row[SYNC_KEYS[table]], row]));
+      });
+      return { token: saved.token, cursor: saved.cursor, tables };
+    }
+  } catch (e) { /* no usable copy */ }
+  return { token: null, cursor: null, tables: {} };
+}
+
+// A store too large for localStorage is not kept; the next page load starts
+// from a snapshot again
+function saveStore() {
+  const tables = {};
+  Object.entries(store.tables).forEach(([table, rows]) => { tables[table] = [...rows.values()]; });
+  try {
+    localStorage.setItem(SYNC_STORAGE_KEY, JSON.stringify({
+      synced: SYNC_TABLES, token: store.token, cursor: store.cursor, tables
+    }));
+  } catch (e) {
+    try { localStorage.removeItem(SYNC_STORAGE_KEY); } catch (ignored) { /* storage unavailable */ }
+  }
+}
+
+// One /sync at a time; callers arriving while it runs share it
+function syncStore() {
+  if (!syncing) syncing = pullChanges().then(saveStore).finally(() => { syncing = null; });
+  return syncing;
+}
+
+// Whole tables arrive a page at a time: the first page replaces the local
+// copy, the rest add to it until the cursor runs out
+function pullChanges() {
+  const query = new URLSearchParams({ tables: SYNC_TABLES });
+  if (store.token !== null) query.set("since", store.token);
+  if (store.cursor) query.set("cursor", store.cursor);
+  return fetch(`${API}/sync?${query}`, { cache: "no-store" })
     .then(res => res.json())
+    .then(data => {
+      if (data.error) {
+        // e.g. a cursor this server cannot resume: start over from a snapshot
+        Object.assign(store, { token: null, cursor: null, tables: {} });
+        throw new Error(data.error);
+      }
+      if (data.reset) store.tables = {};
+      Object.entries(data.tables).forEach(([table, change]) => {
+        const rows = change.complete ? new Map() : (store.tables[table] || new Map());
+        change.rows.forEach(row => rows.set(row[SYNC_KEYS[table]], row));
+        change.deleted.forEach(id => rows.delete(id));
+        store.tables[table] = rows;
+      });
+      store.token = data.token;
+      store.cursor = data.cursor;
+      if (data.more) return pullChanges();
+    });
+}
+
+// A synced table's rows as the list endpoint returns them: with the supply and
+// supplier names, in (Date, id) order
+function syncedRows(endpoint) {
+  const { table, key, date } = SYNCED_LISTS[endpoint];
+  const supplies = store.tables.Supplies || new Map();
+  const suppliers = store.tables.Suppliers || new Map();
+  return [...(store.tables[table] || new Map()).values()]
+    .map(row => {
+      const names = {};
+      if (table !== "Supplies" && "Supply_ID" in row) names.Supply_Name = supplies.get(row.Supply_ID)?.Name ?? null;
+      if (table !== "Suppliers" && "Supplier_ID" in row) names.Supplier_Name = suppliers.get(row.Supplier_ID)?.Name ?? null;
+      return { ...row, ...names };
+    })
+    .sort((a, b) => (date ? (a[date] || "").localeCompare(b[date] || "") : 0) || a[key] - b[key]);
+}
+
+// List endpoints are cursor-paginated; follow next_cursor until the list is complete
+function fetchAll(endpoint, params = {}) {
+  if (SYNCED_LISTS[endpoint] && !Object.keys(params).length) {
+    return syncStore().then(() => syncedRows(endpoint));
+  }
+  const items = [];
+  const fetchPage = cursor => {
+    const query = new URLSearchParams({ limit: PAGE_SIZE, ...params });
+    if (cursor) query.set("cursor", cursor);
+    return fetchJSON(`${API}/${endpoint}?${query}`)
+      .then(data => {
+        if (data.error) throw new Error(data.error);
+        items.push(...(Array.isArray(data) ? data : (data.items || [])));
+        return data.next_cursor ? fetchPage(data.next_cursor) : items;
+      });
+  };
+  return fetchPage(null);
+}
+
+function fetchList(endpoint, elementId, builder, chartCallback = null) {
+  fetchAll(endpoint)
     .then(data => {
       const items = Array.isArray(data) ? data : (data.items || []);
       const el = document.getElementById(elementId);
@@ -428,13 +613,27 @@ function loadRestockRequests() {
         Date: ${r.Date || 'N/A'}, 
         Supply: ${r.Supply_Name || `ID: ${r.Supply_ID}` || 'N/A'}, 
         Qty: ${r.Quantity_Requested || 0}, 
-        Type: ${r.Request_Type || 'N/A'}
+        Type: ${r.Request_Type || 'N/A'},
+        Status: ${r.Status || 'Received'}
         <button class='btn btn-sm btn-danger float-end' onclick="deleteItem('restocks', ${r.Request_ID}, loadRestockRequests)">Delete</button>
+        ${r.Status === 'Open' ? `<button class='btn btn-sm btn-success float-end me-2' onclick="receiveRestock(${r.Request_ID})">Receive</button>` : ''}
       </div>
     </div>`
   );
 }
 
+// The goods of an open restock request arrived; the change feed reloads the
+// panels whose stock moved
+function receiveRestock(id) {
+  fetch(`${API}/restocks/${id}/receive`, { method: "POST" })
+    .then(response => response.json().then(data => {
+      if (!response.ok) throw new Error(data.error || `HTTP error! Status: ${response.status}`);
+      showToast("Success", "Restock received.");
+      loadRestockRequests();
+    }))
+    .catch(err => showToast("Error", err.message, "error"));
+}
+
 function loadMarketPurchases() {
   fetchList("purchases", "purchase-list", p => `
     <div class='card shadow-sm mb-2'>
@@ -451,8 +650,7 @@ function loadMarketPurchases() {
 
 // Advanced Functions
 function updateStats() {
-  fetch(`${API}/supplies`)
-    .then(res => res.json())
+  fetchAll("supplies")
     .then(data => {
       const items = Array.isArray(data) ? data : (data.items || []);
       const totalItems = items.length;
@@ -468,8 +666,7 @@ function updateStats() {
 }
 
 function loadDashboardSummary() {
-  fetch(`${API}/dashboard/summary`)
-    .then(res => res.json())
+  fetchJSON(`${API}/dashboard/summary`)
     .then(data => {
       if (data.error) return;
       
@@ -515,8 +712,7 @@ function loadDashboardSummary() {
 }
 
 function loadExpiringItems() {
-  fetch(`${API}/analytics/expiring-soon`)
-    .then(res => res.json())
+  fetchJSON(`${API}/analytics/expiring-soon`)
     .then(data => {
       const container = document.getElementById("expiring-items");
       if (!container) return;
@@ -563,8 +759,7 @@ function loadExpiringItems() {
 }
 
 function loadStockAlerts() {
-  fetch(`${API}/analytics/stock-alerts`)
-    .then(res => res.json())
+  fetchJSON(`${API}/analytics/stock-alerts`)
     .then(data => {
       const container = document.getElementById("stock-alerts");
       if (!container) return;
@@ -581,7 +776,7 @@ function loadStockAlerts() {
           <table class="table table-striped table-hover">
             <thead class="table-dark">
               <tr>
-                <th>Name</th><th>Category</th><th>Current Stock</th>
+                <th>Name</th><th>Category</th><th>Location</th><th>Current Stock</th>
                 <th>Daily Usage</th><th>Days Remaining</th><th>Status</th>
               </tr>
             </thead>
@@ -596,6 +791,7 @@ function loadStockAlerts() {
           <tr>
             <td>${item.Name}</td>
             <td>${item.Category || 'N/A'}</td>
+            <td>${item.Location || 'Unassigned'}</td>
             <td>${item.Current_Stock}</td>
             <td>${item.Daily_Usage}</td>
             <td>${item.Days_Remaining}</td>
@@ -609,8 +805,7 @@ function loadStockAlerts() {
 }
 
 function loadSpendingTrends() {
-  fetch(`${API}/analytics/spending-trends`)
-    .then(res => res.json())
+  fetchJSON(`${API}/analytics/spending-trends`)
     .then(data => {
       if (data.error || !data.trends) return;
       
@@ -699,13 +894,13 @@ function renderChart(canvasId, labels, data, title, chartType = 'bar', backgroun
 
 // ----- NEW ADVANCED FUNCTIONS -----
 
-// Predict inventory needs based on historical usage data
+// Predict inventory needs; the server computes usage series and forecasts for every supply
 function predictInventoryNeeds() {
-  fetch(`${API}/usage`)
-    .then(res => res.json())
+  fetchJSON(`${API}/analytics/forecast`)
     .then(data => {
-      const usageRecords = Array.isArray(data) ? data : (data.items || []);
-      if (usageRecords.length === 0) {
+      if (data.error) throw new Error(data.error);
+      const predictions = data.forecasts || [];
+      if (predictions.length === 0) {
         const container = document.getElementById("prediction-results");
         if (container) {
           container.innerHTML = `<div class="alert alert-warning">Not enough usage data for predictions. Please record more usage.</div>`;
@@ -713,91 +908,11 @@ function predictInventoryNeeds() {
         return;
       }
       
-      // Group usage by Supply_ID
-      const usageBySupply = usageRecords.reduce((acc, record) => {
-        const supplyId = record.Supply_ID;
-        if (!acc[supplyId]) {
-          acc[supplyId] = [];
-        }
-        acc[supplyId].push({
-          date: new Date(record.Date),
-          quantity: record.Quantity_Used || 0,
-          supply_name: record.Supply_Name || `ID: ${supplyId}`
-        });
-        return acc;
-      }, {});
-      
-      // Calculate average daily usage and predict needs for next 30 days
-      const predictions = [];
-      let processedSupplies = 0;
-      const totalSupplies = Object.keys(usageBySupply).length;
-      
-      Object.keys(usageBySupply).forEach(supplyId => {
-        const usageData = usageBySupply[supplyId];
-        
-        // Sort by date
-        usageData.sort((a, b) => a.date - b.date);
-        
-        // Calculate date range
-        const firstDate = usageData[0].date;
-        const lastDate = usageData[usageData.length - 1].date;
-        const daysDifference = Math.max(1, Math.ceil((lastDate - firstDate) / (1000 * 60 * 60 * 24)));
-        
-        // Calculate total usage
-        const totalUsage = usageData.reduce((sum, record) => sum + record.quantity, 0);
-        
-        // Calculate average daily usage
-        const avgDailyUsage = totalUsage / daysDifference;
-        
-        // Get current stock
-        fetch(`${API}/stock?supply_id=${supplyId}`)
-          .then(res => res.json())
-          .then(stockData => {
-            const items = Array.isArray(stockData) ? stockData : (stockData.items || []);
-            const currentStock = items.length > 0 ? (items[0].Quantity_Available || 0) : 0;
-            
-            // Calculate days until reorder needed (assuming reorder point is 30% of current stock)
-            const reorderPoint = currentStock * 0.3;
-            const daysUntilReorder = avgDailyUsage > 0 ? 
-              Math.floor((currentStock - reorderPoint) / avgDailyUsage) : 
-              999; // If no usage, set to a high number
-            
-            // Predict needs for next 30 days
-            const predictedNeed = avgDailyUsage * 30;
-            
-            predictions.push({
-              supply_id: parseInt(supplyId),
-              supply_name: usageData[0].supply_name,
-              avg_daily_usage: avgDailyUsage,
-              current_stock: currentStock,
-              days_until_reorder: daysUntilReorder,
-              predicted_30day_need: predictedNeed,
-              reorder_status: daysUntilReorder <= 7 ? 'Critical' : 
-                             daysUntilReorder <= 14 ? 'Warning' : 'Good'
-            });
-            
-            processedSupplies++;
-            
-            // When all supplies have been processed, display predictions
-            if (processedSupplies === totalSupplies) {
-              displayPredictions(predictions);
-              renderPredictionChart(predictions);
-            }
-          })
-          .catch(err => {
-            console.error(`Error fetching stock data for supply ID ${supplyId}:`, err);
-            processedSupplies++;
-            
-            // If all supplies have been processed despite errors, display predictions
-            if (processedSupplies === totalSupplies) {
-              displayPredictions(predictions);
-              renderPredictionChart(predictions);
-            }
-          });
-      });
+      displayPredictions(predictions);
+      renderPredictionChart(predictions);
     })
     .catch(err => {
-      console.error("Error fetching usage data:", err);
+      console.error("Error fetching forecast data:", err);
       const container = document.getElementById("prediction-results");
       if (container) {
         container.innerHTML = `<div class="alert alert-danger">Error fetching data: ${err.message}</div>`;
@@ -962,8 +1077,7 @@ function createRestockRequest(supplyId, quantity) {
 
 // Supplier Performance Analysis
 function analyzeSupplierPerformance() {
-  fetch(`${API}/orders`)
-    .then(res => res.json())
+  fetchAll("orders")
     .then(data => {
       const orders = Array.isArray(data) ? data : (data.items || []);
       if (orders.length === 0) {
@@ -1158,18 +1272,14 @@ function renderSupplierChart(supplierData) {
   });
 }
 
-// Analyze expense trends over time
+// Analyze expense trends over time, from the server's spend cube: expenses
+// and market purchases per month and category, summed in one small request
 function analyzeExpenseTrends() {
-  // Fetch both expenses and purchases, which contribute to total expenses
-  Promise.all([
-    fetch(`${API}/expenses`).then(res => res.json()),
-    fetch(`${API}/purchases`).then(res => res.json())
-  ])
-  .then(([expensesData, purchasesData]) => {
-    const expenses = Array.isArray(expensesData) ? expensesData : (expensesData.items || []);
-    const purchases = Array.isArray(purchasesData) ? purchasesData : (purchasesData.items || []);
+  fetchJSON(`${API}/analytics/spend?group_by=month,category&source=expenses,purchases`)
+  .then(data => {
+    const rows = data.rows || [];
     
-    if (expenses.length === 0 && purchases.length === 0) {
+    if (rows.length === 0) {
       const container = document.getElementById("expense-analysis");
       if (container) {
         container.innerHTML = `<div class="alert alert-warning">Not enough expense data for analysis. Please record more expenses.</div>`;
@@ -1177,46 +1287,23 @@ function analyzeExpenseTrends() {
       return;
     }
     
-    // Combine expenses and purchases
-    const allExpenses = [
-      ...expenses.map(e => ({
-        date: new Date(e.Date),
-        category: e.Category || 'Uncategorized',
-        amount: e.Amount || 0,
-        type: 'expense'
-      })),
-      ...purchases.map(p => ({
-        date: new Date(p.Date),
-        category: p.Category || 'Uncategorized',
-        amount: p.Cost || 0,
-        type: 'purchase'
-      }))
-    ];
-    
-    // Sort by date
-    allExpenses.sort((a, b) => a.date - b.date);
-    
-    // Group expenses by month and category
+    // Group the cells by month, with every category in every month
     const monthlyExpensesByCategory = {};
     const categories = new Set();
+    const monthlyTotals = {};
+    const categoryTotals = {};
     
-    allExpenses.forEach(expense => {
-      const yearMonth = `${expense.date.getFullYear()}-${(expense.date.getMonth() + 1).toString().padStart(2, '0')}`;
-      if (!monthlyExpensesByCategory[yearMonth]) {
-        monthlyExpensesByCategory[yearMonth] = {};
-      }
-      
-      const category = expense.category;
+    rows.forEach(row => {
+      const category = row.category || 'Uncategorized';
       categories.add(category);
-      
-      if (!monthlyExpensesByCategory[yearMonth][category]) {
-        monthlyExpensesByCategory[yearMonth][category] = 0;
+      if (!monthlyExpensesByCategory[row.month]) {
+        monthlyExpensesByCategory[row.month] = {};
       }
-      
-      monthlyExpensesByCategory[yearMonth][category] += expense.amount;
+      monthlyExpensesByCategory[row.month][category] = (monthlyExpensesByCategory[row.month][category] || 0) + row.total;
+      monthlyTotals[row.month] = (monthlyTotals[row.month] || 0) + row.total;
+      categoryTotals[category] = (categoryTotals[category] || 0) + row.total;
     });
     
-    // Convert to array format for chart
     const monthlyExpensesData = Object.keys(monthlyExpensesByCategory).map(yearMonth => {
       const monthData = { month: yearMonth };
       categories.forEach(category => {
@@ -1225,22 +1312,6 @@ function analyzeExpenseTrends() {
       return monthData;
     });
     
-    // Calculate monthly totals and category totals
-    const monthlyTotals = {};
-    const categoryTotals = {};
-    
-    monthlyExpensesData.forEach(month => {
-      const total = Array.from(categories).reduce((sum, category) => sum + (month[category] || 0), 0);
-      monthlyTotals[month.month] = total;
-      
-      categories.forEach(category => {
-        if (!categoryTotals[category]) {
-          categoryTotals[category] = 0;
-        }
-        categoryTotals[category] += (month[category] || 0);
-      });
-    });
-    
     // Display expense analysis
     displayExpenseAnalysis(monthlyExpensesData, monthlyTotals, categoryTotals);
   })
@@ -1,44 +1,94 @@
-from flask import Flask, request, jsonify
+from flask import Blueprint, Flask, Response, current_app, request, jsonify, stream_with_context, send_file, url_for
 from flask_cors import CORS
-from config import Config
-from models import db, Supplies, Suppliers, Expenses, UsageRecords, SupplyOrders, StoreStock, RestockRequests, MarketPurchases
+from config import get_config
+from models import db, Supplies, Suppliers, Locations, Expenses, UsageRecords, SupplyOrders, StoreStock, RestockRequests, MarketPurchases, UsageDaily, StockMovements, SupplyLots, UsageRecordsArchive, ExpensesArchive, SpendMonthly, serialization_options
+from pagination import QueryParamError, apply_filters, keyset_page, int_arg, float_arg, location_id
+from forecast import forecast
+from planner import reorder_plan, write_restocks
+from cache import response_cache, cached
+from etags import conditional
+from pooling import read_replica, pool_status
+from metrics import metrics
+from jobs import JobError, JobQueueFull, job_runner
+from changefeed import change_feed
+from sync import sync, sync_cursor, sync_tables
+from serialize import requested_fields, row_statement, row_dicts, json_response
+from exports import EXPORTS, export_statements, generate_ndjson, generate_csv
+from rollups import apply_usage, back_out_usage, rebuild_usage_rollup
+from spend import (ClosedMonthError, SPEND_MODELS, apply_spend, back_out_spend, rebuild_spend_cube, freeze_spend_months,
+                   spend_slice, spend_dimensions, spend_sources, spend_month)
+from lots import open_lots, receive_orders, allocate_lots, release_lots
+from ledger import INVENTORY, STORE, usage_movements, order_movements, restock_movements, record_movements, ledger_drift, reconcile_ledger
+from migrate import upgrade, pending_migrations, schema_drift
+from seed import PROFILES, seed
+from bulk import BULK_TABLES, MAX_BULK_ROWS, BulkPayloadError, read_payload, validate_rows, insert_rows, resolve_locations
+from archive import archive_cutoff, archive_before
 from datetime import datetime, timedelta
-from sqlalchemy import func, desc
+from sqlalchemy import and_, func, desc, delete, select
+from sqlalchemy.exc import IntegrityError
+import click
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-db.init_app(app)
-CORS(app)
+# Routes, error handlers and CLI commands, registered on the app by create_app()
+api = Blueprint('api', __name__, cli_group=None)
 
-@app.route('/')
+@api.route('/')
 def home():
     return "Greatea Inventory API is running."
 
 # Error Handlers
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({'error': 'Resource not found'}), 404
 
-@app.errorhandler(500)
+@api.app_errorhandler(500)
 def server_error(error):
     return jsonify({'error': 'Internal server error'}), 500
 
+@api.app_errorhandler(QueryParamError)
+def bad_query_param(error):
+    return jsonify({'error': str(error)}), 400
+
+# Spend written into a month frozen by freeze-spend-months
+@api.app_errorhandler(ClosedMonthError)
+def closed_month(error):
+    return jsonify({'error': str(error)}), 400
+
+# Paginated list response shared by every GET list route.
+# Dated tables page on (Date, primary key), the rest on the primary key alone.
+# Pages are read as plain rows of the requested ?fields= and encoded with
+# orjson; LIST_SERIALIZER=orm builds model instances and to_dict() instead.
+def list_response(model, order_columns, date_column=None):
+    fields = requested_fields(model)
+    if current_app.config['LIST_SERIALIZER'] == 'orm':
+        query = apply_filters(model.query.options(*serialization_options(model)), model, date_column)
+        rows, next_cursor = keyset_page(query, order_columns)
+        items = [{f: item[f] for f in fields} for item in (r.to_dict() for r in rows)]
+        return jsonify({'items': items, 'next_cursor': next_cursor})
+
+    stmt = apply_filters(row_statement(model, fields, order_columns), model, date_column)
+    rows, next_cursor = keyset_page(stmt, order_columns)
+    return json_response({
+        'items': row_dicts(rows, fields),
+        'next_cursor': next_cursor
+    })
+
 # ---------- Supplies ----------
-@app.route('/supplies', methods=['GET'])
+@api.route('/supplies', methods=['GET'])
+@conditional('Supplies')
 def get_supplies():
-    return jsonify([s.to_dict() for s in Supplies.query.all()])
+    return list_response(Supplies, [Supplies.Supply_ID], date_column=Supplies.Expiry_Date)
 
-@app.route('/supplies/<int:id>', methods=['GET'])
+@api.route('/supplies/<int:id>', methods=['GET'])
+@conditional('Supplies')
 def get_supply(id):
     return jsonify(Supplies.query.get_or_404(id).to_dict())
 
-@app.route('/supplies', methods=['POST'])
+@api.route('/supplies', methods=['POST'])
 def create_supply():
     data = request.json
     try:
@@ -50,25 +100,33 @@ def create_supply():
             Cost_Per_Unit=data.get('Cost_Per_Unit', 0)
         )
         db.session.add(new_item)
+        db.session.flush()
+        record_movements([{'Supply_ID': new_item.Supply_ID, 'Balance': INVENTORY, 'Quantity': new_item.Total_Quantity,
+                           'Reason': 'opening', 'Source_Table': 'Supplies', 'Source_ID': new_item.Supply_ID}], apply=False)
+        open_lots([{'Supply_ID': new_item.Supply_ID, 'Quantity': new_item.Total_Quantity,
+                    'Expiry_Date': new_item.Expiry_Date}])
         db.session.commit()
         return jsonify(new_item.to_dict()), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 400
 
-@app.route('/supplies/<int:id>', methods=['DELETE'])
+@api.route('/supplies/<int:id>', methods=['DELETE'])
 def delete_supply(id):
     item = Supplies.query.get_or_404(id)
+    # Usage, orders, stock, restocks and movements go with it via ON DELETE CASCADE
+    back_out_spend('orders', SupplyOrders.Supply_ID == id)
     db.session.delete(item)
     db.session.commit()
     return '', 204
 
 # ---------- Suppliers ----------
-@app.route('/suppliers', methods=['GET'])
+@api.route('/suppliers', methods=['GET'])
+@conditional('Suppliers')
 def get_suppliers():
-    return jsonify([s.to_dict() for s in Suppliers.query.all()])
+    return list_response(Suppliers, [Suppliers.Supplier_ID])
 
-@app.route('/suppliers', methods=['POST'])
+@api.route('/suppliers', methods=['POST'])
 def create_supplier():
     data = request.json
     new_item = Suppliers(
@@ -80,19 +138,54 @@ def create_supplier():
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/suppliers/<int:id>', methods=['DELETE'])
+@api.route('/suppliers/<int:id>', methods=['DELETE'])
 def delete_supplier(id):
     item = Suppliers.query.get_or_404(id)
+    # Its orders go with it via ON DELETE CASCADE
+    back_out_spend('orders', SupplyOrders.Supplier_ID == id)
+    db.session.delete(item)
+    db.session.commit()
+    return '', 204
+
+# ---------- Locations ----------
+@api.route('/locations', methods=['GET'])
+@conditional('Locations')
+def get_locations():
+    return list_response(Locations, [Locations.Location_ID])
+
+@api.route('/locations/<int:id>', methods=['GET'])
+@conditional('Locations')
+def get_location(id):
+    return jsonify(Locations.query.get_or_404(id).to_dict())
+
+@api.route('/locations', methods=['POST'])
+def create_location():
+    data = request.json
+    try:
+        new_item = Locations(Name=data['Name'])
+        db.session.add(new_item)
+        db.session.commit()
+        return jsonify(new_item.to_dict()), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+
+# Stock, usage and restocks of a deleted location are kept without one
+# (ON DELETE SET NULL)
+@api.route('/locations/<int:id>', methods=['DELETE'])
+def delete_location(id):
+    item = Locations.query.get_or_404(id)
     db.session.delete(item)
     db.session.commit()
     return '', 204
 
 # ---------- Expenses ----------
-@app.route('/expenses', methods=['GET'])
+@api.route('/expenses', methods=['GET'])
+@conditional('Expenses')
 def get_expenses():
-    return jsonify([e.to_dict() for e in Expenses.query.all()])
+    return list_response(Expenses, [Expenses.Date, Expenses.Expense_ID], date_column=Expenses.Date)
 
-@app.route('/expenses', methods=['POST'])
+@api.route('/expenses', methods=['POST'])
 def create_expense():
     data = request.json
     new_item = Expenses(
@@ -101,47 +194,59 @@ def create_expense():
         Amount=data['Amount']
     )
     db.session.add(new_item)
+    apply_spend('expenses', [new_item])
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/expenses/<int:id>', methods=['DELETE'])
+@api.route('/expenses/<int:id>', methods=['DELETE'])
 def delete_expense(id):
     item = Expenses.query.get_or_404(id)
+    apply_spend('expenses', [item], sign=-1)
     db.session.delete(item)
     db.session.commit()
     return '', 204
 
 # ---------- Usage Records ----------
-@app.route('/usage', methods=['GET'])
+@api.route('/usage', methods=['GET'])
+@conditional('Usage_Records', 'Supplies')
 def get_usage():
-    return jsonify([u.to_dict() for u in UsageRecords.query.all()])
+    return list_response(UsageRecords, [UsageRecords.Date, UsageRecords.Usage_ID], date_column=UsageRecords.Date)
 
-@app.route('/usage', methods=['POST'])
+@api.route('/usage', methods=['POST'])
 def create_usage():
     data = request.json
+    location = {'Location': data.get('Location'), 'Location_ID': data.get('Location_ID')}
+    if resolve_locations([location]):
+        return jsonify({'error': f"Location {data['Location_ID']} does not exist"}), 400
     new_item = UsageRecords(
         Date=datetime.strptime(data['Date'], '%Y-%m-%d') if 'Date' in data else datetime.now(),
         Supply_ID=data['Supply_ID'],
         Quantity_Used=data['Quantity_Used'],
-        Location=data.get('Location')
+        **location
     )
     db.session.add(new_item)
+    db.session.flush()
+    apply_usage([new_item])
+    record_movements(allocate_lots(usage_movements([new_item])))
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/usage/<int:id>', methods=['DELETE'])
+@api.route('/usage/<int:id>', methods=['DELETE'])
 def delete_usage(id):
     item = UsageRecords.query.get_or_404(id)
+    apply_usage([item], sign=-1)
     db.session.delete(item)
+    record_movements(release_lots(usage_movements([item], sign=-1)))
     db.session.commit()
     return '', 204
 
 # ---------- Supply Orders ----------
-@app.route('/orders', methods=['GET'])
+@api.route('/orders', methods=['GET'])
+@conditional('Supply_Orders', 'Supplies', 'Suppliers')
 def get_orders():
-    return jsonify([o.to_dict() for o in SupplyOrders.query.all()])
+    return list_response(SupplyOrders, [SupplyOrders.Date, SupplyOrders.Order_ID], date_column=SupplyOrders.Date)
 
-@app.route('/orders', methods=['POST'])
+@api.route('/orders', methods=['POST'])
 def create_order():
     data = request.json
     new_item = SupplyOrders(
@@ -149,74 +254,164 @@ def create_order():
         Supplier_ID=data['Supplier_ID'],
         Supply_ID=data['Supply_ID'],
         Quantity_Received=data['Quantity_Received'],
-        Total_Cost=data['Total_Cost']
+        Total_Cost=data['Total_Cost'],
+        Expiry_Date=datetime.strptime(data['Expiry_Date'], '%Y-%m-%d') if data.get('Expiry_Date') else None
     )
     db.session.add(new_item)
+    db.session.flush()
+    apply_spend('orders', [new_item])
+    receive_orders([new_item])
+    record_movements(order_movements([new_item]))
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/orders/<int:id>', methods=['DELETE'])
+@api.route('/orders/<int:id>', methods=['DELETE'])
 def delete_order(id):
     item = SupplyOrders.query.get_or_404(id)
+    apply_spend('orders', [item], sign=-1)
     db.session.delete(item)
+    record_movements(order_movements([item], sign=-1))
     db.session.commit()
     return '', 204
 
+# ---------- Supply Lots ----------
+# Deliveries with their own expiry, opened by orders and consumed by usage
+# first-expired-first-out; start_date/end_date filter on the expiry
+@api.route('/lots', methods=['GET'])
+@conditional('Supply_Lots', 'Supplies')
+def get_lots():
+    return list_response(SupplyLots, [SupplyLots.Lot_ID], date_column=SupplyLots.Expiry_Date)
+
 # ---------- Store Stock ----------
-@app.route('/stock', methods=['GET'])
+@api.route('/stock', methods=['GET'])
+@conditional('Store_Stock', 'Supplies')
 def get_stock():
-    return jsonify([s.to_dict() for s in StoreStock.query.all()])
+    return list_response(StoreStock, [StoreStock.Stock_ID], date_column=StoreStock.Last_Updated)
 
-@app.route('/stock', methods=['POST'])
+@api.route('/stock', methods=['POST'])
 def create_stock():
     data = request.json
-    new_item = StoreStock(
-        Supply_ID=data['Supply_ID'],
-        Quantity_Available=data['Quantity_Available'],
-        Last_Updated=datetime.strptime(data['Last_Updated'], '%Y-%m-%dT%H:%M') if 'Last_Updated' in data else datetime.now()
-    )
-    db.session.add(new_item)
+    location_id = data.get('Location_ID')
+    # The ledger keeps one store balance per (supply, location). The unique
+    # index lets NULL locations repeat, so the pair is checked here under the
+    # supply's row lock, which the ledger also takes before it creates a row.
+    db.session.execute(select(Supplies.Supply_ID).where(Supplies.Supply_ID == data['Supply_ID']).with_for_update())
+    item = db.session.execute(select(StoreStock).where(
+        StoreStock.Supply_ID == data['Supply_ID'],
+        StoreStock.Location_ID == location_id if location_id is not None else StoreStock.Location_ID.is_(None)
+    ).order_by(StoreStock.Stock_ID)).scalars().first()
+    if item is not None and db.session.execute(select(StockMovements.Movement_ID).where(
+        StockMovements.Source_Table == 'Store_Stock', StockMovements.Source_ID == item.Stock_ID,
+        StockMovements.Reason == 'opening'
+    )).first():
+        return jsonify({'error': f"Stock {item.Stock_ID} already holds this supply at this location"}), 409
+    # A row the ledger created when stock first arrived is adopted. The
+    # opening movement sets the pair's ledger to the counted quantity, so
+    # usage recorded before the row existed stops showing as drift.
+    if item is None:
+        item = StoreStock(Supply_ID=data['Supply_ID'], Location_ID=location_id)
+        db.session.add(item)
+    item.Quantity_Available = data['Quantity_Available']
+    item.Last_Updated = datetime.strptime(data['Last_Updated'], '%Y-%m-%dT%H:%M') if 'Last_Updated' in data else datetime.now()
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # Created by a concurrent request since the check
+        db.session.rollback()
+        return jsonify({'error': 'Stock already holds this supply at this location'}), 409
+    recorded = db.session.execute(select(func.coalesce(func.sum(StockMovements.Quantity), 0)).where(
+        StockMovements.Supply_ID == item.Supply_ID, StockMovements.Balance == STORE,
+        StockMovements.Location_ID == location_id if location_id is not None else StockMovements.Location_ID.is_(None)
+    )).scalar()
+    record_movements([{'Supply_ID': item.Supply_ID, 'Balance': STORE, 'Location_ID': item.Location_ID,
+                       'Quantity': item.Quantity_Available - recorded, 'Reason': 'opening',
+                       'Source_Table': 'Store_Stock', 'Source_ID': item.Stock_ID}], apply=False)
     db.session.commit()
-    return jsonify(new_item.to_dict()), 201
+    return jsonify(item.to_dict()), 201
+
+# Stock ledger: every change to a supply's inventory or store balance
+@api.route('/stock/movements', methods=['GET'])
+@conditional('Stock_Movements')
+def get_stock_movements():
+    return list_response(StockMovements, [StockMovements.Movement_ID], date_column=StockMovements.Created_At)
 
-@app.route('/stock/<int:id>', methods=['DELETE'])
+@api.route('/stock/<int:id>', methods=['DELETE'])
 def delete_stock(id):
     item = StoreStock.query.get_or_404(id)
     db.session.delete(item)
+    record_movements([{'Supply_ID': item.Supply_ID, 'Balance': STORE, 'Location_ID': item.Location_ID,
+                       'Quantity': -(item.Quantity_Available or 0), 'Reason': 'stock_deleted',
+                       'Source_Table': 'Store_Stock', 'Source_ID': item.Stock_ID}], apply=False)
     db.session.commit()
     return '', 204
 
 # ---------- Restock Requests ----------
-@app.route('/restocks', methods=['GET'])
+@api.route('/restocks', methods=['GET'])
+@conditional('Restock_Requests', 'Supplies')
 def get_restocks():
-    return jsonify([r.to_dict() for r in RestockRequests.query.all()])
+    return list_response(RestockRequests, [RestockRequests.Date, RestockRequests.Request_ID], date_column=RestockRequests.Date)
 
-@app.route('/restocks', methods=['POST'])
+# A request is 'Received' (stock moves now) unless posted as 'Open'
+@api.route('/restocks', methods=['POST'])
 def create_restock():
     data = request.json
+    status = data.get('Status', 'Received')
+    if status not in ('Open', 'Received'):
+        return jsonify({'error': "'Status' must be 'Open' or 'Received'"}), 400
     new_item = RestockRequests(
         Date=datetime.strptime(data['Date'], '%Y-%m-%d') if 'Date' in data else datetime.now(),
         Supply_ID=data['Supply_ID'],
         Quantity_Requested=data['Quantity_Requested'],
-        Request_Type=data.get('Request_Type', 'Transfer from Inventory')
+        Request_Type=data.get('Request_Type', 'Transfer from Inventory'),
+        Location_ID=data.get('Location_ID'),
+        Status=status
     )
     db.session.add(new_item)
+    db.session.flush()
+    record_movements(restock_movements([new_item]))
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/restocks/<int:id>', methods=['DELETE'])
+# The goods of an open request arrived: move the stock
+@api.route('/restocks/<int:id>/receive', methods=['POST'])
+def receive_restock(id):
+    item = RestockRequests.query.get_or_404(id)
+    if item.Status != 'Open':
+        return jsonify({'error': f'Restock request {id} is already received'}), 409
+    item.Status = 'Received'
+    record_movements(restock_movements([item]))
+    db.session.commit()
+    return jsonify(item.to_dict())
+
+@api.route('/restocks/<int:id>', methods=['DELETE'])
 def delete_restock(id):
     item = RestockRequests.query.get_or_404(id)
     db.session.delete(item)
+    record_movements(restock_movements([item], sign=-1))
     db.session.commit()
     return '', 204
 
+# Writes the current reorder plan (same parameters as
+# /analytics/reorder-plan) as open restock requests in one transaction
+@api.route('/restocks/plan', methods=['POST'])
+def create_planned_restocks():
+    today = datetime.now().date()
+    plan = reorder_plan_from_args(today)
+    try:
+        created = write_restocks(plan, today, location_scope())
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'created': created, 'plan': plan}), 201
+
 # ---------- Market Purchases ----------
-@app.route('/purchases', methods=['GET'])
+@api.route('/purchases', methods=['GET'])
+@conditional('Market_Purchases')
 def get_purchases():
-    return jsonify([p.to_dict() for p in MarketPurchases.query.all()])
+    return list_response(MarketPurchases, [MarketPurchases.Date, MarketPurchases.Purchase_ID], date_column=MarketPurchases.Date)
 
-@app.route('/purchases', methods=['POST'])
+@api.route('/purchases', methods=['POST'])
 def create_purchase():
     data = request.json
     new_item = MarketPurchases(
@@ -227,139 +422,455 @@ def create_purchase():
         Category=data.get('Category')
     )
     db.session.add(new_item)
+    apply_spend('purchases', [new_item])
     db.session.commit()
     return jsonify(new_item.to_dict()), 201
 
-@app.route('/purchases/<int:id>', methods=['DELETE'])
+@api.route('/purchases/<int:id>', methods=['DELETE'])
 def delete_purchase(id):
     item = MarketPurchases.query.get_or_404(id)
+    apply_spend('purchases', [item], sign=-1)
     db.session.delete(item)
     db.session.commit()
     return '', 204
 
+# ---------- Bulk Ingestion ----------
+# POST /usage/bulk, /purchases/bulk, /orders/bulk, /expenses/bulk.
+# Every row is validated before anything is written; the batch is then inserted
+# with a single executemany in one transaction, or rejected with per-row errors.
+@api.route('/<table>/bulk', methods=['POST'])
+def bulk_create(table):
+    if table not in BULK_TABLES:
+        return jsonify({'error': 'Resource not found'}), 404
+    try:
+        rows = read_payload()
+    except (BulkPayloadError, UnicodeDecodeError) as e:
+        return jsonify({'error': str(e)}), 400
+    if len(rows) > MAX_BULK_ROWS:
+        return jsonify({'error': f'At most {MAX_BULK_ROWS} rows per request'}), 413
+
+    model, valid_rows, errors = validate_rows(table, rows)
+    if errors:
+        return jsonify({'inserted': 0, 'errors': errors}), 400
+    if not valid_rows:
+        return jsonify({'inserted': 0, 'errors': []}), 200
+
+    try:
+        insert_rows(model, valid_rows)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'inserted': len(valid_rows), 'errors': []}), 201
+
+# DELETE /usage/bulk?end_date=2023-12-31 and the like: one set-based DELETE of
+# every row matching the list filters, which are required so a bare request
+# cannot empty a table. Usage_Daily and Spend_Monthly are kept in step; stock
+# balances are not touched, as this purges history rather than undoing it.
+BULK_DELETE_FILTERS = ('start_date', 'end_date', 'supply_id', 'supplier_id', 'category', 'location')
+
+@api.route('/<table>/bulk', methods=['DELETE'])
+def bulk_delete(table):
+    if table not in BULK_TABLES:
+        return jsonify({'error': 'Resource not found'}), 404
+    if not any(request.args.get(name) for name in BULK_DELETE_FILTERS):
+        return jsonify({'error': f"At least one filter is required: {', '.join(BULK_DELETE_FILTERS)}"}), 400
+
+    model = BULK_TABLES[table][0]
+    whereclause = apply_filters(select(model), model, model.Date).whereclause
+    try:
+        if model is UsageRecords:
+            back_out_usage(whereclause)
+        if model in SPEND_MODELS:
+            back_out_spend(SPEND_MODELS[model], whereclause)
+        deleted = db.session.execute(delete(model.__table__).where(whereclause)).rowcount
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'deleted': deleted})
+
+# ---------- Archive ----------
+# Closed months moved out of Usage_Records and Expenses by archive-closed-months,
+# with the same filters and paging as the hot tables
+@api.route('/archive/usage', methods=['GET'])
+@conditional('Usage_Records_Archive', 'Supplies')
+def get_usage_archive():
+    return list_response(UsageRecordsArchive, [UsageRecordsArchive.Date, UsageRecordsArchive.Usage_ID],
+                         date_column=UsageRecordsArchive.Date)
+
+@api.route('/archive/expenses', methods=['GET'])
+@conditional('Expenses_Archive')
+def get_expenses_archive():
+    return list_response(ExpensesArchive, [ExpensesArchive.Date, ExpensesArchive.Expense_ID],
+                         date_column=ExpensesArchive.Date)
+
+# ---------- Exports ----------
+# Streams a full table as NDJSON or CSV; accepts the same filters as the list routes.
+# Usage and expenses include their archived months, ahead of the hot table's rows.
+@api.route('/export/<table>.<fmt>', methods=['GET'])
+def export_table(table, fmt):
+    if table not in EXPORTS or fmt not in ('ndjson', 'csv'):
+        return jsonify({'error': 'Resource not found'}), 404
+
+    statements = [
+        apply_filters(stmt, model, date_column).order_by(*model.__table__.primary_key.columns)
+        for stmt, model, date_column in export_statements(table)
+    ]
+
+    if fmt == 'ndjson':
+        body, mimetype = generate_ndjson(statements), 'application/x-ndjson'
+    else:
+        body, mimetype = generate_csv(statements), 'text/csv'
+    return Response(
+        stream_with_context(body),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'}
+    )
+
+# ---------- Change Feed ----------
+# Server-sent events for every committed create/update/delete:
+#   event: change, id: <event id>, data: {"table", "action", "row_id", "row", "at"}
+# Reconnecting clients send Last-Event-ID (or ?last_event_id=) to replay what
+# they missed; ?tables=Store_Stock,Usage_Records filters; ?once=1 replays and closes.
+# A worker already serving CHANGE_FEED_MAX_SUBSCRIBERS streams answers 503.
+@api.route('/events', methods=['GET'])
+def get_events():
+    if request.args.get('once') != '1' and change_feed.full():
+        response = jsonify({'error': 'Too many open event streams; retry later'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    last_id = request.headers.get('Last-Event-ID', '')
+    last_id = int(last_id) if last_id.isdigit() else int_arg('last_event_id', None)
+    tables = set(request.args['tables'].split(',')) if request.args.get('tables') else None
+    return Response(
+        stream_with_context(change_feed.stream(last_id, tables, once=request.args.get('once') == '1')),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+# ---------- Sync ----------
+# Delta sync for clients keeping a local copy of the tables: every row
+# created, updated or deleted since ?since=<token>, with the token to send
+# next time. Without a token, a full snapshot, paged through ?cursor=.
+# ?tables= limits it.
+@api.route('/sync', methods=['GET'])
+def get_sync():
+    tables = sync_tables(request.args.get('tables'))
+    return json_response(sync(int_arg('since', None), tables, sync_cursor(request.args.get('cursor'))))
+
+# ---------- Background Jobs ----------
+# POST /jobs {"path": "/analytics/spending-trends", "params": {...}} runs an
+# analytics or export view on the job pool and answers 202 with the job;
+# poll GET /jobs/<id> and download GET /jobs/<id>/result once it is done.
+def job_response(job, status=200):
+    body = dict(job, status_url=url_for('.get_job', job_id=job['id']))
+    if job['status'] == 'done':
+        body['result_url'] = url_for('.get_job_result', job_id=job['id'])
+    return jsonify(body), status
+
+@api.route('/jobs', methods=['POST'])
+def create_job():
+    data = request.get_json(silent=True) or {}
+    try:
+        job = job_runner.submit(data.get('path'), data.get('params'))
+    except JobError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    response, status = job_response(job, 202)
+    response.headers['Location'] = url_for('.get_job', job_id=job['id'])
+    return response, status
+
+@api.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_runner.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Resource not found'}), 404
+    return job_response(job)
+
+@api.route('/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    job = job_runner.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Resource not found'}), 404
+    if job['status'] != 'done':
+        return jsonify({'error': f"Job is {job['status']}"}), 409
+    return send_file(job_runner.result_path(job_id), mimetype=job['mimetype'],
+                     as_attachment=True, download_name=job['filename'])
+
+# Cancels a queued or running job; deletes a finished one and its result
+@api.route('/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    job = job_runner.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Resource not found'}), 404
+    if job.get('deleted'):
+        return '', 204
+    return job_response(job, 202 if job.get('cancel_requested') else 200)
+
 # ---------- Advanced Analytics ----------
 
+# Tables each analytics view reads, for its ETag and cache entry
+EXPIRING_SOON_TABLES = ('Supplies', 'Supply_Lots', 'Store_Stock')
+STOCK_USAGE_TABLES = ('Supplies', 'Store_Stock', 'Usage_Daily')
+SPENDING_TABLES = ('Spend_Monthly',)
+SPEND_TABLES = ('Spend_Monthly', 'Suppliers')
+REORDER_TABLES = ('Supplies', 'Suppliers', 'Supply_Orders', 'Store_Stock', 'Restock_Requests', 'Usage_Daily')
+DASHBOARD_TABLES = ('Supplies', 'Supply_Lots', 'Store_Stock', 'Restock_Requests', 'Expenses', 'Supply_Orders', 'Market_Purchases', 'Usage_Daily')
+
+# ?location= (a Locations name) scopes the stock and usage analytics and the
+# dashboard's stock and usage figures to that location. Stock is matched on
+# Store_Stock.Location_ID and usage on the Usage_Daily location, each through
+# an index led by the location, so one location's query reads only its rows.
+def location_scope():
+    return request.args.get('location') or None
+
 # Expiring Soon Items
-@app.route('/analytics/expiring-soon', methods=['GET'])
+# ?days= (default 30) sets the look-ahead; ?high_days= / ?medium_days= (7 / 14)
+# set the priority cut-offs. One entry per open lot expiring in the window,
+# with the lot's remaining quantity as current_stock, in a single query.
+@api.route('/analytics/expiring-soon', methods=['GET'])
+@read_replica
+@conditional(*EXPIRING_SOON_TABLES)
+@cached(*EXPIRING_SOON_TABLES)
 def get_expiring_soon():
+    days = int_arg('days', 30)
+    high_days = int_arg('high_days', 7)
+    medium_days = int_arg('medium_days', 14)
     today = datetime.now().date()
-    thirty_days_later = today + timedelta(days=30)
     
-    items = Supplies.query.filter(
-        Supplies.Expiry_Date.between(today, thirty_days_later)
-    ).all()
+    location = location_scope()
+    
+    # Open lots in expiry order, read as one range of ix_supply_lots_open_expiry
+    lots = db.session.query(SupplyLots, Supplies).join(
+        Supplies, Supplies.Supply_ID == SupplyLots.Supply_ID
+    ).filter(
+        SupplyLots.Is_Open.is_(True),
+        SupplyLots.Expiry_Date.between(today, today + timedelta(days=days))
+    )
+    if location:
+        # Only supplies the location has in stock
+        lots = lots.filter(db.session.query(StoreStock.Stock_ID).filter(
+            StoreStock.Location_ID == location_id(location),
+            StoreStock.Supply_ID == SupplyLots.Supply_ID,
+            StoreStock.Quantity_Available > 0
+        ).exists())
+    lots = lots.order_by(SupplyLots.Expiry_Date, SupplyLots.Lot_ID).all()
     
     result = []
-    for item in items:
-        days_until_expiry = (item.Expiry_Date - today).days
-        stock = StoreStock.query.filter_by(Supply_ID=item.Supply_ID).first()
+    for lot, item in lots:
+        days_until_expiry = (lot.Expiry_Date - today).days
         
         result.append({
             **item.to_dict(),
+            'Lot_ID': lot.Lot_ID,
+            'Order_ID': lot.Order_ID,
+            'Expiry_Date': lot.Expiry_Date.isoformat(),
             'days_until_expiry': days_until_expiry,
-            'current_stock': stock.Quantity_Available if stock else 0,
-            'priority': 'High' if days_until_expiry < 7 else ('Medium' if days_until_expiry < 14 else 'Low')
+            'current_stock': lot.Quantity_Remaining,
+            'priority': 'High' if days_until_expiry < high_days else ('Medium' if days_until_expiry < medium_days else 'Low')
         })
     
     return jsonify(result)
 
 # Stock Alerts
-@app.route('/analytics/stock-alerts', methods=['GET'])
+# ?threshold= (default 10 units) and ?window_days= (default 30) are adjustable.
+# Low stock rows, their supply and the windowed usage sum come back in one query.
+# Each alert is one location's stock row, set against the usage logged at that
+# location (usage without a location for the unassigned row).
+@api.route('/analytics/stock-alerts', methods=['GET'])
+@read_replica
+@conditional(*STOCK_USAGE_TABLES)
+@cached(*STOCK_USAGE_TABLES)
 def get_stock_alerts():
-    alerts = []
+    threshold = int_arg('threshold', 10)
+    window_days = int_arg('window_days', 30)
+    location = location_scope()
     
-    for stock in StoreStock.query.all():
-        if stock.Quantity_Available < 10:
-            supply = Supplies.query.get(stock.Supply_ID)
-            usage = db.session.query(func.sum(UsageRecords.Quantity_Used)).filter(
-                UsageRecords.Supply_ID == stock.Supply_ID,
-                UsageRecords.Date >= datetime.now().date() - timedelta(days=30)
-            ).scalar() or 0
-            
-            daily_usage = usage / 30 if usage > 0 else 0.1
-            days_remaining = int(stock.Quantity_Available / daily_usage) if daily_usage > 0 else 999
-            
-            status = "Critical" if days_remaining < 3 else ("Warning" if days_remaining < 7 else "Low")
-            
-            alerts.append({
-                'Supply_ID': stock.Supply_ID,
-                'Name': supply.Name if supply else f"Supply {stock.Supply_ID}",
-                'Category': supply.Category if supply else 'Unknown',
-                'Current_Stock': float(stock.Quantity_Available),
-                'Daily_Usage': float(daily_usage),
-                'Days_Remaining': days_remaining if days_remaining < 365 else "365+",
-                'Status': status
-            })
+    usage = db.session.query(
+        UsageDaily.Supply_ID,
+        UsageDaily.Location,
+        func.sum(UsageDaily.Quantity_Used).label('total_used')
+    ).filter(
+        UsageDaily.Day >= datetime.now().date() - timedelta(days=window_days)
+    )
+    if location:
+        usage = usage.filter(UsageDaily.Location == location)
+    usage = usage.group_by(
+        UsageDaily.Supply_ID, UsageDaily.Location
+    ).subquery()
     
-    return jsonify(alerts)
-
-# Spending Trends
-@app.route('/analytics/spending-trends', methods=['GET'])
-def get_spending_trends():
-    trends = []
+    rows = db.session.query(
+        StoreStock.Supply_ID,
+        StoreStock.Location_ID,
+        Locations.Name.label('location'),
+        StoreStock.Quantity_Available,
+        Supplies.Name,
+        Supplies.Category,
+        Supplies.Supply_ID.label('found'),
+        usage.c.total_used
+    ).outerjoin(
+        Supplies, Supplies.Supply_ID == StoreStock.Supply_ID
+    ).outerjoin(
+        Locations, Locations.Location_ID == StoreStock.Location_ID
+    ).outerjoin(
+        usage, and_(usage.c.Supply_ID == StoreStock.Supply_ID,
+                    usage.c.Location == func.coalesce(Locations.Name, ''))
+    ).filter(
+        StoreStock.Quantity_Available < threshold
+    )
+    if location:
+        rows = rows.filter(StoreStock.Location_ID == location_id(location))
+    rows = rows.order_by(
+        StoreStock.Stock_ID
+    ).all()
     
-    for category in db.session.query(Expenses.Category).distinct():
-        category_name = category[0] or "Uncategorized"
+    alerts = []
+    for stock in rows:
+        usage_total = stock.total_used or 0
+        daily_usage = usage_total / window_days if usage_total > 0 and window_days else 0.1
+        days_remaining = int(stock.Quantity_Available / daily_usage) if daily_usage > 0 else 999
         
-        monthly_totals = db.session.query(
-            func.date_format(Expenses.Date, '%Y-%m').label('month'),
-            func.sum(Expenses.Amount).label('total')
-        ).filter(
-            Expenses.Category == category_name
-        ).group_by(
-            'month'
-        ).all()
+        status = "Critical" if days_remaining < 3 else ("Warning" if days_remaining < 7 else "Low")
         
-        for month, total in monthly_totals:
-            found = False
-            for trend in trends:
-                if trend['date'] == month:
-                    trend[category_name] = float(total)
-                    found = True
-                    break
-            
-            if not found:
-                trends.append({'date': month, category_name: float(total)})
-    
-    # Sort by date
-    trends.sort(key=lambda x: x['date'])
+        alerts.append({
+            'Supply_ID': stock.Supply_ID,
+            'Location_ID': stock.Location_ID,
+            'Location': stock.location,
+            'Name': stock.Name if stock.found else f"Supply {stock.Supply_ID}",
+            'Category': stock.Category if stock.found else 'Unknown',
+            'Current_Stock': float(stock.Quantity_Available),
+            'Daily_Usage': float(daily_usage),
+            'Days_Remaining': days_remaining if days_remaining < 365 else "365+",
+            'Status': status
+        })
     
-    # Get all categories
-    categories = [c[0] or "Uncategorized" for c in db.session.query(Expenses.Category).distinct()]
+    return jsonify(alerts)
+
+# Demand Forecast
+# Per-supply daily usage over ?history_days= (default 90) with a ?window= day
+# moving average (default 7) and exponential smoothing (?alpha=, default 0.3),
+# computed for all supplies in one NumPy pass.
+@api.route('/analytics/forecast', methods=['GET'])
+@read_replica
+@conditional(*STOCK_USAGE_TABLES)
+@cached(*STOCK_USAGE_TABLES)
+def get_forecast():
+    history_days = max(int_arg('history_days', 90), 1)
+    window = max(int_arg('window', 7), 1)
+    alpha = float_arg('alpha', 0.3, minimum=0.01, maximum=1)
+    today = datetime.now().date()
     
     return jsonify({
-        'trends': trends,
-        'categories': categories
+        'as_of': today.isoformat(),
+        'history_days': history_days,
+        'forecasts': forecast(today - timedelta(days=history_days - 1), today, window, alpha, location_scope())
     })
+
+# Reorder Plan
+# Reorder point, safety stock and order quantity for every supply in one batch,
+# from ?window_days= (default 30) of usage, the preferred supplier's lead time
+# (?default_lead_time=, 7, when unknown), a ?service_level= (0.95) and an
+# order covering ?review_days= (7) beyond the reorder point. POST
+# /restocks/plan records the planned orders as open restock requests.
+def reorder_plan_from_args(today):
+    return reorder_plan(
+        today,
+        window_days=max(int_arg('window_days', 30), 1),
+        service_level=float_arg('service_level', 0.95, minimum=0.5, maximum=0.999),
+        review_days=int_arg('review_days', 7),
+        default_lead_time=int_arg('default_lead_time', 7),
+        location=location_scope()
+    )
+
+@api.route('/analytics/reorder-plan', methods=['GET'])
+@read_replica
+@conditional(*REORDER_TABLES)
+@cached(*REORDER_TABLES)
+def get_reorder_plan():
+    today = datetime.now().date()
+    return jsonify({'as_of': today.isoformat(), 'plan': reorder_plan_from_args(today)})
+
+# Spending Trends
+# Expense totals per month and category, read from the spend cube: one
+# grouped query over a few rows per month, archived months included
+@api.route('/analytics/spending-trends', methods=['GET'])
+@read_replica
+@conditional(*SPENDING_TABLES)
+@cached(*SPENDING_TABLES)
+def get_spending_trends():
+    monthly_totals = db.session.query(
+        SpendMonthly.Month,
+        SpendMonthly.Category,
+        func.sum(SpendMonthly.Amount).label('total')
+    ).filter(
+        SpendMonthly.Source == 'expenses'
+    ).group_by(
+        SpendMonthly.Month, SpendMonthly.Category
+    ).all()
     
-    # Sort by date
-    trends.sort(key=lambda x: x['date'])
-    
-    # Get all categories
-    categories = [c[0] or "Uncategorized" for c in db.session.query(Expenses.Category).distinct()]
+    by_month = {}
+    categories = set()
+    for row in monthly_totals:
+        key = f"{row.Month:%Y-%m}"
+        category_name = row.Category or "Uncategorized"
+        categories.add(category_name)
+        trend = by_month.setdefault(key, {'date': key})
+        trend[category_name] = trend.get(category_name, 0) + float(row.total or 0)
     
     return jsonify({
-        'trends': trends,
-        'categories': categories
+        'trends': [by_month[key] for key in sorted(by_month)],
+        'categories': sorted(categories)
     })
 
+# Spend Cube
+# Slices and roll-ups of Spend_Monthly, the monthly spend of expenses, supply
+# orders and market purchases: ?group_by= any of year, month, source,
+# category, supplier (none for the grand total), filtered by ?source=,
+# ?category=, ?supplier_id= and ?start_month= / ?end_month= (YYYY-MM)
+@api.route('/analytics/spend', methods=['GET'])
+@read_replica
+@conditional(*SPEND_TABLES)
+@cached(*SPEND_TABLES)
+def get_spend():
+    args = request.args
+    return jsonify(spend_slice(
+        group_by=spend_dimensions(args.get('group_by')),
+        sources=spend_sources(args.get('source')),
+        categories=[c.strip() for c in args.get('category', '').split(',') if c.strip()] or None,
+        supplier_ids=[int_arg('supplier_id', None)] if args.get('supplier_id') else None,
+        start=spend_month(args.get('start_month'), 'start_month'),
+        end=spend_month(args.get('end_month'), 'end_month')
+    ))
+
 # Dashboard Summary
-@app.route('/dashboard/summary', methods=['GET'])
+@api.route('/dashboard/summary', methods=['GET'])
+@read_replica
+@conditional(*DASHBOARD_TABLES)
+@cached(*DASHBOARD_TABLES)
 def get_dashboard_summary():
     today = datetime.now().date()
     thirty_days_ago = today - timedelta(days=30)
+    location = location_scope()
     
     # 1. Low stock count
-    low_stock_count = StoreStock.query.filter(StoreStock.Quantity_Available < 10).count()
+    low_stock = StoreStock.query.filter(StoreStock.Quantity_Available < 10)
+    if location:
+        low_stock = low_stock.filter(StoreStock.Location_ID == location_id(location))
+    low_stock_count = low_stock.count()
     
     # 2. Expiring soon count
-    expiring_soon_count = Supplies.query.filter(
-        Supplies.Expiry_Date.isnot(None),
-        Supplies.Expiry_Date.between(today, today + timedelta(days=30))
+    expiring_soon_count = SupplyLots.query.filter(
+        SupplyLots.Is_Open.is_(True),
+        SupplyLots.Expiry_Date.between(today, today + timedelta(days=30))
     ).count()
     
-    # 3. Pending restock requests
-    pending_restocks = RestockRequests.query.count()
+    # 3. Pending (open) restock requests
+    restocks = RestockRequests.query.filter(RestockRequests.Status == 'Open')
+    if location:
+        restocks = restocks.filter(RestockRequests.Location_ID == location_id(location))
+    pending_restocks = restocks.count()
     
     # 4. Total inventory value
     inventory_value = db.session.query(
@@ -367,6 +878,8 @@ def get_dashboard_summary():
     ).scalar() or 0
     
     # 5. Monthly expenses
+    # 5 and 6 cover the last 30 days, which the month-grained spend cube cannot
+    # answer; each is a range read of its table's Date index
     monthly_expenses = db.session.query(
         func.sum(Expenses.Amount)
     ).filter(
@@ -403,16 +916,19 @@ def get_dashboard_summary():
             'market_percentage': 0
         }
     
-    # 7. Top supplies
+    # 7. Top supplies (from the daily rollup)
     top_supplies = db.session.query(
         Supplies.Supply_ID,
         Supplies.Name,
-        func.sum(UsageRecords.Quantity_Used).label('total_used')
+        func.sum(UsageDaily.Quantity_Used).label('total_used')
     ).join(
-        UsageRecords, UsageRecords.Supply_ID == Supplies.Supply_ID
+        UsageDaily, UsageDaily.Supply_ID == Supplies.Supply_ID
     ).filter(
-        UsageRecords.Date.between(thirty_days_ago, today)
-    ).group_by(
+        UsageDaily.Day.between(thirty_days_ago, today)
+    )
+    if location:
+        top_supplies = top_supplies.filter(UsageDaily.Location == location)
+    top_supplies = top_supplies.group_by(
         Supplies.Supply_ID
     ).order_by(
         desc('total_used')
@@ -434,7 +950,131 @@ def get_dashboard_summary():
         'report_date': today.isoformat()
     })
 
+# ---------- Operations ----------
+# Connection pool size, usage and checkout wait times per engine
+@api.route('/admin/pool', methods=['GET'])
+def get_pool_status():
+    return jsonify(pool_status(db.engines))
+
+# Request latency, SQL counts and DB time per endpoint in Prometheus text format
+@api.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not metrics.enabled:
+        return jsonify({'error': 'Resource not found'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+# ---------- CLI ----------
+@api.cli.command('rebuild-usage-rollup')
+def rebuild_usage_rollup_command():
+    """Backfill Usage_Daily from the full Usage_Records history."""
+    rebuild_usage_rollup()
+    print(f'Usage_Daily rebuilt: {UsageDaily.query.count()} rows')
+
+@api.cli.command('reconcile-stock-ledger')
+@click.option('--check', is_flag=True, help='Only report drift, exit 1 if any')
+def reconcile_stock_ledger_command(check):
+    """Compare stock balances with Stock_Movements and record adjustments for any drift."""
+    drift = ledger_drift()
+    for d in drift:
+        print(f"Supply {d['Supply_ID']} {d['Balance']}: ledger {d['expected']:g}, balance {d['actual']:g}")
+    if check:
+        if drift:
+            raise SystemExit(1)
+        print('Stock ledger matches the balances.')
+        return
+    print(f'{reconcile_ledger()} adjustments recorded.')
+
+@api.cli.command('archive-closed-months')
+@click.option('--keep-months', type=int, default=None, help='Closed months to keep in the hot tables [default: ARCHIVE_KEEP_MONTHS]')
+def archive_closed_months_command(keep_months):
+    """Move closed months of Usage_Records and Expenses into their archive tables."""
+    if keep_months is None:
+        keep_months = current_app.config['ARCHIVE_KEEP_MONTHS']
+    cutoff = archive_cutoff(keep_months)
+    for name, moved in archive_before(cutoff).items():
+        print(f'{name}: {moved} rows before {cutoff.isoformat()} archived')
+
+@api.cli.command('rebuild-spend-cube')
+def rebuild_spend_cube_command():
+    """Recompute the open months of Spend_Monthly from expenses, supply orders and market purchases."""
+    cells = rebuild_spend_cube()
+    print(f'Spend_Monthly rebuilt: {cells} open cells')
+
+@api.cli.command('freeze-spend-months')
+@click.option('--keep-months', type=int, default=None, help='Closed months to keep open [default: SPEND_OPEN_MONTHS]')
+def freeze_spend_months_command(keep_months):
+    """Freeze the closed months of Spend_Monthly so later writes cannot change them."""
+    if keep_months is None:
+        keep_months = current_app.config['SPEND_OPEN_MONTHS']
+    cutoff = archive_cutoff(keep_months)
+    print(f'{freeze_spend_months(cutoff)} cells before {cutoff.isoformat()} frozen')
+
+@api.cli.command('seed')
+@click.option('--profile', type=click.Choice(sorted(PROFILES)), default='small', show_default=True)
+@click.option('--set', 'overrides', multiple=True, metavar='TABLE=ROWS', help='Override one volume, e.g. --set usage=2000000')
+@click.option('--years', type=int, default=3, show_default=True, help='Years of history to spread dated rows over')
+@click.option('--random-seed', type=int, default=None, help='Seed for reproducible data')
+@click.option('--reset', is_flag=True, help='Delete existing rows first')
+def seed_command(profile, overrides, years, random_seed, reset):
+    """Fill every table with synthetic data for benchmarks."""
+    volumes = dict(PROFILES[profile])
+    for override in overrides:
+        table, _, rows = override.partition('=')
+        if table not in volumes or not rows.isdigit():
+            raise click.BadParameter(f"expected one of {', '.join(volumes)} as TABLE=ROWS", param_hint='--set')
+        volumes[table] = int(rows)
+    seed(volumes, years=years, random_seed=random_seed, reset=reset)
+    for model in (Locations, Suppliers, Supplies, StoreStock, SupplyOrders, UsageRecords, UsageDaily, StockMovements, SupplyLots, Expenses, RestockRequests, MarketPurchases, UsageRecordsArchive, ExpensesArchive):
+        print(f'{model.__tablename__}: {model.query.count()} rows')
+
+@api.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Apply pending schema migrations from migrations/."""
+    applied = upgrade(db.engine)
+    print(f"Applied: {', '.join(applied)}" if applied else 'Schema is up to date.')
+
+@api.cli.command('db-status')
+def db_status_command():
+    """List pending migrations and any drift between the database and models.py."""
+    with db.engine.begin() as connection:
+        pending = pending_migrations(connection)
+        drift = schema_drift(connection, db.metadata)
+    for revision, module in pending:
+        print(f'pending {revision} {module.description}')
+    for problem in drift:
+        print(f'drift: {problem}')
+    if pending or drift:
+        raise SystemExit(1)
+    print('Schema is up to date.')
+
+@api.cli.command('check-query-plans')
+def check_query_plans_command():
+    """EXPLAIN the filtered list and analytics queries and report full table scans."""
+    from query_plans import full_scans
+    problems = full_scans(current_app._get_current_object())
+    for problem in problems:
+        print(f"{problem['url']}: full scan of {problem['table']}")
+    if problems:
+        raise SystemExit(1)
+    print('No unexpected full table scans.')
+
+# ---------- App factory ----------
+# `config` is a name from config.CONFIGS or a config class; APP_CONFIG picks
+# it when omitted. The `flask` command finds this factory; wsgi.py serves it.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.config.from_object(config if isinstance(config, type) else get_config(config))
+    db.init_app(app)
+    response_cache.init_app(app)
+    metrics.init_app(app)
+    job_runner.init_app(app)
+    change_feed.init_app(app)
+    CORS(app, expose_headers=['ETag'])
+    app.register_blueprint(api)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all()
+        upgrade(db.engine)
     app.run(debug=True)
@@ -0,0 +1,48 @@
+from datetime import date
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, UsageRecords, UsageRecordsArchive, Expenses, ExpensesArchive
+
+# Hot table -> archive table for each archivable history
+ARCHIVES = {
+    'usage': (UsageRecords, UsageRecordsArchive),
+    'expenses': (Expenses, ExpensesArchive),
+}
+
+
+def _add_months(day, months):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+# First day of the oldest month kept in the hot tables: the current month plus
+# `keep_months` closed months before it
+def archive_cutoff(keep_months, today=None):
+    return _add_months((today or date.today()).replace(day=1), -keep_months)
+
+
+# Moves every row dated before `cutoff` into its archive table, one month per
+# transaction: INSERT ... SELECT into the archive, then DELETE from the hot
+# table, so a failure never leaves a month in both or in neither.
+# Usage_Daily and the stock balances are left as they are; the rollup is
+# rebuilt from both tables. Returns {name: rows moved}.
+def archive_before(cutoff):
+    moved = {}
+    for name, (hot, cold) in ARCHIVES.items():
+        moved[name] = 0
+        oldest = db.session.execute(select(func.min(hot.Date)).where(hot.Date < cutoff)).scalar()
+        if oldest is None:
+            continue
+        columns = [c.key for c in hot.__table__.columns]
+        month = oldest.replace(day=1)
+        while month < cutoff:
+            end = min(_add_months(month, 1), cutoff)
+            in_month = (hot.Date >= month) & (hot.Date < end)
+            db.session.execute(insert(cold.__table__).from_select(
+                columns, select(*[hot.__table__.c[c] for c in columns]).where(in_month)
+            ))
+            moved[name] += db.session.execute(delete(hot.__table__).where(in_month)).rowcount
+            db.session.commit()
+            month = end
+    return moved
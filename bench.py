@@ -0,0 +1,346 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import event, func
+
+from models import db, Supplies, Suppliers, Locations, StoreStock
+from cache import response_cache
+from jobs import job_runner
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# A request to time. `prepare(client)` runs untimed before each request and
+# returns the URL to hit, e.g. after creating the row a DELETE removes.
+Scenario = namedtuple('Scenario', 'name endpoint method url body prepare', defaults=(None, None))
+
+
+def _get(endpoint, url):
+    return Scenario(f'GET {url}', endpoint, 'GET', url)
+
+
+def _post(endpoint, url, body):
+    return Scenario(f'POST {url}', endpoint, 'POST', url, body)
+
+
+def _delete(endpoint, url, body, id_field):
+    def prepare(client):
+        created = client.post(url, json=body).get_json()
+        return f'{url}/{created[id_field]}'
+    return Scenario(f'DELETE {url}/<id>', endpoint, 'DELETE', None, None, prepare)
+
+
+# Location names are unique: drop the one the previous request created
+def _create_location(body):
+    def prepare(client):
+        existing = Locations.query.filter_by(Name=body['Name']).first()
+        if existing is not None:
+            client.delete(f'/locations/{existing.Location_ID}')
+        return '/locations'
+    return Scenario('POST /locations', 'create_location', 'POST', None, body, prepare)
+
+
+# A supply has one stock row per location: drop the one the previous request
+# created before creating it again
+def _stock(endpoint, method, body):
+    def prepare(client):
+        existing = StoreStock.query.filter_by(Supply_ID=body['Supply_ID'], Location_ID=None).first()
+        if existing is not None:
+            client.delete(f'/stock/{existing.Stock_ID}')
+        if method == 'POST':
+            return '/stock'
+        return f"/stock/{client.post('/stock', json=body).get_json()['Stock_ID']}"
+    name = 'POST /stock' if method == 'POST' else 'DELETE /stock/<id>'
+    return Scenario(name, endpoint, method, None, body if method == 'POST' else None, prepare)
+
+
+# Receives an open restock request posted just before
+def _receive_restock(body):
+    def prepare(client):
+        created = client.post('/restocks', json={**body, 'Status': 'Open'}).get_json()
+        return f"/restocks/{created['Request_ID']}/receive"
+    return Scenario('POST /restocks/<id>/receive', 'receive_restock', 'POST', None, None, prepare)
+
+
+# Purges a batch of old usage inserted just before
+def _bulk_delete(rows, day):
+    def prepare(client):
+        client.post('/usage/bulk', json=[{**row, 'Date': day.isoformat()} for row in rows])
+        return f'/usage/bulk?end_date={day.isoformat()}'
+    return Scenario('DELETE /usage/bulk?end_date=<date>', 'bulk_delete', 'DELETE', None, None, prepare)
+
+
+def _job(endpoint, method, suffix=''):
+    def prepare(client):
+        job_id = client.post('/jobs', json={'path': '/analytics/spending-trends'}).get_json()['id']
+        job_runner.join()
+        return f'/jobs/{job_id}{suffix}'
+    return Scenario(f'{method} /jobs/<id>{suffix}', endpoint, method, None, None, prepare)
+
+
+# A supply, a supplier and a location to reference in URLs and payloads
+def first_ids():
+    return {
+        'Supplies': db.session.query(func.min(Supplies.Supply_ID)).scalar() or 1,
+        'Suppliers': db.session.query(func.min(Suppliers.Supplier_ID)).scalar() or 1,
+        'Locations': db.session.query(func.min(Locations.Location_ID)).scalar() or 1,
+        'Location': db.session.query(Locations.Name).order_by(Locations.Location_ID).limit(1).scalar() or 'Main Store',
+    }
+
+
+# One or more scenarios per route in app.py
+def scenarios(ids, today=None):
+    today = today or datetime.now().date()
+    month = f'start_date={(today - timedelta(days=30)).isoformat()}&end_date={today.isoformat()}'
+    supply_id = ids['Supplies']
+    supplier_id = ids['Suppliers']
+    location_id = ids['Locations']
+
+    # resource: (singular used in endpoint names, POST body, primary key field)
+    resources = {
+        'supplies': ('supply', {'Name': 'Bench supply', 'Category': 'Tea', 'Expiry_Date': today.isoformat(),
+                                'Total_Quantity': 10, 'Cost_Per_Unit': 1.5}, 'Supply_ID'),
+        'suppliers': ('supplier', {'Name': 'Bench supplier', 'Contact': '555-0000', 'Lead_Time': 3}, 'Supplier_ID'),
+        'expenses': ('expense', {'Date': today.isoformat(), 'Category': 'Utilities', 'Amount': 12.5}, 'Expense_ID'),
+        'usage': ('usage', {'Date': today.isoformat(), 'Supply_ID': supply_id, 'Quantity_Used': 1,
+                            'Location': 'Main Store'}, 'Usage_ID'),
+        'orders': ('order', {'Date': today.isoformat(), 'Supplier_ID': supplier_id, 'Supply_ID': supply_id,
+                             'Quantity_Received': 5, 'Total_Cost': 20}, 'Order_ID'),
+        'restocks': ('restock', {'Supply_ID': supply_id, 'Quantity_Requested': 5}, 'Request_ID'),
+        'purchases': ('purchase', {'Date': today.isoformat(), 'Item_Name': 'Bench item', 'Quantity': 1,
+                                   'Cost': 3.5, 'Category': 'Tea'}, 'Purchase_ID'),
+    }
+
+    result = [_get('home', '/')]
+    for resource, (singular, body, id_field) in resources.items():
+        result += [
+            _get(f'get_{resource}', f'/{resource}'),
+            _get(f'get_{resource}', f'/{resource}?limit=500'),
+            _post(f'create_{singular}', f'/{resource}', body),
+            _delete(f'delete_{singular}', f'/{resource}', body, id_field),
+        ]
+    stock = {'Supply_ID': supply_id, 'Quantity_Available': 5}
+    result += [
+        _get('get_stock', '/stock'),
+        _get('get_stock', '/stock?limit=500'),
+        _stock('create_stock', 'POST', stock),
+        _stock('delete_stock', 'DELETE', stock),
+        _get('get_locations', '/locations'),
+        _get('get_location', f'/locations/{location_id}'),
+        _create_location({'Name': 'Bench location'}),
+        _delete('delete_location', '/locations', {'Name': 'Bench location (deleted)'}, 'Location_ID'),
+        _get('get_usage', '/usage?limit=500&fields=Usage_ID,Date,Quantity_Used'),
+        _get('get_supply', f'/supplies/{supply_id}'),
+        _get('get_usage', f'/usage?supply_id={supply_id}&{month}'),
+        _get('get_expenses', f'/expenses?{month}&category=Utilities'),
+        _get('get_stock_movements', f'/stock/movements?supply_id={supply_id}'),
+        _get('get_lots', f'/lots?supply_id={supply_id}'),
+        _get('get_lots', '/lots?limit=500'),
+        _post('bulk_create', '/usage/bulk', [
+            {'Date': today.isoformat(), 'Supply_ID': supply_id, 'Quantity_Used': 1, 'Location': 'Main Store'}
+        ] * 500),
+        _bulk_delete([{'Supply_ID': supply_id, 'Quantity_Used': 1, 'Location': 'Main Store'}] * 500,
+                     today - timedelta(days=365 * 20)),
+        _get('get_usage_archive', f'/archive/usage?supply_id={supply_id}'),
+        _get('get_expenses_archive', '/archive/expenses'),
+        _get('export_table', f'/export/usage.ndjson?{month}'),
+        _get('export_table', f'/export/expenses.csv?{month}'),
+        _get('get_expiring_soon', '/analytics/expiring-soon'),
+        _get('get_stock_alerts', '/analytics/stock-alerts'),
+        _get('get_stock_alerts', f"/analytics/stock-alerts?location={quote(ids['Location'])}"),
+        _get('get_forecast', '/analytics/forecast'),
+        _get('get_reorder_plan', '/analytics/reorder-plan'),
+        _post('create_planned_restocks', '/restocks/plan', None),
+        _receive_restock({'Supply_ID': supply_id, 'Quantity_Requested': 5, 'Request_Type': 'Purchase from Supplier'}),
+        _get('get_spending_trends', '/analytics/spending-trends'),
+        _get('get_spend', '/analytics/spend?group_by=month,source'),
+        _get('get_spend', f'/analytics/spend?group_by=category&source=orders&supplier_id={supplier_id}'),
+        _get('get_dashboard_summary', '/dashboard/summary'),
+        _get('get_pool_status', '/admin/pool'),
+        _get('get_metrics', '/metrics'),
+        _get('get_events', '/events?last_event_id=0&once=1'),
+        _get('get_sync', '/sync'),
+        _get('get_sync', '/sync?since=0&tables=Supplies,Store_Stock'),
+        _post('create_job', '/jobs', {'path': '/analytics/spending-trends'}),
+        _job('get_job', 'GET'),
+        _job('get_job_result', 'GET', '/result'),
+        _job('delete_job', 'DELETE'),
+    ]
+    return result
+
+
+# Endpoints registered on `app` that no scenario covers
+def uncovered_endpoints(app, scenario_list):
+    covered = {s.endpoint for s in scenario_list}
+    return sorted({r.endpoint.rpartition('.')[2] for r in app.url_map.iter_rules()} - covered - {'static'})
+
+
+# Times `requests` sequential requests of one scenario (after `warmup`
+# untimed ones) and counts the statements each sends to the database.
+# With cold=True the response cache is emptied before every request.
+def run_scenario(client, scenario, requests=20, warmup=2, cold=False):
+    latencies, queries, sizes, statuses = [], [], [], set()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for i in range(warmup + requests):
+        url = scenario.prepare(client) if scenario.prepare else scenario.url
+        if cold:
+            response_cache.clear()
+        statements.clear()
+        for engine in db.engines.values():
+            event.listen(engine, 'before_cursor_execute', count)
+        try:
+            started = time.perf_counter()
+            response = client.open(url, method=scenario.method, json=scenario.body)
+            size = len(response.get_data())
+            elapsed = time.perf_counter() - started
+        finally:
+            for engine in db.engines.values():
+                event.remove(engine, 'before_cursor_execute', count)
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            queries.append(len(statements))
+            sizes.append(size)
+            statuses.add(response.status_code)
+
+    latencies = np.array(latencies)
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'endpoint': scenario.endpoint,
+        'status': sorted(statuses),
+        'requests': requests,
+        'p50_ms': round(float(p50), 3),
+        'p95_ms': round(float(p95), 3),
+        'p99_ms': round(float(p99), 3),
+        'mean_ms': round(float(latencies.mean()), 3),
+        'throughput_rps': round(float(1000 * requests / latencies.sum()), 1),
+        'queries': int(np.median(queries)),
+        'bytes': int(np.median(sizes)),
+    }
+
+
+def run(app, requests=20, warmup=2, cold=False, only=None):
+    results = {}
+    client = app.test_client()
+    with app.app_context():
+        for scenario in scenarios(first_ids()):
+            if only and only not in scenario.name:
+                continue
+            results[scenario.name] = run_scenario(client, scenario, requests, warmup, cold)
+            job_runner.join()
+            db.session.remove()
+    return results
+
+
+# Times the full-page list scenarios (?limit=500) once per LIST_SERIALIZER,
+# plain rows + orjson ("core") against model instances + to_dict() ("orm")
+def compare_serializers(app, requests=20, warmup=2):
+    results = {}
+    client = app.test_client()
+    configured = app.config['LIST_SERIALIZER']
+    with app.app_context():
+        try:
+            for scenario in scenarios(first_ids()):
+                if scenario.method != 'GET' or 'limit=500' not in (scenario.url or ''):
+                    continue
+                for serializer in ('orm', 'core'):
+                    app.config['LIST_SERIALIZER'] = serializer
+                    results.setdefault(scenario.name, {})[serializer] = run_scenario(client, scenario, requests, warmup)
+                    db.session.remove()
+        finally:
+            app.config['LIST_SERIALIZER'] = configured
+    return results
+
+
+def print_comparison(results):
+    print(f"{'scenario':<58} {'orm p50':>9} {'core p50':>9} {'speedup':>8} {'bytes':>9}")
+    for name, r in results.items():
+        orm, core = r['orm'], r['core']
+        print(f"{name[:58]:<58} {orm['p50_ms']:>9.2f} {core['p50_ms']:>9.2f} "
+              f"{orm['p50_ms'] / core['p50_ms']:>7.1f}x {core['bytes']:>9}")
+
+
+# Scenarios slower than the baseline by more than `tolerance` at p95 (and by
+# at least `floor_ms`, to ignore noise on fast routes), or sending more
+# statements to the database than before
+def regressions(results, baseline, tolerance=0.25, floor_ms=5.0):
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        limit = max(before['p95_ms'] * (1 + tolerance), before['p95_ms'] + floor_ms)
+        if result['p95_ms'] > limit:
+            found.append(f"{name}: p95 {result['p95_ms']}ms > {before['p95_ms']}ms baseline")
+        if result['queries'] > before['queries']:
+            found.append(f"{name}: {result['queries']} queries > {before['queries']} baseline")
+    return found
+
+
+def print_table(results):
+    print(f"{'scenario':<58} {'status':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'req/s':>8} {'queries':>7}")
+    for name, r in results.items():
+        status = ','.join(str(s) for s in r['status'])
+        print(f"{name[:58]:<58} {status:>9} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} "
+              f"{r['throughput_rps']:>8.1f} {r['queries']:>7}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every API route through the Flask test client.')
+    parser.add_argument('--requests', type=int, default=20, help='timed requests per scenario')
+    parser.add_argument('--warmup', type=int, default=2, help='untimed requests per scenario')
+    parser.add_argument('--cold', action='store_true', help='empty the response cache before every request')
+    parser.add_argument('--only', help='run only scenarios whose name contains this text')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='baseline file to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed p95 slowdown, e.g. 0.25 = 25%%')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--compare-serializers', action='store_true',
+                        help='time the full-page lists with the to_dict() and plain-row serializers')
+    args = parser.parse_args(argv)
+
+    from app import create_app
+    app = create_app()
+
+    if args.compare_serializers:
+        print_comparison(compare_serializers(app, args.requests, args.warmup))
+        return 0
+
+    with app.app_context():
+        missing = uncovered_endpoints(app, scenarios(first_ids()))
+    if missing:
+        print(f"Routes without a benchmark scenario: {', '.join(missing)}")
+        return 1
+
+    results = run(app, args.requests, args.warmup, args.cold, args.only)
+    print_table(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f'Baseline written to {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f), args.tolerance)
+        for line in found:
+            print(f'REGRESSION {line}')
+        return 1 if found else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+import csv
+import io
+from datetime import datetime
+from functools import lru_cache
+
+from flask import request
+from sqlalchemy import or_, select
+
+from changefeed import insert_logged
+from rollups import apply_usage
+from spend import SPEND_MODELS, apply_spend
+from ledger import usage_movements, order_movements, record_movements
+from lots import allocate_lots, receive_orders
+from models import db, Supplies, Suppliers, Locations, Expenses, UsageRecords, SupplyOrders, MarketPurchases
+
+MAX_BULK_ROWS = 50000
+
+
+class BulkPayloadError(ValueError):
+    pass
+
+
+# ---------- Field parsers ----------
+# A batch repeats a few dates many times; each is parsed once
+@lru_cache(maxsize=4096)
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _date(value):
+    if isinstance(value, str):
+        return _parse_date(value)
+    raise ValueError('must be a date in YYYY-MM-DD format')
+
+
+def _int(value):
+    if isinstance(value, bool):
+        raise ValueError('must be an integer')
+    return int(value)
+
+
+def _float(value):
+    if isinstance(value, bool):
+        raise ValueError('must be a number')
+    return float(value)
+
+
+def _str(value):
+    return str(value)
+
+
+def _today():
+    return datetime.now().date()
+
+
+# Per table: model and {field: (parser, required, default)}.
+# Required fields and defaults mirror the single-row POST routes.
+BULK_TABLES = {
+    'usage': (UsageRecords, {
+        'Date': (_date, False, _today),
+        'Supply_ID': (_int, True, None),
+        'Quantity_Used': (_float, True, None),
+        'Location': (_str, False, None),
+        'Location_ID': (_int, False, None),
+    }),
+    'purchases': (MarketPurchases, {
+        'Date': (_date, False, _today),
+        'Item_Name': (_str, True, None),
+        'Quantity': (_float, False, lambda: 1),
+        'Cost': (_float, True, None),
+        'Category': (_str, False, None),
+    }),
+    'orders': (SupplyOrders, {
+        'Date': (_date, False, _today),
+        'Supplier_ID': (_int, True, None),
+        'Supply_ID': (_int, True, None),
+        'Quantity_Received': (_float, True, None),
+        'Total_Cost': (_float, True, None),
+        'Expiry_Date': (_date, False, None),
+    }),
+    'expenses': (Expenses, {
+        'Date': (_date, False, _today),
+        'Category': (_str, False, None),
+        'Amount': (_float, True, None),
+    }),
+}
+
+# Foreign keys checked against the database in one query per referenced table
+FOREIGN_KEYS = {
+    'Supply_ID': Supplies.Supply_ID,
+    'Supplier_ID': Suppliers.Supplier_ID,
+    'Location_ID': Locations.Location_ID,
+}
+
+
+# ---------- Payload ----------
+# Accepts a JSON array, {"rows": [...]}, a text/csv body or a multipart "file" upload.
+def read_payload():
+    if 'file' in request.files:
+        return list(csv.DictReader(io.StringIO(request.files['file'].read().decode('utf-8-sig'))))
+    if request.mimetype == 'text/csv':
+        return list(csv.DictReader(io.StringIO(request.get_data(as_text=True))))
+
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        data = data.get('rows')
+    if not isinstance(data, list):
+        raise BulkPayloadError('Expected a JSON array of rows or a CSV upload')
+    return data
+
+
+# ---------- Validation ----------
+def validate_rows(table, rows):
+    model, fields = BULK_TABLES[table]
+    valid, errors = [], []
+
+    for index, raw in enumerate(rows):
+        if not isinstance(raw, dict):
+            errors.append({'row': index, 'error': 'Row must be an object'})
+            continue
+        row, row_errors = {}, []
+        for field, (parse, required, default) in fields.items():
+            value = raw.get(field)
+            if value is None or value == '':
+                if required:
+                    row_errors.append(f"'{field}' is required")
+                else:
+                    row[field] = default() if default else None
+                continue
+            try:
+                row[field] = parse(value)
+            except (TypeError, ValueError):
+                row_errors.append(f"'{field}' has an invalid value: {value!r}")
+        if row_errors:
+            errors.append({'row': index, 'error': '; '.join(row_errors)})
+        else:
+            valid.append((index, row))
+
+    for field, column in FOREIGN_KEYS.items():
+        if field not in fields:
+            continue
+        wanted = {row[field] for _, row in valid if row[field] is not None}
+        if not wanted:
+            continue
+        existing = set(db.session.execute(select(column).where(column.in_(wanted))).scalars())
+        for index, row in valid:
+            if row[field] is not None and row[field] not in existing:
+                errors.append({'row': index, 'error': f"'{field}' {row[field]} does not exist"})
+
+    errors.sort(key=lambda e: e['row'])
+    return model, [row for _, row in valid], errors
+
+
+# ---------- Locations ----------
+# Fills in each usage row's Location_ID from its Location name, or the name
+# from its Location_ID, with one query. A name that is not a Location stays
+# free text without an id. Returns the Location_IDs that do not exist.
+def resolve_locations(rows):
+    ids = {r['Location_ID'] for r in rows if r.get('Location_ID') is not None}
+    names = {r['Location'] for r in rows if r.get('Location') and r.get('Location_ID') is None}
+    found = db.session.execute(
+        select(Locations.Location_ID, Locations.Name)
+        .where(or_(Locations.Location_ID.in_(ids), Locations.Name.in_(names)))
+    ).all() if ids or names else []
+    by_id = dict(found)
+    by_name = {name: location_id for location_id, name in found}
+
+    for r in rows:
+        if r.get('Location_ID') is not None:
+            r['Location'] = by_id.get(r['Location_ID'])
+        else:
+            r['Location_ID'] = by_name.get(r.get('Location'))
+    return sorted(ids - set(by_id))
+
+
+# ---------- Insert ----------
+# One executemany INSERT inside the caller's transaction. Rows go to the
+# table directly, without the ORM's per-row bulk insert bookkeeping, and
+# come back with their keys, logged to the change feed as created.
+def insert_rows(model, rows):
+    if model is UsageRecords:
+        resolve_locations(rows)
+    insert_logged(model, rows)
+    if model is UsageRecords:
+        apply_usage(rows)
+        record_movements(allocate_lots(usage_movements(rows)))
+    elif model is SupplyOrders:
+        receive_orders(rows)
+        record_movements(order_movements(rows))
+    if model in SPEND_MODELS:
+        apply_spend(SPEND_MODELS[model], rows)
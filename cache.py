@@ -0,0 +1,167 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from flask import current_app, request, make_response
+from werkzeug.utils import import_string
+
+from models import tables_committed
+from etags import version_stamp
+
+MISSING = object()
+
+
+# ---------- Backends ----------
+# A backend stores (value, tags) under a key and drops every entry carrying
+# one of the given tags on invalidate(). Select one with CACHE_BACKEND.
+class MemoryBackend:
+    def __init__(self, max_entries=256, ttl=60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, tags, expires = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, tags):
+        with self._lock:
+            self._entries[key] = (value, frozenset(tags), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, tags):
+        with self._lock:
+            stale = [k for k, (_, entry_tags, _) in self._entries.items() if entry_tags & tags]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class NullBackend:
+    def __init__(self, **kwargs):
+        pass
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, tags):
+        pass
+
+    def invalidate(self, tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'null': NullBackend
+}
+
+
+# ---------- Response cache ----------
+class ResponseCache:
+    def __init__(self, app=None):
+        self.backend = NullBackend()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; a computation that overlaps one is not stored
+        self._generation = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memory')
+        backend_class = BACKENDS.get(backend) or import_string(backend)
+        self.backend = backend_class(
+            max_entries=app.config.get('CACHE_MAX_ENTRIES', 256),
+            ttl=app.config.get('CACHE_TTL', 60)
+        )
+        tables_committed.connect(self._on_commit, weak=False)
+        app.extensions['response_cache'] = self
+
+    def _on_commit(self, sender, tables):
+        self.invalidate(tables)
+
+    def invalidate(self, tables):
+        with self._lock:
+            self._generation += 1
+        self.backend.invalidate(frozenset(tables))
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+        self.backend.clear()
+
+    # Concurrent misses on the same key wait on one lock, so only the first
+    # request computes the value and the rest read it from the backend.
+    def get_or_compute(self, key, tags, compute):
+        value = self.backend.get(key)
+        if value is not MISSING:
+            return value, True
+
+        with self._lock:
+            key_lock = self._inflight.setdefault(key, threading.Lock())
+        try:
+            with key_lock:
+                value = self.backend.get(key)
+                if value is not MISSING:
+                    return value, True
+                generation = self._generation
+                value = compute()
+                if value is not None and generation == self._generation:
+                    self.backend.set(key, value, tags)
+                return value, False
+        finally:
+            with self._lock:
+                if self._inflight.get(key) is key_lock:
+                    del self._inflight[key]
+
+
+response_cache = ResponseCache()
+
+
+# Caches successful responses of a GET view, keyed by path, query string,
+# day (results depend on today's date) and the version counters of `tables`,
+# the tables the view reads. A commit in this process touching any of them
+# drops the entry; the versions in the key keep other workers' writes visible.
+def cached(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = f"{request.path}?{request.query_string.decode()}@{date.today().isoformat()}#{version_stamp(tables)}"
+            uncached = []
+
+            def compute():
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    uncached.append(response)
+                    return None
+                return response.get_data(), response.mimetype
+
+            value, hit = response_cache.get_or_compute(key, tables, compute)
+            if value is None:
+                return uncached[0]
+            body, mimetype = value
+            response = current_app.response_class(body, mimetype=mimetype)
+            response.headers['X-Cache'] = 'HIT' if hit else 'MISS'
+            return response
+        return wrapper
+    return decorator
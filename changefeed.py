@@ -0,0 +1,356 @@
+import json
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, event, func, insert, or_, select
+from sqlalchemy.orm import Session
+
+from models import db, ChangeEvents
+from serialize import dumps
+
+# Derived and bookkeeping tables are not part of the feed
+FEED_EXCLUDED = {'Usage_Daily', 'Table_Versions', 'Change_Events', 'Schema_Migrations', 'Stock_Movements',
+                 'Spend_Monthly'}
+
+# Ids below the newest one seen that have not shown up yet may belong to a
+# transaction still committing; they are looked for again for this long.
+GAP_GRACE_SECONDS = 10
+
+# Logged row ids per IN (...) when reading their committed values
+LOGGED_CHUNK_SIZE = 500
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return value
+
+
+def _row(obj):
+    return {attr.key: _json_value(getattr(obj, attr.key)) for attr in obj.__mapper__.column_attrs}
+
+
+def _row_id(obj):
+    identity = obj.__mapper__.primary_key_from_instance(obj)
+    return identity[0] if len(identity) == 1 else None
+
+
+# ---------- Capture ----------
+# Rows inserted, updated or deleted by ORM flushes are collected on the session
+# and written to Change_Events by the committing transaction. So are the rows
+# Core writers log with log_rows(), bulk inserts included. Other Core bulk
+# writes and ON DELETE actions have no row ids; they produce one 'changed'
+# event per table instead.
+def _pending_events(session):
+    return session.info.setdefault('change_events', [])
+
+
+# Logs rows of `table_name` a Core statement run with
+# execution_options(rows_logged=True) has written in this transaction. Each
+# becomes an event with the row as committed ('deleted' if it is gone).
+def log_rows(table_name, ids, action='updated'):
+    if table_name in FEED_EXCLUDED:
+        return
+    logged = db.session.info.setdefault('logged_rows', {}).setdefault(table_name, {})
+    for id_ in ids:
+        logged.setdefault(id_, action)
+
+
+# Inserts `rows` into `model`'s table with one executemany, writes each one's
+# generated primary key into it and logs them as created. Neither SQLite nor
+# MySQL hands the keys of an executemany back, so they are read afterwards:
+# the newest len(rows) keys above the highest one seen before the insert,
+# which were given out in row order. Rows other transactions add in the
+# meantime cannot be among them: SQLite has one writer at a time, so they
+# come before this batch, and under InnoDB's REPEATABLE READ (pinned in
+# config.py) rows committed after that first read are not visible to this
+# transaction.
+def insert_logged(model, rows):
+    table = model.__table__
+    key = table.primary_key.columns[0]
+    before = db.session.execute(select(func.max(key))).scalar() or 0
+    db.session.execute(insert(table).execution_options(rows_logged=True), rows)
+    ids = db.session.execute(
+        select(key).where(key > before).order_by(key.desc()).limit(len(rows))
+    ).scalars().all()[::-1]
+    if len(ids) != len(rows):
+        raise RuntimeError(f'Expected {len(rows)} new {table.name} rows, found {len(ids)}')
+    for row, id_ in zip(rows, ids):
+        row[key.key] = id_
+    log_rows(table.name, ids, 'created')
+
+
+def _logged_events(session, logged):
+    events = []
+    for name, actions in sorted(logged.items()):
+        table = db.metadata.tables[name]
+        key = table.primary_key.columns[0]
+        ids = sorted(actions)
+        rows = {}
+        for start in range(0, len(ids), LOGGED_CHUNK_SIZE):
+            rows.update((r[key.key], dict(r)) for r in session.execute(
+                select(*table.columns).where(key.in_(ids[start:start + LOGGED_CHUNK_SIZE]))
+            ).mappings())
+        for id_, action in sorted(actions.items()):
+            row = rows.get(id_)
+            events.append({
+                'table': name,
+                'action': action if row is not None else 'deleted',
+                'id': id_,
+                'row': row,
+            })
+    return events
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_rows(session, flush_context):
+    events = _pending_events(session)
+    for action, objects in (('created', session.new), ('updated', session.dirty), ('deleted', session.deleted)):
+        for obj in objects:
+            table = obj.__table__.name
+            if table in FEED_EXCLUDED or (action == 'updated' and not session.is_modified(obj)):
+                continue
+            events.append({
+                'table': table,
+                'action': action,
+                'id': _row_id(obj),
+                'row': None if action == 'deleted' else _row(obj),
+            })
+
+
+@event.listens_for(Session, 'before_commit')
+def _write_events(session):
+    session.flush()
+    events = session.info.pop('change_events', []) + _logged_events(session, session.info.pop('logged_rows', {}))
+    with_rows = {e['table'] for e in events}
+    bulk_tables = session.info.get('bulk_tables', ())
+    bulk = sorted(t for t in session.info.get('changed_tables', ())
+                  if t not in FEED_EXCLUDED and (t not in with_rows or t in bulk_tables))
+    events += [{'table': t, 'action': 'changed', 'id': None, 'row': None} for t in bulk]
+    if not events:
+        return
+    now = datetime.now()
+    session.connection().execute(insert(ChangeEvents.__table__), [
+        {'Created_At': now, 'Table_Name': e['table'], 'Action': e['action'], 'Row_ID': e['id'],
+         'Payload': dumps(e['row']).decode() if e['row'] is not None else None}
+        for e in events
+    ])
+    session.info['change_events_written'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _wake_feed(session):
+    if session.info.pop('change_events_written', False):
+        change_feed.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_events(session):
+    session.info.pop('change_events', None)
+    session.info.pop('logged_rows', None)
+    session.info.pop('change_events_written', None)
+
+
+def _event_dict(row):
+    return {
+        'id': row.Event_ID,
+        'table': row.Table_Name,
+        'action': row.Action,
+        'row_id': row.Row_ID,
+        'row': json.loads(row.Payload) if row.Payload else None,
+        'at': row.Created_At.isoformat(),
+    }
+
+
+def _sse(event_dict):
+    return f"id: {event_dict['id']}\nevent: change\ndata: {json.dumps(event_dict)}\n\n"
+
+
+# ---------- Feed ----------
+# One poller thread per worker process reads new Change_Events rows (so writes
+# from every worker are seen) into a shared ring buffer, and wakes all
+# subscribers through one Condition. An idle subscriber costs a blocked
+# generator, not a query: the poller only queries while someone listens.
+class ChangeFeed:
+    def __init__(self, app=None):
+        self.app = None
+        self._condition = threading.Condition()
+        self._buffer = deque()
+        self._seq = 0
+        self._evicted_seq = 0
+        self._last_id = None
+        self._gaps = {}
+        self._subscribers = 0
+        self._wake = threading.Event()
+        self._poller = None
+        self._last_prune = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.poll_interval = app.config.get('CHANGE_FEED_POLL_INTERVAL', 1.0)
+        self.heartbeat = app.config.get('CHANGE_FEED_HEARTBEAT', 15)
+        self.buffer_size = app.config.get('CHANGE_FEED_BUFFER', 1000)
+        self.backlog_limit = app.config.get('CHANGE_FEED_BACKLOG', 1000)
+        self.retention = timedelta(hours=app.config.get('CHANGE_FEED_RETENTION_HOURS', 24))
+        self.max_subscribers = app.config.get('CHANGE_FEED_MAX_SUBSCRIBERS', 0)
+        app.extensions['change_feed'] = self
+
+    # Whether a new stream would go over CHANGE_FEED_MAX_SUBSCRIBERS
+    def full(self):
+        with self._condition:
+            return bool(self.max_subscribers) and self._subscribers >= self.max_subscribers
+
+    def wake(self):
+        self._wake.set()
+
+    # Started on the first subscription, so it is never inherited across a fork
+    def _ensure_poller(self):
+        with self._condition:
+            if self._poller is None or not self._poller.is_alive():
+                self._poller = threading.Thread(target=self._poll_forever, name='greatea-change-feed', daemon=True)
+                self._poller.start()
+
+    def _poll_forever(self):
+        while True:
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._condition:
+                if not self._subscribers:
+                    # Nobody listens: re-anchor at the newest event next time
+                    self._last_id = None
+                    self._gaps.clear()
+                    continue
+            try:
+                with self.app.app_context():
+                    self.poll()
+            except Exception:
+                self.app.logger.exception('Change feed poll failed')
+
+    def _newest_id(self, connection):
+        return connection.execute(select(func.max(ChangeEvents.Event_ID))).scalar() or 0
+
+    def _anchor(self, connection):
+        with self._condition:
+            if self._last_id is None:
+                self._last_id = self._newest_id(connection)
+
+    # Reads events committed since the last poll into the buffer and wakes
+    # subscribers. Needs an app context.
+    def poll(self):
+        with db.engine.connect() as connection:
+            if self._last_id is None:
+                self._anchor(connection)
+                return
+            now = time.monotonic()
+            self._gaps = {i: seen for i, seen in self._gaps.items() if now - seen < GAP_GRACE_SECONDS}
+            condition = ChangeEvents.Event_ID > self._last_id
+            if self._gaps:
+                condition = or_(condition, ChangeEvents.Event_ID.in_(list(self._gaps)))
+            rows = connection.execute(
+                select(ChangeEvents).where(condition).order_by(ChangeEvents.Event_ID)
+            ).all()
+            if now - self._last_prune > 3600:
+                self._last_prune = now
+                connection.execute(delete(ChangeEvents.__table__).where(
+                    ChangeEvents.Created_At < datetime.now() - self.retention
+                ))
+                connection.commit()
+
+        if not rows:
+            return
+        with self._condition:
+            for row in rows:
+                e = _event_dict(row)
+                self._gaps.pop(e['id'], None)
+                if e['id'] > self._last_id:
+                    self._gaps.update((i, now) for i in range(max(self._last_id + 1, e['id'] - 1000), e['id']))
+                    self._last_id = e['id']
+                # Buffered in arrival order; subscribers follow the sequence
+                # number, so a late-committing lower id is still delivered
+                self._seq += 1
+                self._buffer.append((self._seq, e))
+            while len(self._buffer) > self.buffer_size:
+                self._evicted_seq = self._buffer.popleft()[0]
+            self._condition.notify_all()
+
+    # Stored events after `last_id`, oldest first, for a resuming client.
+    # None when some of the events it missed are no longer stored.
+    def backlog(self, last_id):
+        with db.engine.connect() as connection:
+            oldest = connection.execute(select(func.min(ChangeEvents.Event_ID))).scalar()
+            newest = self._newest_id(connection)
+            if last_id > newest or (oldest is not None and last_id + 1 < oldest):
+                return None
+            rows = connection.execute(
+                select(ChangeEvents).where(ChangeEvents.Event_ID > last_id)
+                .order_by(ChangeEvents.Event_ID).limit(self.backlog_limit)
+            ).all()
+        return [_event_dict(r) for r in rows]
+
+    def latest_id(self):
+        with db.engine.connect() as connection:
+            return self._newest_id(connection)
+
+    # Server-sent events for one subscriber. Replays stored events after
+    # `last_id` (the Last-Event-ID of a reconnecting client), then streams
+    # new ones, or stops after the replay when `once` is set; `tables` limits
+    # the feed to those tables.
+    def stream(self, last_id=None, tables=None, once=False):
+        if not once:
+            self._ensure_poller()
+        with self._condition:
+            self._subscribers += not once
+            seq = self._seq
+        try:
+            if not once:
+                # Everything committed after this point reaches the buffer
+                with db.engine.connect() as connection:
+                    self._anchor(connection)
+            yield f'retry: {int(self.poll_interval * 3000)}\n\n'
+            # Ids already sent from the database, skipped if the buffer has them too
+            sent = set()
+            if last_id is not None:
+                backlog = self.backlog(last_id)
+                if backlog is None:
+                    yield 'event: reset\ndata: {}\n\n'
+                else:
+                    for e in backlog:
+                        sent.add(e['id'])
+                        if not tables or e['table'] in tables:
+                            yield _sse(e)
+                        last_id = e['id']
+            if once:
+                return
+
+            while True:
+                with self._condition:
+                    if seq == self._seq:
+                        self._condition.wait(self.heartbeat)
+                    behind = seq < self._evicted_seq
+                    fresh = [e for s, e in self._buffer if s > seq]
+                    seq = self._seq
+                if behind and last_id is not None:
+                    # Too slow for the buffer: catch up from the table
+                    fresh = self.backlog(last_id) or []
+                if not fresh:
+                    yield ': keep-alive\n\n'
+                    continue
+                for e in fresh:
+                    if e['id'] in sent:
+                        continue
+                    sent.add(e['id'])
+                    if not tables or e['table'] in tables:
+                        yield _sse(e)
+                    last_id = e['id'] if last_id is None else max(last_id, e['id'])
+                if len(sent) > self.backlog_limit:
+                    sent = {i for i in sent if i > last_id - self.backlog_limit}
+        finally:
+            with self._condition:
+                self._subscribers -= not once
+
+
+change_feed = ChangeFeed()
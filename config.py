@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from pooling import TimedQueuePool
 
 load_dotenv()
 
@@ -10,19 +11,107 @@ DB_HOST = os.getenv("DB_HOST", "localhost")
 DB_NAME = os.getenv("DB_NAME", "greatea_inventory_db")
 DB_PORT = os.getenv("DB_PORT", "3306")
 
+# Optional read replica for /analytics/* and /dashboard/summary
+DB_REPLICA_URL = os.getenv("DB_REPLICA_URL") or (
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{os.getenv('DB_REPLICA_HOST')}:{os.getenv('DB_REPLICA_PORT', DB_PORT)}/{DB_NAME}"
+    if os.getenv("DB_REPLICA_HOST") else None
+)
+
+# Connection pool settings, applied to the primary and the replica
+def pool_options():
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': int(os.getenv("DB_POOL_SIZE", "10")),
+        'max_overflow': int(os.getenv("DB_MAX_OVERFLOW", "20")),
+        'pool_timeout': int(os.getenv("DB_POOL_TIMEOUT", "30")),
+        # Recycle before MySQL's wait_timeout closes idle connections
+        'pool_recycle': int(os.getenv("DB_POOL_RECYCLE", "280")),
+        'pool_pre_ping': os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+    }
+
 class Config:
-    # Database URI
-    SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+    # Database URI (DATABASE_URL overrides the MySQL settings)
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # InnoDB's default isolation, which bulk inserts rely on to read back the
+    # keys they were given (changefeed.insert_logged)
+    SQLALCHEMY_ENGINE_OPTIONS = {**pool_options(), 'isolation_level': 'REPEATABLE READ'}
+    SQLALCHEMY_BINDS = {'replica': {'url': DB_REPLICA_URL, **pool_options()}} if DB_REPLICA_URL else {}
     
     # Flask configuration
     SECRET_KEY = os.getenv("SECRET_KEY", "dev-key-please-change-in-production")
     
     # Pagination
     DEFAULT_PAGE_SIZE = 10
+    MAX_PAGE_SIZE = 500
+    
+    # List pages: "core" reads plain rows and encodes them with orjson, "orm"
+    # builds model instances and calls to_dict() (kept for comparison)
+    LIST_SERIALIZER = os.getenv("LIST_SERIALIZER", "core")
+    
+    # Response cache for /dashboard/summary and /analytics/* ("memory", "null" or a dotted class path)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_TTL = int(os.getenv("CACHE_TTL", "60"))
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "256"))
+    
+    # Background jobs (POST /jobs): pool size, queue bound and how long results are kept
+    JOBS_DIR = os.getenv("JOBS_DIR")
+    JOBS_MAX_WORKERS = int(os.getenv("JOBS_MAX_WORKERS", "2"))
+    JOBS_MAX_PENDING = int(os.getenv("JOBS_MAX_PENDING", "20"))
+    JOBS_RESULT_TTL = int(os.getenv("JOBS_RESULT_TTL", "3600"))
+    
+    # Change feed (GET /events): how often each worker polls Change_Events while
+    # clients listen, keep-alive interval and how long events are kept for resuming
+    CHANGE_FEED_POLL_INTERVAL = float(os.getenv("CHANGE_FEED_POLL_INTERVAL", "1"))
+    CHANGE_FEED_HEARTBEAT = int(os.getenv("CHANGE_FEED_HEARTBEAT", "15"))
+    CHANGE_FEED_RETENTION_HOURS = int(os.getenv("CHANGE_FEED_RETENTION_HOURS", "24"))
+    # Open streams a worker serves at once (0: no limit). Each one holds a
+    # thread of a gthread worker; gunicorn.conf.py keeps them to a quarter of
+    # the threads, and gunicorn.events.conf.py serves them from gevent instead
+    CHANGE_FEED_MAX_SUBSCRIBERS = int(os.getenv("CHANGE_FEED_MAX_SUBSCRIBERS", "0"))
+    
+    # Closed months kept in Usage_Records and Expenses by archive-closed-months
+    ARCHIVE_KEEP_MONTHS = int(os.getenv("ARCHIVE_KEEP_MONTHS", "12"))
+    
+    # Closed months left open in Spend_Monthly by freeze-spend-months, for
+    # late expenses and corrections
+    SPEND_OPEN_MONTHS = int(os.getenv("SPEND_OPEN_MONTHS", "1"))
+    
+    # Startup warm-up in wsgi.py: request the hot reads once before serving
+    WARM_UP = os.getenv("WARM_UP", "true").lower() in ("1", "true", "yes")
     
     # Logging
     LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
     
+    # Request/SQL metrics at /metrics and the slow query log (logger "greatea.slow_query")
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+    SLOW_QUERY_MS = int(os.getenv("SLOW_QUERY_MS", "500"))
+    # Directory the worker processes share their samples through, so /metrics
+    # covers all of them (set by gunicorn.conf.py); unset keeps them per process
+    METRICS_DIR = os.getenv("METRICS_DIR")
+    
     # CORS
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
+
+# Local SQLite database: no MySQL server needed for development or benchmarks
+class SQLiteConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL") or f"sqlite:///{os.getenv('SQLITE_PATH', 'greatea.db')}"
+    SQLALCHEMY_ENGINE_OPTIONS = {'poolclass': TimedQueuePool}
+    SQLALCHEMY_BINDS = {}
+
+# In-memory SQLite for the test suite
+class TestConfig(Config):
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    SQLALCHEMY_BINDS = {}
+    TESTING = True
+
+CONFIGS = {
+    'mysql': Config,
+    'sqlite': SQLiteConfig,
+    'test': TestConfig
+}
+
+# APP_CONFIG selects the configuration: mysql (default), sqlite or test
+def get_config(name=None):
+    return CONFIGS[name or os.getenv("APP_CONFIG", "mysql")]
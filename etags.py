@@ -0,0 +1,43 @@
+import hashlib
+from datetime import date
+from functools import wraps
+
+from flask import current_app, request, make_response
+
+from models import table_versions
+
+
+# Version counters of `tables`, read once per request
+def version_stamp(tables):
+    cache = request.environ.setdefault('greatea.table_versions', {})
+    missing = [t for t in tables if t not in cache]
+    if missing:
+        cache.update(table_versions(missing))
+    return ','.join(f'{t}:{cache[t]}' for t in sorted(tables))
+
+
+# Strong ETag for the current URL. Results may depend on today's date, so the
+# date is part of it too.
+def current_etag(tables):
+    raw = f"{request.path}?{request.query_string.decode()}|{version_stamp(tables)}|{date.today().isoformat()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+# Answers If-None-Match with 304 Not Modified when none of `tables` changed,
+# using only the Table_Versions lookup; otherwise runs the view and tags the
+# response with its ETag.
+def conditional(*tables):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = current_etag(tables)
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,85 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+
+from sqlalchemy import select
+
+from models import (db, Supplies, Suppliers, Expenses, ExpensesArchive, UsageRecords, UsageRecordsArchive, SupplyOrders,
+                    MarketPurchases)
+
+EXPORT_CHUNK_SIZE = 1000
+
+# Exportable tables: (models, output columns of a model). Usage and expenses
+# export their archive first, then the hot table, so every month is included.
+# Related names are selected through outer joins so rows stream straight from
+# the cursor.
+EXPORTS = {
+    'usage': ((UsageRecordsArchive, UsageRecords), lambda m: [
+        m.Usage_ID, m.Date, m.Supply_ID, Supplies.Name.label('Supply_Name'), m.Quantity_Used, m.Location
+    ]),
+    'expenses': ((ExpensesArchive, Expenses), lambda m: [
+        m.Expense_ID, m.Date, m.Category, m.Amount
+    ]),
+    'orders': ((SupplyOrders,), lambda m: [
+        m.Order_ID, m.Date, m.Supplier_ID, Suppliers.Name.label('Supplier_Name'), m.Supply_ID,
+        Supplies.Name.label('Supply_Name'), m.Quantity_Received, m.Total_Cost, m.Expiry_Date
+    ]),
+    'purchases': ((MarketPurchases,), lambda m: [
+        m.Purchase_ID, m.Date, m.Item_Name, m.Quantity, m.Cost, m.Category
+    ]),
+}
+
+
+# (statement, model, date column) for each table of the export, in output order
+def export_statements(name):
+    models, columns = EXPORTS[name]
+    statements = []
+    for model in models:
+        stmt = select(*columns(model))
+        if hasattr(model, 'Supply_ID'):
+            stmt = stmt.outerjoin(Supplies, Supplies.Supply_ID == model.Supply_ID)
+        if hasattr(model, 'Supplier_ID'):
+            stmt = stmt.outerjoin(Suppliers, Suppliers.Supplier_ID == model.Supplier_ID)
+        statements.append((stmt, model, model.Date))
+    return statements
+
+
+def _plain(value):
+    return value.isoformat() if isinstance(value, (date, datetime)) else value
+
+
+# Iterates the result in EXPORT_CHUNK_SIZE partitions from a server-side cursor
+# (SSCursor on PyMySQL), so only one chunk is ever held in memory.
+def _partitions(stmt):
+    result = db.session.execute(
+        stmt.execution_options(stream_results=True, yield_per=EXPORT_CHUNK_SIZE)
+    )
+    try:
+        for partition in result.partitions():
+            yield result.keys(), partition
+    finally:
+        result.close()
+
+
+# Each generator streams `statements` one after the other
+def generate_ndjson(statements):
+    for stmt in statements:
+        for keys, rows in _partitions(stmt):
+            yield ''.join(
+                json.dumps({k: _plain(v) for k, v in zip(keys, row)}) + '\n' for row in rows
+            )
+
+
+def generate_csv(statements):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([c.name for c in statements[0].selected_columns])
+    yield buffer.getvalue()
+
+    for stmt in statements:
+        for _, rows in _partitions(stmt):
+            buffer.seek(0)
+            buffer.truncate()
+            writer.writerows([_plain(v) for v in row] for row in rows)
+            yield buffer.getvalue()
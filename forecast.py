@@ -0,0 +1,123 @@
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, Supplies, StoreStock, UsageDaily
+from pagination import location_id
+
+NO_STOCKOUT_DAYS = 999
+NEED_HORIZON_DAYS = 30
+
+
+# Daily usage per supply over [start, end] as a dense (supplies x days) matrix,
+# at one location if given. One grouped query against the rollup; the matrix
+# is filled with np.add.at.
+def usage_matrix(start, end, location=None):
+    rows = db.session.query(
+        UsageDaily.Supply_ID,
+        UsageDaily.Day,
+        func.sum(UsageDaily.Quantity_Used)
+    ).filter(
+        UsageDaily.Day.between(start, end)
+    )
+    if location:
+        rows = rows.filter(UsageDaily.Location == location)
+    rows = rows.group_by(
+        UsageDaily.Supply_ID, UsageDaily.Day
+    ).all()
+
+    n_days = (end - start).days + 1
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.zeros((0, n_days))
+
+    supply_ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=len(rows))
+    day_index = np.fromiter(((r[1] - start).days for r in rows), dtype=np.int64, count=len(rows))
+    quantities = np.fromiter((r[2] or 0 for r in rows), dtype=np.float64, count=len(rows))
+
+    ids, row_index = np.unique(supply_ids, return_inverse=True)
+    matrix = np.zeros((len(ids), n_days))
+    np.add.at(matrix, (row_index, day_index), quantities)
+    return ids, matrix
+
+
+# Name and total store stock (at one location if given) for the given
+# supplies, in one query
+def supply_details(ids, location=None):
+    stock = db.session.query(
+        StoreStock.Supply_ID,
+        func.sum(StoreStock.Quantity_Available).label('quantity')
+    )
+    if location:
+        stock = stock.filter(StoreStock.Location_ID == location_id(location))
+    stock = stock.group_by(
+        StoreStock.Supply_ID
+    ).subquery()
+
+    rows = db.session.query(
+        Supplies.Supply_ID, Supplies.Name, stock.c.quantity
+    ).outerjoin(
+        stock, stock.c.Supply_ID == Supplies.Supply_ID
+    ).filter(
+        Supplies.Supply_ID.in_([int(i) for i in ids])
+    ).all()
+    return {r.Supply_ID: (r.Name, r.quantity or 0.0) for r in rows}
+
+
+# Exponential smoothing of every row at once. The recursion
+# level_t = alpha * x_t + (1 - alpha) * level_{t-1}, seeded with x_0,
+# unrolls to a fixed weight vector, so the final level is one mat-vec product.
+def exponential_smoothing(matrix, alpha):
+    n_days = matrix.shape[1]
+    powers = (1 - alpha) ** np.arange(n_days - 1, -1, -1)
+    weights = alpha * powers
+    weights[0] = powers[0]
+    return matrix @ weights
+
+
+def forecast(start, end, window, alpha, location=None):
+    ids, matrix = usage_matrix(start, end, location)
+    if len(ids) == 0:
+        return []
+
+    details = supply_details(ids, location)
+    n_days = matrix.shape[1]
+
+    # Average over the span between the first and last day with usage
+    used = matrix > 0
+    first = used.argmax(axis=1)
+    last = n_days - 1 - used[:, ::-1].argmax(axis=1)
+    span = np.maximum(last - first, 1)
+    average = matrix.sum(axis=1) / span
+
+    moving_average = matrix[:, -min(window, n_days):].mean(axis=1)
+    smoothed = exponential_smoothing(matrix, alpha)
+
+    stock = np.array([details.get(int(i), (None, 0.0))[1] for i in ids], dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        stockout = np.where(smoothed > 0, np.floor(stock / smoothed), NO_STOCKOUT_DAYS)
+        # Reorder once stock falls to 30% of what is on hand today
+        reorder = np.where(average > 0, np.floor(stock * 0.7 / average), NO_STOCKOUT_DAYS)
+    stockout = np.clip(stockout, 0, NO_STOCKOUT_DAYS)
+    reorder = np.clip(reorder, 0, NO_STOCKOUT_DAYS)
+
+    result = []
+    for i, supply_id in enumerate(ids):
+        name, current_stock = details.get(int(supply_id), (None, 0.0))
+        days_until_reorder = int(reorder[i])
+        result.append({
+            'supply_id': int(supply_id),
+            'supply_name': name or f'ID: {supply_id}',
+            'current_stock': float(current_stock),
+            'avg_daily_usage': float(average[i]),
+            'moving_average': float(moving_average[i]),
+            'smoothed_daily_usage': float(smoothed[i]),
+            'days_until_stockout': int(stockout[i]),
+            'stockout_date': (end + timedelta(days=int(stockout[i]))).isoformat()
+            if stockout[i] < NO_STOCKOUT_DAYS else None,
+            'days_until_reorder': days_until_reorder,
+            'predicted_30day_need': float(smoothed[i] * NEED_HORIZON_DAYS),
+            'reorder_status': 'Critical' if days_until_reorder <= 7
+            else ('Warning' if days_until_reorder <= 14 else 'Good')
+        })
+    return result
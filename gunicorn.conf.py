@@ -0,0 +1,55 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+# Every setting can be overridden with GUNICORN_* environment variables.
+import glob
+import multiprocessing
+import os
+import tempfile
+
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+
+# Threaded workers. Keep workers x threads within what the database accepts,
+# as every worker has its own pool of DB_POOL_SIZE (+ DB_MAX_OVERFLOW)
+# connections.
+workers = int(os.getenv("GUNICORN_WORKERS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+
+# An open GET /events stream holds a thread for as long as the client
+# listens. Route /events to gunicorn.events.conf.py in production; streams
+# that still land here may take a quarter of the threads, and more get 503.
+os.environ.setdefault("CHANGE_FEED_MAX_SUBSCRIBERS", str(max(1, threads // 4)))
+
+# Load and warm up the app once in the master (see wsgi.py); workers fork
+# with it, so a new or recycled worker's first request is not a cold one
+preload_app = True
+
+# Restart workers now and then to bound memory growth, not all at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "5000"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "500"))
+
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Worker heartbeats on tmpfs, where a busy disk cannot stall them
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
+
+# Workers share their /metrics samples through files here (see metrics.py)
+os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"greatea-metrics-{bind.rpartition(':')[2]}"))
+
+
+# Counters start from zero with every server start, not with those of the last run
+def on_starting(server):
+    for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "*.json")):
+        os.remove(path)
+
+
+# A forked worker must not share the master's pooled connections
+def post_fork(server, worker):
+    from wsgi import app
+    from warmup import dispose_engines
+    dispose_engines(app, close=False)
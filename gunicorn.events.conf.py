@@ -0,0 +1,33 @@
+# gunicorn -c gunicorn.events.conf.py wsgi:app
+# Serves GET /events (server-sent events) apart from the API; the reverse
+# proxy sends /events here and everything else to gunicorn.conf.py (see the
+# README). Every setting can be overridden with GUNICORN_EVENTS_* variables.
+import os
+
+bind = os.getenv("GUNICORN_EVENTS_BIND", "0.0.0.0:8001")
+
+# gevent workers: an open stream is a greenlet blocked on the feed, not a
+# thread, so one worker holds thousands of idle subscribers. The feed's poller
+# reads Change_Events for all of a worker's streams; PyMySQL yields to other
+# greenlets while it waits on the database.
+workers = int(os.getenv("GUNICORN_EVENTS_WORKERS", "2"))
+worker_class = "gevent"
+worker_connections = int(os.getenv("GUNICORN_EVENTS_CONNECTIONS", "2000"))
+
+# Not preloaded: gevent patches threading when a worker starts, and the feed's
+# locks must be created after that. Streams need no warm-up.
+preload_app = False
+os.environ.setdefault("WARM_UP", "false")
+os.environ.setdefault("CHANGE_FEED_MAX_SUBSCRIBERS", "0")
+
+# Streams never finish, so workers are not recycled by request count, and a
+# stop or reload only waits briefly; clients reconnect with Last-Event-ID
+max_requests = 0
+timeout = int(os.getenv("GUNICORN_EVENTS_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_EVENTS_GRACEFUL_TIMEOUT", "5"))
+
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = os.getenv("GUNICORN_ACCESS_LOG", "-")
+loglevel = os.getenv("LOG_LEVEL", "info").lower()
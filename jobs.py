@@ -0,0 +1,255 @@
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+# Views a job may run: the heavy analytics and the exports
+JOB_ENDPOINTS = {
+    'api.get_spending_trends', 'api.get_spend', 'api.get_forecast', 'api.get_reorder_plan',
+    'api.get_stock_alerts', 'api.get_expiring_soon', 'api.get_dashboard_summary', 'api.export_table',
+}
+
+FINISHED = ('done', 'failed', 'cancelled')
+JOB_ID = re.compile(r'^[0-9a-f]{32}$')
+
+
+class JobError(ValueError):
+    pass
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# ---------- Job runner ----------
+# Runs analytics and export views off the request thread on a small thread
+# pool. Job state lives in JOBS_DIR as <id>.json next to the <id>.result body,
+# so any worker process on the host can report status, serve the result or
+# request cancellation (<id>.cancel), whichever worker runs the job.
+class JobRunner:
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.directory = app.config.get('JOBS_DIR') or os.path.join(tempfile.gettempdir(), 'greatea-jobs')
+        self.max_workers = app.config.get('JOBS_MAX_WORKERS', 2)
+        self.max_pending = app.config.get('JOBS_MAX_PENDING', 20)
+        self.result_ttl = app.config.get('JOBS_RESULT_TTL', 3600)
+        os.makedirs(self.directory, exist_ok=True)
+        app.extensions['jobs'] = self
+
+    # The pool is created on first use, so it is never inherited across a fork
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='greatea-job')
+            return self._executor
+
+    def _path(self, job_id, suffix):
+        return os.path.join(self.directory, f'{job_id}.{suffix}')
+
+    def _write(self, job):
+        tmp = self._path(job['id'], 'json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(job, f)
+        os.replace(tmp, self._path(job['id'], 'json'))
+
+    def _update(self, job_id, **fields):
+        job = self.status(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        self._write(job)
+        return job
+
+    # Queues `path` (e.g. /analytics/spending-trends) with query `params` and
+    # returns the new job. Raises JobError for a path no job may run and
+    # JobQueueFull when max_pending jobs are already waiting or running here.
+    def submit(self, path, params=None):
+        self.purge_expired()
+        if not isinstance(path, str):
+            raise JobError("'path' is required")
+        try:
+            endpoint, _ = self.app.url_map.bind('localhost').match(path, method='GET')
+        except HTTPException:
+            endpoint = None
+        if endpoint not in JOB_ENDPOINTS:
+            raise JobError(f"'{path}' cannot run as a job")
+        if params is not None and not isinstance(params, dict):
+            raise JobError("'params' must be an object")
+
+        with self._lock:
+            active = sum(1 for f in self._futures.values() if not f.done())
+            if active >= self.max_pending:
+                raise JobQueueFull(f'At most {self.max_pending} jobs may be queued')
+
+        job = {
+            'id': uuid.uuid4().hex,
+            'path': path,
+            'params': {k: str(v) for k, v in (params or {}).items()},
+            'status': 'queued',
+            'created_at': _now(),
+            'started_at': None,
+            'finished_at': None,
+            'expires_at': None,
+            'mimetype': None,
+            'filename': None,
+            'size': None,
+            'error': None,
+        }
+        self._write(job)
+        future = self._pool().submit(self._run, job['id'])
+        with self._lock:
+            self._futures[job['id']] = future
+        future.add_done_callback(lambda f, job_id=job['id']: self._forget(job_id))
+        return job
+
+    def _forget(self, job_id):
+        with self._lock:
+            self._futures.pop(job_id, None)
+
+    # Current state of a job, or None if it is unknown or expired
+    def status(self, job_id):
+        if not JOB_ID.match(job_id or ''):
+            return None
+        try:
+            with open(self._path(job_id, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def result_path(self, job_id):
+        return self._path(job_id, 'result')
+
+    # Cancels a queued or running job. A finished job is deleted with its result.
+    def cancel(self, job_id):
+        job = self.status(job_id)
+        if job is None:
+            return None
+        if job['status'] in FINISHED:
+            self._delete(job_id)
+            job['deleted'] = True
+            return job
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None and future.cancel():
+            return self._finish(job_id, 'cancelled')
+        # Running, or queued in another worker: the job checks for this file
+        open(self._path(job_id, 'cancel'), 'w').close()
+        job['cancel_requested'] = True
+        return job
+
+    def _cancel_requested(self, job_id):
+        return os.path.exists(self._path(job_id, 'cancel'))
+
+    def _finish(self, job_id, status, **fields):
+        finished = datetime.now()
+        return self._update(
+            job_id, status=status, finished_at=finished.isoformat(timespec='seconds'),
+            expires_at=(finished + timedelta(seconds=self.result_ttl)).isoformat(timespec='seconds'),
+            **fields
+        )
+
+    def _delete(self, job_id):
+        for suffix in ('json', 'result', 'result.tmp', 'cancel'):
+            try:
+                os.remove(self._path(job_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    # Drops finished jobs past their expiry, with their results
+    def purge_expired(self):
+        now = _now()
+        for filename in os.listdir(self.directory):
+            if filename.endswith('.json'):
+                job = self.status(filename[:-5])
+                if job and job['expires_at'] and job['expires_at'] < now:
+                    self._delete(job['id'])
+
+    # Runs the view through the normal request pipeline (hooks, error
+    # handlers) and writes the body chunk by chunk, checking for cancellation
+    # between chunks.
+    def _run(self, job_id):
+        job = self.status(job_id)
+        if job is None:
+            return
+        if self._cancel_requested(job_id):
+            self._finish(job_id, 'cancelled')
+            return
+        self._update(job_id, status='running', started_at=_now())
+        tmp = self._path(job_id, 'result.tmp')
+        try:
+            with self.app.test_request_context(job['path'], query_string=job['params']):
+                response = self.app.full_dispatch_request()
+                with open(tmp, 'wb') as f:
+                    for chunk in response.iter_encoded():
+                        if self._cancel_requested(job_id):
+                            raise JobCancelled()
+                        f.write(chunk)
+                response.close()
+            if response.status_code != 200:
+                with open(tmp) as f:
+                    error = f.read()
+                try:
+                    error = json.loads(error).get('error', error)
+                except (ValueError, AttributeError):
+                    pass
+                os.remove(tmp)
+                self._finish(job_id, 'failed', error=error)
+                return
+            os.replace(tmp, self.result_path(job_id))
+            self._finish(job_id, 'done', mimetype=response.mimetype, filename=_filename(job['path'], response.mimetype),
+                         size=os.path.getsize(self.result_path(job_id)))
+        except JobCancelled:
+            os.remove(tmp)
+            self._finish(job_id, 'cancelled')
+        except Exception as e:
+            logger.exception('Job %s failed', job_id)
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            self._finish(job_id, 'failed', error=str(e))
+
+    # Waits for the jobs running in this process, e.g. before shutdown
+    def join(self, timeout=None):
+        with self._lock:
+            futures = list(self._futures.values())
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for future in futures:
+            remaining = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                future.result(timeout=remaining)
+            except Exception:
+                pass
+
+
+# Download name: usage.csv for /export/usage.csv, spending-trends.json for analytics
+def _filename(path, mimetype):
+    name = path.rstrip('/').rsplit('/', 1)[-1]
+    return name if '.' in name else f"{name}.{'json' if mimetype == 'application/json' else 'txt'}"
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+job_runner = JobRunner()
@@ -0,0 +1,201 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import bindparam, func, insert, select, update
+
+from changefeed import log_rows
+from models import db, Supplies, StoreStock, StockMovements
+from rollups import insert_ignore
+
+# The two balances a movement can change
+INVENTORY = 'inventory'   # Supplies.Total_Quantity
+STORE = 'store'           # Store_Stock.Quantity_Available, summed per (supply, location)
+
+
+def _getter(record):
+    return record.get if isinstance(record, dict) else lambda k: getattr(record, k, None)
+
+
+def _movement(supply_id, balance, quantity, reason, source_table, source_id, location_id=None):
+    return {'Supply_ID': supply_id, 'Balance': balance, 'Location_ID': location_id, 'Quantity': quantity,
+            'Reason': reason, 'Source_Table': source_table, 'Source_ID': source_id}
+
+
+# ---------- Movements ----------
+# Ledger entries for usage, order and restock rows (dicts or model objects).
+# sign=-1 builds the entries that back a deleted row out again.
+def usage_movements(records, sign=1):
+    result = []
+    for r in records:
+        get = _getter(r)
+        result.append(_movement(get('Supply_ID'), STORE, -sign * (get('Quantity_Used') or 0),
+                                'usage' if sign > 0 else 'usage_deleted', 'Usage_Records', get('Usage_ID'),
+                                get('Location_ID')))
+    return result
+
+
+def order_movements(records, sign=1):
+    result = []
+    for r in records:
+        get = _getter(r)
+        result.append(_movement(get('Supply_ID'), INVENTORY, sign * (get('Quantity_Received') or 0),
+                                'order' if sign > 0 else 'order_deleted', 'Supply_Orders', get('Order_ID')))
+    return result
+
+
+# A transfer moves stock from inventory to the requesting location's store
+# stock; a supplier purchase arrives in the store directly. Open requests
+# have moved nothing yet.
+def restock_movements(records, sign=1):
+    result = []
+    for r in records:
+        get = _getter(r)
+        if get('Status') == 'Open':
+            continue
+        quantity = sign * (get('Quantity_Requested') or 0)
+        reason = 'restock' if sign > 0 else 'restock_deleted'
+        if get('Request_Type') in (None, 'Transfer from Inventory'):
+            result.append(_movement(get('Supply_ID'), INVENTORY, -quantity, reason, 'Restock_Requests', get('Request_ID')))
+        result.append(_movement(get('Supply_ID'), STORE, quantity, reason, 'Restock_Requests', get('Request_ID'),
+                                get('Location_ID')))
+    return result
+
+
+# ---------- Recording ----------
+# Appends `movements` to Stock_Movements and, with apply=True, adds them onto
+# the balances in the caller's transaction. Each balance changes with an
+# in-place `SET qty = qty + :delta`, never read-modify-write, so concurrent
+# tills posting usage for the same supply cannot lose updates; the row lock
+# is held only until the caller commits, so call this last before commit.
+# apply=False records a balance the caller has already written itself, e.g.
+# the opening quantity of a new supply.
+def record_movements(movements, apply=True):
+    movements = [m for m in movements if m['Quantity'] and m['Supply_ID'] is not None]
+    if not movements:
+        return
+    now = datetime.now()
+    db.session.execute(insert(StockMovements.__table__), [{'Created_At': now, 'Location_ID': None, 'Lot_ID': None, **m} for m in movements])
+    if apply:
+        _apply_balances(movements, now)
+
+
+def _apply_balances(movements, now):
+    deltas = defaultdict(float)
+    arriving = set()
+    for m in movements:
+        location_id = m.get('Location_ID') if m['Balance'] == STORE else None
+        deltas[m['Balance'], m['Supply_ID'], location_id] += m['Quantity']
+        if m['Balance'] == STORE and m['Reason'] == 'restock':
+            arriving.add((m['Supply_ID'], location_id))
+
+    inventory = sorted((s, d) for (b, s, _), d in deltas.items() if b == INVENTORY and d)
+    store = {(s, l): d for (b, s, l), d in deltas.items() if b == STORE and d}
+    stock = StoreStock.__table__
+
+    # Store movements land on the Store_Stock row of their (supply, location),
+    # the oldest should rows without a location repeat. A restock arriving
+    # for a pair without a row creates it; usage (or deleting usage) against
+    # such a pair changes no balance and shows as ledger drift until POST
+    # /stock counts the row in.
+    first = _first_stock_rows({s for s, _ in store}) if store else {}
+    missing = sorted((k for k, d in store.items() if k not in first and k in arriving and d > 0),
+                     key=lambda k: (k[0], k[1] or 0))
+    unassigned = {s for s, l in missing if l is None}
+    if unassigned:
+        # The unique index lets NULL locations repeat, so a first unassigned
+        # row is created under its supply's row lock, re-checked once held.
+        # The supplies updated below are locked in the same statement so
+        # every lock is still taken in key order.
+        db.session.execute(
+            select(Supplies.Supply_ID).where(Supplies.Supply_ID.in_(unassigned | {s for s, _ in inventory}))
+            .order_by(Supplies.Supply_ID).with_for_update()
+        )
+        first.update(_first_stock_rows(unassigned))
+        missing = [k for k in missing if k not in first]
+    if missing:
+        # A concurrent first write of the same pair may insert it first; the
+        # upsert then leaves that row and the re-select finds it
+        insert_ignore(stock, [{'Supply_ID': s, 'Location_ID': l, 'Quantity_Available': 0, 'Last_Updated': now}
+                              for s, l in missing], ['Location_ID', 'Supply_ID'], rows_logged=True)
+        created = _first_stock_rows({s for s, _ in missing})
+        log_rows('Store_Stock', [created[k] for k in missing], 'created')
+        first.update(created)
+
+    # Rows are updated in key order so concurrent transactions lock them in
+    # the same order and cannot deadlock each other
+    if inventory:
+        supplies = Supplies.__table__
+        db.session.execute(
+            update(supplies).where(supplies.c.Supply_ID == bindparam('supply_id'))
+            .values(Total_Quantity=func.coalesce(supplies.c.Total_Quantity, 0) + bindparam('delta'))
+            .execution_options(rows_logged=True),
+            [{'supply_id': s, 'delta': d} for s, d in inventory]
+        )
+        log_rows('Supplies', [s for s, _ in inventory])
+
+    updates = sorted((first[k], d) for k, d in store.items() if k in first)
+    if updates:
+        db.session.execute(
+            update(stock).where(stock.c.Stock_ID == bindparam('stock_id'))
+            .values(Quantity_Available=func.coalesce(stock.c.Quantity_Available, 0) + bindparam('delta'),
+                    Last_Updated=now)
+            .execution_options(rows_logged=True),
+            [{'stock_id': i, 'delta': d} for i, d in updates]
+        )
+        log_rows('Store_Stock', [i for i, _ in updates])
+
+
+# {(supply, location): Stock_ID} of the supplies' Store_Stock rows, the
+# oldest where rows without a location repeat
+def _first_stock_rows(supply_ids):
+    stock = StoreStock.__table__
+    return {
+        (s, l): i for s, l, i in db.session.execute(
+            select(stock.c.Supply_ID, stock.c.Location_ID, func.min(stock.c.Stock_ID))
+            .where(stock.c.Supply_ID.in_(supply_ids))
+            .group_by(stock.c.Supply_ID, stock.c.Location_ID)
+        ).all()
+    }
+
+
+# ---------- Reconciliation ----------
+# Balances that differ from the sum of their movements, as
+# {'Supply_ID', 'Balance', 'Location_ID', 'expected', 'actual'} dicts
+def ledger_drift(tolerance=1e-6):
+    ledger = {
+        (s, b, l if b == STORE else None): q for s, b, l, q in db.session.execute(
+            select(StockMovements.Supply_ID, StockMovements.Balance, StockMovements.Location_ID,
+                   func.sum(StockMovements.Quantity))
+            .group_by(StockMovements.Supply_ID, StockMovements.Balance, StockMovements.Location_ID)
+        ).all()
+    }
+    actual = {(s, INVENTORY, None): q or 0 for s, q in db.session.execute(
+        select(Supplies.Supply_ID, Supplies.Total_Quantity)
+    ).all()}
+    actual.update({(s, STORE, l): q or 0 for s, l, q in db.session.execute(
+        select(StoreStock.Supply_ID, StoreStock.Location_ID, func.sum(StoreStock.Quantity_Available))
+        .where(StoreStock.Supply_ID.isnot(None)).group_by(StoreStock.Supply_ID, StoreStock.Location_ID)
+    ).all()})
+
+    # Movements of supplies that no longer exist are ignored
+    supplies = {s for s, b, _ in actual if b == INVENTORY}
+    drift = []
+    for key in sorted(set(ledger) | set(actual), key=lambda k: (k[0], k[1], k[2] or 0)):
+        expected, value = ledger.get(key, 0), actual.get(key, 0)
+        if key[0] in supplies and abs(expected - value) > tolerance:
+            drift.append({'Supply_ID': key[0], 'Balance': key[1], 'Location_ID': key[2],
+                          'expected': expected, 'actual': value})
+    return drift
+
+
+# Appends an 'adjustment' movement for every drifted balance so the ledger
+# matches the stored balances again, e.g. after rows were imported directly.
+# Returns the number of adjustments.
+def reconcile_ledger():
+    drift = ledger_drift()
+    record_movements([
+        _movement(d['Supply_ID'], d['Balance'], d['actual'] - d['expected'], 'adjustment', None, None, d['Location_ID'])
+        for d in drift
+    ], apply=False)
+    db.session.commit()
+    return len(drift)
@@ -0,0 +1,194 @@
+from collections import defaultdict, deque
+from datetime import datetime
+
+from sqlalchemy import bindparam, case, func, select, update
+
+from changefeed import insert_logged, log_rows
+from models import db, Supplies, SupplyLots, StoreStock, StockMovements
+
+# A lot with less than this left is depleted and closed
+EPSILON = 1e-9
+
+
+def _day(value):
+    return value.date() if isinstance(value, datetime) else value
+
+
+# ---------- Receiving ----------
+# Opens one lot per order (dicts or SupplyOrders) in the caller's transaction.
+# An order without its own Expiry_Date takes the supply's.
+def receive_orders(records):
+    orders = []
+    for r in records:
+        get = r.get if isinstance(r, dict) else lambda k: getattr(r, k, None)
+        if get('Supply_ID') is not None and (get('Quantity_Received') or 0) > 0:
+            orders.append((get('Supply_ID'), get('Order_ID'), _day(get('Date')), _day(get('Expiry_Date')),
+                           get('Quantity_Received')))
+    if not orders:
+        return
+    missing = {s for s, _, _, expiry, _ in orders if expiry is None}
+    supply_expiry = dict(db.session.execute(
+        select(Supplies.Supply_ID, Supplies.Expiry_Date).where(Supplies.Supply_ID.in_(missing))
+    ).all()) if missing else {}
+    open_lots([
+        {'Supply_ID': s, 'Order_ID': o, 'Received_Date': day, 'Expiry_Date': expiry or supply_expiry.get(s),
+         'Quantity': q}
+        for s, o, day, expiry, q in orders
+    ])
+
+
+# Inserts lots given as {'Supply_ID', 'Quantity', and optionally 'Order_ID',
+# 'Received_Date', 'Expiry_Date'} dicts
+def open_lots(lots):
+    today = datetime.now().date()
+    rows = [
+        {'Supply_ID': l['Supply_ID'], 'Order_ID': l.get('Order_ID'), 'Received_Date': l.get('Received_Date') or today,
+         'Expiry_Date': _day(l.get('Expiry_Date')), 'Quantity_Received': l['Quantity'],
+         'Quantity_Remaining': l['Quantity'], 'Is_Open': True}
+        for l in lots if l['Quantity'] and l['Quantity'] > 0
+    ]
+    if rows:
+        insert_logged(SupplyLots, rows)
+
+
+# One opening lot per supply that has stock on hand but no open lot, holding
+# its Total_Quantity plus store stock and expiring on its Expiry_Date, e.g.
+# after seeding. Returns the number of lots opened.
+def open_untracked_stock():
+    store = (
+        select(StoreStock.Supply_ID, func.sum(StoreStock.Quantity_Available).label('quantity'))
+        .group_by(StoreStock.Supply_ID).subquery()
+    )
+    with_lots = select(SupplyLots.Supply_ID).where(SupplyLots.Is_Open.is_(True))
+    rows = db.session.execute(
+        select(Supplies.Supply_ID, Supplies.Expiry_Date,
+               func.coalesce(Supplies.Total_Quantity, 0) + func.coalesce(store.c.quantity, 0))
+        .outerjoin(store, store.c.Supply_ID == Supplies.Supply_ID)
+        .where(Supplies.Supply_ID.notin_(with_lots))
+    ).all()
+    lots = [{'Supply_ID': s, 'Expiry_Date': expiry, 'Quantity': q} for s, expiry, q in rows if q > 0]
+    open_lots(lots)
+    db.session.commit()
+    return len(lots)
+
+
+# ---------- FEFO allocation ----------
+# Splits usage movements (negative store quantities) across the open lots of
+# their supply, earliest expiry first (lots without an expiry last), and takes
+# the quantities off those lots. Only the lots the usage reaches are read and
+# locked until the caller commits, so concurrent usage of a supply cannot
+# take the same units twice while usage of its later lots, deliveries and
+# other supplies go on. Usage beyond the open lots stays a movement without
+# a Lot_ID.
+def allocate_lots(movements):
+    used = defaultdict(float)
+    for m in movements:
+        if m['Quantity'] < 0 and m['Supply_ID'] is not None:
+            used[m['Supply_ID']] -= m['Quantity']
+    if not used:
+        return movements
+    # Supplies in key order so concurrent transactions lock in the same order
+    queues = {supply_id: _lock_lots(supply_id, used[supply_id]) for supply_id in sorted(used)}
+
+    taken = defaultdict(float)
+    result = []
+    for m in movements:
+        if m['Quantity'] >= 0:
+            result.append(m)
+            continue
+        needed = -m['Quantity']
+        queue = queues.get(m['Supply_ID'])
+        while needed > EPSILON and queue:
+            lot = queue[0]
+            take = min(needed, lot[1])
+            result.append({**m, 'Quantity': -take, 'Lot_ID': lot[0]})
+            taken[lot[0]] -= take
+            lot[1] -= take
+            needed -= take
+            if lot[1] <= EPSILON:
+                queue.popleft()
+        if needed > EPSILON:
+            result.append({**m, 'Quantity': -needed})
+    _adjust_lots(taken)
+    return result
+
+
+# Splits the movements reversing deleted usage rows across the lots those
+# rows were taken from, as recorded on their movements, and gives the
+# quantities back (reopening depleted lots)
+def release_lots(movements):
+    source_ids = {m['Source_ID'] for m in movements if m['Quantity'] > 0 and m['Source_ID'] is not None}
+    if not source_ids:
+        return movements
+    taken = defaultdict(list)
+    for source_id, lot_id, quantity in db.session.execute(
+        select(StockMovements.Source_ID, StockMovements.Lot_ID, func.sum(StockMovements.Quantity))
+        .where(StockMovements.Source_Table == 'Usage_Records', StockMovements.Source_ID.in_(source_ids),
+               StockMovements.Lot_ID.isnot(None))
+        .group_by(StockMovements.Source_ID, StockMovements.Lot_ID)
+        .order_by(StockMovements.Source_ID, StockMovements.Lot_ID)
+    ):
+        if quantity < -EPSILON:
+            taken[source_id].append((lot_id, -quantity))
+
+    given = defaultdict(float)
+    result = []
+    for m in movements:
+        if m['Quantity'] <= 0:
+            result.append(m)
+            continue
+        remaining = m['Quantity']
+        for lot_id, quantity in taken.pop(m['Source_ID'], []):
+            back = min(remaining, quantity)
+            result.append({**m, 'Quantity': back, 'Lot_ID': lot_id})
+            given[lot_id] += back
+            remaining -= back
+        if remaining > EPSILON:
+            result.append({**m, 'Quantity': remaining})
+    _adjust_lots(given)
+    return result
+
+
+# Open lots of a supply, FEFO, locked LOT_LOCK_BATCH at a time until they
+# hold `needed`. Dated and undated lots are read apart, each in the order of
+# ix_supply_lots_supply_open_expiry (whose entries end in Lot_ID), so MySQL
+# walks the index and stops at the LIMIT instead of sorting, and locking,
+# every open lot of the supply.
+LOT_LOCK_BATCH = 4
+
+
+def _lock_lots(supply_id, needed):
+    queue = deque()
+    for expiry, order in ((SupplyLots.Expiry_Date.isnot(None), (SupplyLots.Expiry_Date, SupplyLots.Lot_ID)),
+                          (SupplyLots.Expiry_Date.is_(None), (SupplyLots.Lot_ID,))):
+        offset = 0
+        while needed > EPSILON:
+            rows = db.session.execute(
+                select(SupplyLots.Lot_ID, SupplyLots.Quantity_Remaining)
+                .where(SupplyLots.Supply_ID == supply_id, SupplyLots.Is_Open.is_(True), expiry)
+                .order_by(*order).offset(offset).limit(LOT_LOCK_BATCH).with_for_update()
+            ).all()
+            for lot_id, remaining in rows:
+                queue.append([lot_id, remaining])
+                needed -= remaining
+            if len(rows) < LOT_LOCK_BATCH:
+                break
+            offset += LOT_LOCK_BATCH
+    return queue
+
+
+def _adjust_lots(deltas):
+    deltas = sorted((lot_id, d) for lot_id, d in deltas.items() if d)
+    if not deltas:
+        return
+    lots = SupplyLots.__table__
+    remaining = lots.c.Quantity_Remaining + bindparam('delta')
+    # Is_Open first: MySQL evaluates SET assignments left to right
+    db.session.execute(
+        update(lots).where(lots.c.Lot_ID == bindparam('lot_id')).ordered_values(
+            (lots.c.Is_Open, case((remaining > EPSILON, True), else_=False)),
+            (lots.c.Quantity_Remaining, remaining),
+        ).execution_options(rows_logged=True),
+        [{'lot_id': lot_id, 'delta': d} for lot_id, d in deltas]
+    )
+    log_rows('Supply_Lots', [lot_id for lot_id, _ in deltas])
@@ -0,0 +1,290 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from pooling import pool_status
+
+logger = logging.getLogger('greatea.slow_query')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+ENVIRON_KEY = 'greatea.metrics'
+
+# How often a process writes its samples to METRICS_DIR, at most
+FLUSH_SECONDS = 1.0
+
+
+# ---------- Primitives ----------
+# Minimal Prometheus counter and histogram keyed by a tuple of label values.
+# One lock per metric; observe() is a bisect and two additions.
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    # [[label values, value], ...] as written to METRICS_DIR
+    def snapshot(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        merged = {}
+        for snapshot in snapshots:
+            for label_values, value in snapshot:
+                key = tuple(label_values)
+                merged[key] = merged.get(key, 0) + value
+        return merged
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} counter']
+        if values is None:
+            values = self.merge([self.snapshot()])
+        for label_values, value in sorted(values.items()):
+            lines.append(f'{self.name}{_labels(self.labels, label_values)} {_number(value)}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    # [[label values, [per-bucket counts, sum]], ...] as written to METRICS_DIR
+    def snapshot(self):
+        with self._lock:
+            return [[list(k), [list(v[0]), v[1]]] for k, v in self._values.items()]
+
+    @staticmethod
+    def merge(snapshots):
+        merged = {}
+        for snapshot in snapshots:
+            for label_values, (counts, total) in snapshot:
+                entry = merged.setdefault(tuple(label_values), [[0] * len(counts), 0.0])
+                entry[0] = [a + b for a, b in zip(entry[0], counts)]
+                entry[1] += total
+        return merged
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        if values is None:
+            values = self.merge([self.snapshot()])
+        for label_values, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                le = bound if bound == '+Inf' else _number(bound)
+                lines.append(f'{self.name}_bucket{_labels(self.labels + ("le",), label_values + (le,))} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}')
+            lines.append(f'{self.name}_count{_labels(self.labels, label_values)} {cumulative}')
+        return lines
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# View name without its blueprint, e.g. get_supplies
+def _endpoint():
+    return request.endpoint.rpartition('.')[2] if request.endpoint else 'unmatched'
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for v in values)
+    return '{' + ','.join(f'{n}="{v}"' for n, v in zip(names, escaped)) + '}'
+
+
+# ---------- Extension ----------
+# Records per-request latency, response size, SQL statement count and DB time
+# by endpoint, logs statements slower than SLOW_QUERY_MS, and renders it all
+# in Prometheus text format for GET /metrics. Off with METRICS_ENABLED=False.
+#
+# Samples live in the process. With METRICS_DIR set, as gunicorn.conf.py does,
+# every process also writes them to <METRICS_DIR>/<pid>.json (at most once
+# per FLUSH_SECONDS, and at exit), and GET /metrics adds up the files of all
+# workers, recycled ones included, so any worker answers for the whole
+# server. The pool gauges are those of the answering worker.
+class Metrics:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.slow_query_seconds = 0.5
+        self.directory = None
+        self._flushed = 0.0
+        self._flush_lock = threading.Lock()
+        self.requests = Counter('greatea_http_requests_total', 'HTTP requests by endpoint, method and status.',
+                                ('endpoint', 'method', 'status'))
+        self.latency = Histogram('greatea_http_request_duration_seconds', 'Time spent in the view and hooks.',
+                                 ('endpoint', 'method'))
+        self.response_size = Histogram('greatea_http_response_size_bytes', 'Response body size (unstreamed responses).',
+                                       ('endpoint',), SIZE_BUCKETS)
+        self.statements = Histogram('greatea_db_statements_per_request', 'SQL statements sent per request.',
+                                    ('endpoint',), STATEMENT_BUCKETS)
+        self.db_time = Histogram('greatea_db_time_per_request_seconds', 'Time spent executing SQL per request.',
+                                 ('endpoint',))
+        self.slow_queries = Counter('greatea_db_slow_queries_total', 'SQL statements slower than SLOW_QUERY_MS.',
+                                    ('endpoint',))
+        self._listening = False
+        self._engines = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 500) / 1000
+        self.directory = app.config.get('METRICS_DIR') or None
+        app.extensions['metrics'] = self
+        if not self.enabled:
+            return
+        self._engines = lambda: app.extensions['sqlalchemy'].engines
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+            atexit.register(self.flush)
+        if not self._listening:
+            event.listen(Engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_cursor_execute)
+            self._listening = True
+
+    def _before_request(self):
+        # [started, statements, db seconds, status, response size]
+        request.environ[ENVIRON_KEY] = [time.perf_counter(), 0, 0.0, None, None]
+
+    def _after_request(self, response):
+        stats = request.environ.get(ENVIRON_KEY)
+        if stats is not None:
+            stats[3] = response.status_code
+            stats[4] = response.content_length
+        return response
+
+    # Teardown runs for every request, also one that ends in an unhandled
+    # exception (after_request does not), which is counted as a 500
+    def _teardown_request(self, exc):
+        stats = request.environ.pop(ENVIRON_KEY, None)
+        if stats is None:
+            return
+        endpoint = _endpoint()
+        self.requests.inc(endpoint, request.method, str(stats[3] or 500))
+        self.latency.observe(time.perf_counter() - stats[0], endpoint, request.method)
+        self.statements.observe(stats[1], endpoint)
+        self.db_time.observe(stats[2], endpoint)
+        if stats[4] is not None:
+            self.response_size.observe(stats[4], endpoint)
+        if self.directory and time.monotonic() - self._flushed >= FLUSH_SECONDS:
+            self.flush()
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info['greatea.query_start'] = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('greatea.query_start', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        in_request = has_request_context()
+        if in_request:
+            stats = request.environ.get(ENVIRON_KEY)
+            if stats is not None:
+                stats[1] += 1
+                stats[2] += elapsed
+        if elapsed >= self.slow_query_seconds:
+            endpoint = _endpoint() if in_request else None
+            self.slow_queries.inc(endpoint or 'none')
+            logger.warning('Slow query (%.1f ms, endpoint %s): %s', elapsed * 1000, endpoint, ' '.join(statement.split())[:1000])
+
+    def _metrics(self):
+        return (self.requests, self.latency, self.response_size, self.statements, self.db_time, self.slow_queries)
+
+    # Drops every sample recorded so far, e.g. by the startup warm-up
+    def reset(self):
+        for metric in self._metrics():
+            metric.clear()
+        if self.directory:
+            self.flush()
+
+    # Writes this process's samples to <METRICS_DIR>/<pid>.json
+    def flush(self):
+        if not self.directory:
+            return
+        with self._flush_lock:
+            self._flushed = time.monotonic()
+            path = os.path.join(self.directory, f'{os.getpid()}.json')
+            with open(f'{path}.tmp', 'w') as f:
+                json.dump({m.name: m.snapshot() for m in self._metrics()}, f)
+            os.replace(f'{path}.tmp', path)
+
+    def _snapshots(self):
+        if not self.directory:
+            return [{m.name: m.snapshot() for m in self._metrics()}]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, '*.json')):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+    # Prometheus text exposition of every metric plus connection pool gauges
+    def render(self):
+        lines = []
+        snapshots = self._snapshots()
+        for metric in self._metrics():
+            lines += metric.render(metric.merge([s.get(metric.name, []) for s in snapshots]))
+        if self._engines is not None:
+            pools = pool_status(self._engines())
+            for key, help_text in (('checked_out', 'Connections currently checked out.'),
+                                   ('size', 'Configured pool size.'),
+                                   ('overflow', 'Connections opened beyond the pool size.'),
+                                   ('checkout_timeouts', 'Checkouts that timed out waiting for a connection.')):
+                name = f'greatea_db_pool_{key}'
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+                lines += [f'{name}{{engine="{engine}"}} {entry[key]}' for engine, entry in pools.items() if key in entry]
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
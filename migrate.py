@@ -0,0 +1,209 @@
+import importlib
+import os
+import re
+from datetime import datetime
+
+from sqlalchemy import BigInteger, Column, DateTime, ForeignKeyConstraint, Index, MetaData, String, Table, inspect, insert, select
+from sqlalchemy.schema import AddConstraint, CreateColumn
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_\w+\.py$')
+
+# Applied revisions, one row each
+schema_migrations = Table(
+    'Schema_Migrations', MetaData(),
+    Column('Revision', String(32), primary_key=True),
+    Column('Description', String(200)),
+    Column('Applied_At', DateTime, nullable=False)
+)
+
+
+# Version counters behind ETags and the response cache, one row per table
+table_versions = Table(
+    'Table_Versions', MetaData(),
+    Column('Table_Name', String(64), primary_key=True),
+    Column('Version', BigInteger, nullable=False)
+)
+
+
+# ---------- Helpers for migration modules ----------
+# Migrations describe tables with their own Table objects so they keep
+# producing the same schema after models.py moves on.
+def create_table(connection, table):
+    table.create(connection, checkfirst=True)
+    seed_table_versions(connection, [table.name])
+
+
+# Gives each of `names` a Table_Versions row at 0 unless it has one; writes
+# only bump existing rows
+def seed_table_versions(connection, names):
+    if not inspect(connection).has_table(table_versions.name):
+        return
+    names = set(names) - {table_versions.name, schema_migrations.name}
+    seeded = set(connection.execute(
+        select(table_versions.c.Table_Name).where(table_versions.c.Table_Name.in_(names))
+    ).scalars())
+    missing = sorted(names - seeded)
+    if missing:
+        connection.execute(insert(table_versions), [{'Table_Name': name, 'Version': 0} for name in missing])
+
+
+def create_index(connection, name, table_name, *columns, unique=False):
+    existing = {ix['name'] for ix in inspect(connection).get_indexes(table_name)}
+    if name in existing:
+        return
+    table = Table(table_name, MetaData(), *[Column(c) for c in columns])
+    Index(name, *[table.c[c] for c in columns], unique=unique).create(connection)
+
+
+def drop_index(connection, name, table_name):
+    existing = {ix['name']: ix['column_names'] for ix in inspect(connection).get_indexes(table_name)}
+    if name not in existing:
+        return
+    table = Table(table_name, MetaData(), *[Column(c) for c in existing[name]])
+    Index(name, *table.c).drop(connection)
+
+
+def add_column(connection, table_name, column):
+    existing = {c['name'] for c in inspect(connection).get_columns(table_name)}
+    if column.name in existing:
+        return
+    table = Table(table_name, MetaData(), column)
+    preparer = connection.dialect.identifier_preparer
+    spec = CreateColumn(column).compile(dialect=connection.dialect)
+    connection.exec_driver_sql(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {spec}')
+
+
+# SQLite cannot add a constraint to an existing table, so there the table is
+# rebuilt with it (see _rebuild_with_foreign_key); the constraint's ON DELETE
+# action is enforced like that of any other foreign key.
+def add_foreign_key(connection, table_name, column_name, target_table, target_column, ondelete=None):
+    existing = {tuple(fk['constrained_columns']) for fk in inspect(connection).get_foreign_keys(table_name)}
+    if (column_name,) in existing:
+        return
+    if connection.dialect.name == 'sqlite':
+        _rebuild_with_foreign_key(connection, table_name, column_name, target_table, target_column, ondelete)
+        return
+    metadata = MetaData()
+    Table(target_table, metadata, Column(target_column, primary_key=True))
+    table = Table(table_name, metadata, Column(column_name))
+    constraint = ForeignKeyConstraint([table.c[column_name]], [f'{target_table}.{target_column}'], ondelete=ondelete)
+    table.append_constraint(constraint)
+    connection.execute(AddConstraint(constraint))
+
+
+# SQLite's procedure for changing a table's schema: create the new table
+# under another name from the stored CREATE TABLE plus the constraint, copy
+# the rows, drop the old table, rename the new one and recreate its indexes.
+# Dropping a table runs the ON DELETE actions of tables that reference it, so
+# such a table is refused rather than rebuilt.
+def _rebuild_with_foreign_key(connection, table_name, column_name, target_table, target_column, ondelete):
+    inspector = inspect(connection)
+    referencing = sorted(t for t in inspector.get_table_names()
+                         if any(fk['referred_table'] == table_name for fk in inspector.get_foreign_keys(t)))
+    if referencing:
+        raise RuntimeError(f"Cannot rebuild {table_name}: {', '.join(referencing)} reference it")
+
+    quote = connection.dialect.identifier_preparer.quote
+    create_sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table_name,)
+    ).scalar()
+    index_sqls = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL", (table_name,)
+    ).scalars().all()
+    columns = ', '.join(quote(c['name']) for c in inspector.get_columns(table_name))
+    rebuilt = f'_rebuild_{table_name}'
+
+    # "CREATE TABLE <name> (<body>)" with the constraint added to the body
+    body = create_sql[create_sql.index('('):].rstrip()[:-1]
+    constraint = f'FOREIGN KEY({quote(column_name)}) REFERENCES {quote(target_table)} ({quote(target_column)})'
+    if ondelete:
+        constraint += f' ON DELETE {ondelete}'
+    connection.exec_driver_sql(f'CREATE TABLE {quote(rebuilt)} {body}, {constraint})')
+    connection.exec_driver_sql(
+        f'INSERT INTO {quote(rebuilt)} ({columns}) SELECT {columns} FROM {quote(table_name)}'
+    )
+    connection.exec_driver_sql(f'DROP TABLE {quote(table_name)}')
+    connection.exec_driver_sql(f'ALTER TABLE {quote(rebuilt)} RENAME TO {quote(table_name)}')
+    for sql in index_sqls:
+        connection.exec_driver_sql(sql)
+
+
+# ---------- Runner ----------
+def available_migrations():
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            module = importlib.import_module(f'migrations.{filename[:-3]}')
+            migrations.append((match.group(1), module))
+    return migrations
+
+
+def applied_revisions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(select(schema_migrations.c.Revision)).scalars())
+
+
+def pending_migrations(connection):
+    applied = applied_revisions(connection)
+    return [(revision, module) for revision, module in available_migrations() if revision not in applied]
+
+
+# Applies every pending migration in order, each in its own transaction.
+# Returns the revisions applied.
+def upgrade(engine):
+    applied = []
+    with engine.begin() as connection:
+        pending = pending_migrations(connection)
+    for revision, module in pending:
+        with engine.begin() as connection:
+            module.upgrade(connection)
+            connection.execute(insert(schema_migrations).values(
+                Revision=revision,
+                Description=module.description,
+                Applied_At=datetime.now()
+            ))
+        applied.append(revision)
+    return applied
+
+
+# ---------- Drift check ----------
+# Differences between the live schema and models.py: missing or extra tables,
+# columns and indexes. An empty list means migrations and models agree.
+def schema_drift(connection, metadata):
+    inspector = inspect(connection)
+    problems = []
+    live_tables = set(inspector.get_table_names()) - {schema_migrations.name}
+
+    for table in metadata.sorted_tables:
+        if table.name not in live_tables:
+            problems.append(f'missing table {table.name}')
+            continue
+        live_columns = {c['name'] for c in inspector.get_columns(table.name)}
+        model_columns = {c.name for c in table.columns}
+        problems += [f'missing column {table.name}.{c}' for c in sorted(model_columns - live_columns)]
+        problems += [f'extra column {table.name}.{c}' for c in sorted(live_columns - model_columns)]
+
+        live_indexes = {
+            ix['name']: (tuple(ix['column_names']), bool(ix['unique']))
+            for ix in inspector.get_indexes(table.name)
+        }
+        model_indexes = {
+            ix.name: (tuple(c.name for c in ix.columns), bool(ix.unique))
+            for ix in table.indexes
+        }
+        for name, definition in sorted(model_indexes.items()):
+            if name not in live_indexes:
+                problems.append(f'missing index {table.name}.{name}')
+            elif live_indexes[name] != definition:
+                problems.append(f'index {table.name}.{name} differs: {live_indexes[name]} != {definition}')
+        # MySQL adds an index behind every foreign key that has none
+        foreign_keys = {tuple(fk['constrained_columns']) for fk in inspector.get_foreign_keys(table.name)}
+        problems += [
+            f'extra index {table.name}.{n}' for n in sorted(set(live_indexes) - set(model_indexes))
+            if live_indexes[n][0] not in foreign_keys
+        ]
+
+    problems += [f'extra table {t}' for t in sorted(live_tables - set(metadata.tables))]
+    return problems
@@ -0,0 +1,108 @@
+# Schema as shipped before versioned migrations: the original tables plus the
+# Usage_Daily rollup and Table_Versions counters. Tables that already exist
+# (e.g. created by Project_Script.sql) are left alone.
+from sqlalchemy import (BigInteger, Column, Date, DateTime, Enum, Float, ForeignKey, Integer, MetaData,
+                        String, Table, insert, select)
+
+from migrate import create_table
+
+description = 'baseline schema'
+
+metadata = MetaData()
+
+Table(
+    'Supplies', metadata,
+    Column('Supply_ID', Integer, primary_key=True),
+    Column('Name', String(100), nullable=False),
+    Column('Category', String(50)),
+    Column('Expiry_Date', Date),
+    Column('Total_Quantity', Float),
+    Column('Cost_Per_Unit', Float)
+)
+
+Table(
+    'Suppliers', metadata,
+    Column('Supplier_ID', Integer, primary_key=True),
+    Column('Name', String(100), nullable=False),
+    Column('Contact', String(100)),
+    Column('Lead_Time', Integer)
+)
+
+Table(
+    'Supply_Orders', metadata,
+    Column('Order_ID', Integer, primary_key=True),
+    Column('Date', Date),
+    Column('Supplier_ID', Integer, ForeignKey('Suppliers.Supplier_ID', ondelete='CASCADE')),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE')),
+    Column('Quantity_Received', Float),
+    Column('Total_Cost', Float)
+)
+
+Table(
+    'Usage_Records', metadata,
+    Column('Usage_ID', Integer, primary_key=True),
+    Column('Date', Date),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE')),
+    Column('Quantity_Used', Float),
+    Column('Location', String(100))
+)
+
+Table(
+    'Expenses', metadata,
+    Column('Expense_ID', Integer, primary_key=True),
+    Column('Date', Date),
+    Column('Category', String(50)),
+    Column('Amount', Float)
+)
+
+Table(
+    'Store_Stock', metadata,
+    Column('Stock_ID', Integer, primary_key=True),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE')),
+    Column('Quantity_Available', Float),
+    Column('Last_Updated', DateTime)
+)
+
+Table(
+    'Restock_Requests', metadata,
+    Column('Request_ID', Integer, primary_key=True),
+    Column('Date', Date),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE')),
+    Column('Quantity_Requested', Float),
+    Column('Request_Type', Enum('Transfer from Inventory', 'Purchase from Supplier'))
+)
+
+Table(
+    'Market_Purchases', metadata,
+    Column('Purchase_ID', Integer, primary_key=True),
+    Column('Date', Date),
+    Column('Item_Name', String(100)),
+    Column('Quantity', Float),
+    Column('Cost', Float),
+    Column('Category', String(50))
+)
+
+Table(
+    'Usage_Daily', metadata,
+    Column('Day', Date, primary_key=True),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), primary_key=True),
+    Column('Location', String(100), primary_key=True, default=''),
+    Column('Quantity_Used', Float, nullable=False, default=0),
+    Column('Record_Count', Integer, nullable=False, default=0)
+)
+
+table_versions = Table(
+    'Table_Versions', metadata,
+    Column('Table_Name', String(64), primary_key=True),
+    Column('Version', BigInteger, nullable=False, default=0)
+)
+
+
+def upgrade(connection):
+    for table in metadata.sorted_tables:
+        create_table(connection, table)
+
+    seeded = set(connection.execute(select(table_versions.c.Table_Name)).scalars())
+    missing = sorted(t.name for t in metadata.sorted_tables if t is not table_versions and t.name not in seeded)
+    if missing:
+        connection.execute(insert(table_versions), [{'Table_Name': name, 'Version': 0} for name in missing])
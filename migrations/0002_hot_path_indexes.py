@@ -0,0 +1,22 @@
+# Indexes behind the date-range, supply and category filters of the list
+# endpoints and the analytics queries (expiry, low stock, usage per supply).
+from migrate import create_index
+
+description = 'hot path indexes'
+
+INDEXES = [
+    ('ix_supplies_expiry_date', 'Supplies', ('Expiry_Date',)),
+    ('ix_supply_orders_date', 'Supply_Orders', ('Date',)),
+    ('ix_usage_records_supply_date', 'Usage_Records', ('Supply_ID', 'Date')),
+    ('ix_usage_records_date', 'Usage_Records', ('Date',)),
+    ('ix_expenses_date_category', 'Expenses', ('Date', 'Category')),
+    ('ix_store_stock_supply', 'Store_Stock', ('Supply_ID',)),
+    ('ix_store_stock_quantity', 'Store_Stock', ('Quantity_Available',)),
+    ('ix_restock_requests_date', 'Restock_Requests', ('Date',)),
+    ('ix_market_purchases_date', 'Market_Purchases', ('Date',)),
+]
+
+
+def upgrade(connection):
+    for name, table, columns in INDEXES:
+        create_index(connection, name, table, *columns)
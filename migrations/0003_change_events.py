@@ -0,0 +1,23 @@
+# Row-level change feed behind GET /events
+from sqlalchemy import BigInteger, Column, DateTime, Index, Integer, MetaData, String, Table, Text
+
+from migrate import create_table
+
+description = 'change events'
+
+metadata = MetaData()
+
+change_events = Table(
+    'Change_Events', metadata,
+    Column('Event_ID', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+    Column('Created_At', DateTime, nullable=False),
+    Column('Table_Name', String(64), nullable=False),
+    Column('Action', String(16), nullable=False),
+    Column('Row_ID', Integer),
+    Column('Payload', Text),
+    Index('ix_change_events_created_at', 'Created_At')
+)
+
+
+def upgrade(connection):
+    create_table(connection, change_events)
@@ -0,0 +1,27 @@
+# Append-only stock ledger behind Supplies.Total_Quantity and Store_Stock.Quantity_Available
+from sqlalchemy import BigInteger, Column, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+from migrate import create_table
+
+description = 'stock movements ledger'
+
+metadata = MetaData()
+
+Table('Supplies', metadata, Column('Supply_ID', Integer, primary_key=True))
+
+stock_movements = Table(
+    'Stock_Movements', metadata,
+    Column('Movement_ID', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+    Column('Created_At', DateTime, nullable=False),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), nullable=False),
+    Column('Balance', String(16), nullable=False),
+    Column('Quantity', Float, nullable=False),
+    Column('Reason', String(32), nullable=False),
+    Column('Source_Table', String(64)),
+    Column('Source_ID', Integer),
+    Index('ix_stock_movements_supply_balance', 'Supply_ID', 'Balance')
+)
+
+
+def upgrade(connection):
+    create_table(connection, stock_movements)
@@ -0,0 +1,46 @@
+# Locations, stock kept per (location, supply) and location-scoped analytics
+from sqlalchemy import Column, Index, Integer, MetaData, String, Table, insert, select, update
+
+from migrate import add_column, add_foreign_key, create_index, create_table
+
+description = 'locations'
+
+metadata = MetaData()
+
+locations = Table(
+    'Locations', metadata,
+    Column('Location_ID', Integer, primary_key=True),
+    Column('Name', String(100), nullable=False),
+    Index('ix_locations_name', 'Name', unique=True)
+)
+
+LOCATION_COLUMNS = ['Store_Stock', 'Usage_Records', 'Restock_Requests', 'Stock_Movements']
+
+INDEXES = [
+    ('ix_store_stock_location_supply', 'Store_Stock', ('Location_ID', 'Supply_ID')),
+    ('ix_store_stock_location_quantity', 'Store_Stock', ('Location_ID', 'Quantity_Available')),
+    ('ix_restock_requests_location', 'Restock_Requests', ('Location_ID',)),
+    ('ix_usage_daily_location_day', 'Usage_Daily', ('Location', 'Day')),
+]
+
+
+def upgrade(connection):
+    create_table(connection, locations)
+    for table_name in LOCATION_COLUMNS:
+        add_column(connection, table_name, Column('Location_ID', Integer))
+        add_foreign_key(connection, table_name, 'Location_ID', 'Locations', 'Location_ID', ondelete='SET NULL')
+    for name, table, columns in INDEXES:
+        create_index(connection, name, table, *columns)
+
+    # Every distinct free-text usage location becomes a Location
+    usage = Table('Usage_Records', MetaData(), Column('Location', String(100)), Column('Location_ID', Integer))
+    names = connection.execute(
+        select(usage.c.Location).where(usage.c.Location.isnot(None), usage.c.Location != '').distinct()
+    ).scalars().all()
+    known = set(connection.execute(select(locations.c.Name)).scalars())
+    new = sorted(set(names) - known)
+    if new:
+        connection.execute(insert(locations), [{'Name': n} for n in new])
+    connection.execute(update(usage).values(Location_ID=(
+        select(locations.c.Location_ID).where(locations.c.Name == usage.c.Location).scalar_subquery()
+    )).where(usage.c.Location_ID.is_(None), usage.c.Location.isnot(None)))
@@ -0,0 +1,39 @@
+# Compressed archive tables for closed months of usage and expenses
+from sqlalchemy import Column, Date, Float, ForeignKey, Index, Integer, MetaData, String, Table
+
+from migrate import create_table
+
+description = 'usage and expenses archive'
+
+metadata = MetaData()
+
+Table('Supplies', metadata, Column('Supply_ID', Integer, primary_key=True))
+Table('Locations', metadata, Column('Location_ID', Integer, primary_key=True))
+
+usage_archive = Table(
+    'Usage_Records_Archive', metadata,
+    Column('Usage_ID', Integer, primary_key=True, autoincrement=False),
+    Column('Date', Date),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE')),
+    Column('Quantity_Used', Float),
+    Column('Location', String(100)),
+    Column('Location_ID', Integer, ForeignKey('Locations.Location_ID', ondelete='SET NULL')),
+    Index('ix_usage_records_archive_date', 'Date'),
+    Index('ix_usage_records_archive_supply_date', 'Supply_ID', 'Date'),
+    mysql_row_format='COMPRESSED'
+)
+
+expenses_archive = Table(
+    'Expenses_Archive', metadata,
+    Column('Expense_ID', Integer, primary_key=True, autoincrement=False),
+    Column('Date', Date),
+    Column('Category', String(50)),
+    Column('Amount', Float),
+    Index('ix_expenses_archive_date_category', 'Date', 'Category'),
+    mysql_row_format='COMPRESSED'
+)
+
+
+def upgrade(connection):
+    create_table(connection, usage_archive)
+    create_table(connection, expenses_archive)
@@ -0,0 +1,60 @@
+# Per-lot expiry: lots opened by orders and consumed first-expired-first-out
+from sqlalchemy import (Boolean, Column, Date, Float, ForeignKey, Index, Integer, MetaData, Table,
+                        func, insert, select)
+
+from migrate import add_column, add_foreign_key, create_index, create_table
+
+description = 'supply lots'
+
+metadata = MetaData()
+
+supplies = Table(
+    'Supplies', metadata,
+    Column('Supply_ID', Integer, primary_key=True),
+    Column('Expiry_Date', Date),
+    Column('Total_Quantity', Float)
+)
+Table('Supply_Orders', metadata, Column('Order_ID', Integer, primary_key=True))
+store_stock = Table(
+    'Store_Stock', MetaData(),
+    Column('Supply_ID', Integer),
+    Column('Quantity_Available', Float)
+)
+
+supply_lots = Table(
+    'Supply_Lots', metadata,
+    Column('Lot_ID', Integer, primary_key=True),
+    Column('Supply_ID', Integer, ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), nullable=False),
+    Column('Order_ID', Integer, ForeignKey('Supply_Orders.Order_ID', ondelete='CASCADE')),
+    Column('Received_Date', Date),
+    Column('Expiry_Date', Date),
+    Column('Quantity_Received', Float, nullable=False),
+    Column('Quantity_Remaining', Float, nullable=False),
+    Column('Is_Open', Boolean, nullable=False),
+    Index('ix_supply_lots_open_expiry', 'Is_Open', 'Expiry_Date'),
+    Index('ix_supply_lots_supply_open_expiry', 'Supply_ID', 'Is_Open', 'Expiry_Date')
+)
+
+
+def upgrade(connection):
+    create_table(connection, supply_lots)
+    add_column(connection, 'Supply_Orders', Column('Expiry_Date', Date))
+    add_column(connection, 'Stock_Movements', Column('Lot_ID', Integer))
+    add_foreign_key(connection, 'Stock_Movements', 'Lot_ID', 'Supply_Lots', 'Lot_ID', ondelete='SET NULL')
+    create_index(connection, 'ix_stock_movements_source', 'Stock_Movements', 'Source_Table', 'Source_ID')
+
+    # Stock already on hand becomes one opening lot per supply, expiring on
+    # the supply's Expiry_Date
+    if connection.execute(select(func.count()).select_from(supply_lots)).scalar():
+        return
+    store = (
+        select(store_stock.c.Supply_ID, func.sum(store_stock.c.Quantity_Available).label('quantity'))
+        .group_by(store_stock.c.Supply_ID).subquery()
+    )
+    on_hand = func.coalesce(supplies.c.Total_Quantity, 0) + func.coalesce(store.c.quantity, 0)
+    connection.execute(insert(supply_lots).from_select(
+        ['Supply_ID', 'Received_Date', 'Expiry_Date', 'Quantity_Received', 'Quantity_Remaining', 'Is_Open'],
+        select(supplies.c.Supply_ID, func.current_date(), supplies.c.Expiry_Date, on_hand, on_hand, True)
+        .select_from(supplies.outerjoin(store, store.c.Supply_ID == supplies.c.Supply_ID))
+        .where(on_hand > 0)
+    ))
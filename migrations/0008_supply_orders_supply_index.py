@@ -0,0 +1,8 @@
+# Latest order per supply, read by the reorder plan to find each supply's supplier
+from migrate import create_index
+
+description = 'supply orders supply index'
+
+
+def upgrade(connection):
+    create_index(connection, 'ix_supply_orders_supply_order', 'Supply_Orders', 'Supply_ID', 'Order_ID')
@@ -0,0 +1,89 @@
+# Monthly spend cube over expenses, supply orders and market purchases,
+# backfilled from the full history (see spend.py)
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import (Boolean, Column, Date, Float, Index, Integer, MetaData, String, Table, extract, func, insert,
+                        select)
+
+from migrate import create_table
+
+description = 'spend cube'
+
+metadata = MetaData()
+
+supplies = Table(
+    'Supplies', metadata,
+    Column('Supply_ID', Integer, primary_key=True),
+    Column('Category', String(50))
+)
+expenses = [Table(
+    name, metadata,
+    Column('Date', Date),
+    Column('Category', String(50)),
+    Column('Amount', Float)
+) for name in ('Expenses', 'Expenses_Archive')]
+supply_orders = Table(
+    'Supply_Orders', metadata,
+    Column('Date', Date),
+    Column('Supply_ID', Integer),
+    Column('Supplier_ID', Integer),
+    Column('Total_Cost', Float)
+)
+market_purchases = Table(
+    'Market_Purchases', metadata,
+    Column('Date', Date),
+    Column('Category', String(50)),
+    Column('Cost', Float)
+)
+
+spend_monthly = Table(
+    'Spend_Monthly', metadata,
+    Column('Month', Date, primary_key=True),
+    Column('Source', String(16), primary_key=True),
+    Column('Category', String(50), primary_key=True, default=''),
+    Column('Supplier_ID', Integer, primary_key=True, default=0),
+    Column('Amount', Float, nullable=False, default=0),
+    Column('Record_Count', Integer, nullable=False, default=0),
+    Column('Frozen', Boolean, nullable=False, default=False),
+    Index('ix_spend_monthly_source_month', 'Source', 'Month'),
+    Index('ix_spend_monthly_frozen_month', 'Frozen', 'Month')
+)
+
+
+# (year, month, category, supplier, amount, count) per month of `table`
+def _monthly(connection, table, amount, category, supplier=None, join=None):
+    keys = [extract('year', table.c.Date), extract('month', table.c.Date), func.coalesce(category, '')]
+    if supplier is not None:
+        keys.append(func.coalesce(supplier, 0))
+    stmt = select(*keys, func.coalesce(func.sum(amount), 0), func.count()).select_from(
+        join if join is not None else table
+    ).where(table.c.Date.isnot(None)).group_by(*keys)
+    for row in connection.execute(stmt):
+        yield int(row[0]), int(row[1]), row[2], row[3] if supplier is not None else 0, row[-2], row[-1]
+
+
+def upgrade(connection):
+    create_table(connection, spend_monthly)
+    if connection.execute(select(func.count()).select_from(spend_monthly)).scalar():
+        return
+
+    orders = supply_orders
+    sources = [('expenses', _monthly(connection, e, e.c.Amount, e.c.Category)) for e in expenses] + [
+        ('orders', _monthly(connection, orders, orders.c.Total_Cost, supplies.c.Category, orders.c.Supplier_ID,
+                            orders.outerjoin(supplies, supplies.c.Supply_ID == orders.c.Supply_ID))),
+        ('purchases', _monthly(connection, market_purchases, market_purchases.c.Cost, market_purchases.c.Category)),
+    ]
+    # Expenses and their archive add up into the same cells
+    totals = defaultdict(lambda: [0.0, 0])
+    for source, rows in sources:
+        for year, month, category, supplier_id, amount, count in rows:
+            cell = totals[(date(year, month, 1), source, category, supplier_id)]
+            cell[0] += amount
+            cell[1] += count
+    if totals:
+        connection.execute(insert(spend_monthly), [
+            {'Month': month, 'Source': source, 'Category': category, 'Supplier_ID': supplier_id,
+             'Amount': amount, 'Record_Count': count, 'Frozen': False}
+            for (month, source, category, supplier_id), (amount, count) in totals.items()
+        ])
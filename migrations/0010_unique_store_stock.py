@@ -0,0 +1,33 @@
+# One Store_Stock row per (location, supply): rows that repeat a pair, or a
+# supply without a location, are merged into the oldest one, which is where
+# the ledger posts their movements
+from sqlalchemy import Column, Float, Integer, MetaData, Table, delete, func, select, update
+
+from migrate import create_index, drop_index
+
+description = 'unique store stock per location'
+
+stock = Table(
+    'Store_Stock', MetaData(),
+    Column('Stock_ID', Integer, primary_key=True),
+    Column('Supply_ID', Integer),
+    Column('Location_ID', Integer),
+    Column('Quantity_Available', Float)
+)
+
+
+def upgrade(connection):
+    duplicates = connection.execute(
+        select(stock.c.Supply_ID, stock.c.Location_ID, func.min(stock.c.Stock_ID),
+               func.sum(func.coalesce(stock.c.Quantity_Available, 0)))
+        .group_by(stock.c.Supply_ID, stock.c.Location_ID).having(func.count() > 1)
+    ).all()
+    for supply_id, location_id, keep, quantity in duplicates:
+        connection.execute(update(stock).where(stock.c.Stock_ID == keep).values(Quantity_Available=quantity))
+        connection.execute(delete(stock).where(
+            stock.c.Supply_ID == supply_id, stock.c.Stock_ID != keep,
+            stock.c.Location_ID.is_(None) if location_id is None else stock.c.Location_ID == location_id
+        ))
+
+    drop_index(connection, 'ix_store_stock_location_supply', 'Store_Stock')
+    create_index(connection, 'ix_store_stock_location_supply', 'Store_Stock', 'Location_ID', 'Supply_ID', unique=True)
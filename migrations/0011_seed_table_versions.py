@@ -0,0 +1,11 @@
+# A Table_Versions row for every table, so committing writes only ever bumps
+# existing rows (see models._bump_versions)
+from sqlalchemy import inspect
+
+from migrate import seed_table_versions
+
+description = 'seed table versions'
+
+
+def upgrade(connection):
+    seed_table_versions(connection, inspect(connection).get_table_names())
@@ -0,0 +1,18 @@
+# Foreign keys that migrations 0005 and 0007 could not add on SQLite, where
+# add_foreign_key now rebuilds the table; on MySQL they exist already
+from migrate import add_foreign_key
+
+description = 'sqlite foreign keys'
+
+FOREIGN_KEYS = [
+    ('Store_Stock', 'Location_ID', 'Locations', 'Location_ID'),
+    ('Usage_Records', 'Location_ID', 'Locations', 'Location_ID'),
+    ('Restock_Requests', 'Location_ID', 'Locations', 'Location_ID'),
+    ('Stock_Movements', 'Location_ID', 'Locations', 'Location_ID'),
+    ('Stock_Movements', 'Lot_ID', 'Supply_Lots', 'Lot_ID'),
+]
+
+
+def upgrade(connection):
+    for table_name, column_name, target_table, target_column in FOREIGN_KEYS:
+        add_foreign_key(connection, table_name, column_name, target_table, target_column, ondelete='SET NULL')
@@ -0,0 +1,13 @@
+# Restock requests the reorder plan writes stay 'Open', without moving stock,
+# until they are received; existing requests have moved theirs already
+from sqlalchemy import Column, Enum
+
+from migrate import add_column, create_index
+
+description = 'restock status'
+
+
+def upgrade(connection):
+    add_column(connection, 'Restock_Requests',
+               Column('Status', Enum('Open', 'Received'), nullable=False, server_default='Received'))
+    create_index(connection, 'ix_restock_requests_status_supply', 'Restock_Requests', 'Status', 'Supply_ID')
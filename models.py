@@ -1,11 +1,25 @@
+import logging
+import sqlite3
+from functools import lru_cache
 from flask_sqlalchemy import SQLAlchemy
+from blinker import Namespace
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from pooling import RoutingSession
 from datetime import datetime
 
-db = SQLAlchemy()
+logger = logging.getLogger(__name__)
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # Supplies Table
 class Supplies(db.Model):
     __tablename__ = 'Supplies'
+    __table_args__ = (
+        db.Index('ix_supplies_expiry_date', 'Expiry_Date'),
+    )
     Supply_ID = db.Column(db.Integer, primary_key=True)
     Name = db.Column(db.String(100), nullable=False)
     Category = db.Column(db.String(50))
@@ -13,11 +27,12 @@ class Supplies(db.Model):
     Total_Quantity = db.Column(db.Float)
     Cost_Per_Unit = db.Column(db.Float)
     
-    # Define relationships
-    supply_orders = db.relationship('SupplyOrders', backref='supply', lazy=True, cascade="all, delete-orphan")
-    usage_records = db.relationship('UsageRecords', backref='supply', lazy=True, cascade="all, delete-orphan")
-    store_stock = db.relationship('StoreStock', backref='supply', lazy=True, cascade="all, delete-orphan")
-    restock_requests = db.relationship('RestockRequests', backref='supply', lazy=True, cascade="all, delete-orphan")
+    # Define relationships. Deleting a supply leaves its child rows to the
+    # database's ON DELETE CASCADE instead of loading them into the session.
+    supply_orders = db.relationship('SupplyOrders', backref='supply', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    usage_records = db.relationship('UsageRecords', backref='supply', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    store_stock = db.relationship('StoreStock', backref='supply', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
+    restock_requests = db.relationship('RestockRequests', backref='supply', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -29,6 +44,23 @@ class Supplies(db.Model):
             'Cost_Per_Unit': self.Cost_Per_Unit
         }
 
+# Locations Table
+# A branch or store. Store stock is kept per (location, supply); usage rows
+# carry the location's Name in Location as well as its Location_ID.
+class Locations(db.Model):
+    __tablename__ = 'Locations'
+    __table_args__ = (
+        db.Index('ix_locations_name', 'Name', unique=True),
+    )
+    Location_ID = db.Column(db.Integer, primary_key=True)
+    Name = db.Column(db.String(100), nullable=False)
+
+    def to_dict(self):
+        return {
+            'Location_ID': self.Location_ID,
+            'Name': self.Name
+        }
+
 # Suppliers Table
 class Suppliers(db.Model):
     __tablename__ = 'Suppliers'
@@ -38,7 +70,7 @@ class Suppliers(db.Model):
     Lead_Time = db.Column(db.Integer)
     
     # Define relationships
-    supply_orders = db.relationship('SupplyOrders', backref='supplier', lazy=True, cascade="all, delete-orphan")
+    supply_orders = db.relationship('SupplyOrders', backref='supplier', lazy=True, cascade="all, delete-orphan", passive_deletes=True)
 
     def to_dict(self):
         return {
@@ -51,12 +83,19 @@ class Suppliers(db.Model):
 # Supply Orders Table
 class SupplyOrders(db.Model):
     __tablename__ = 'Supply_Orders'
+    __table_args__ = (
+        db.Index('ix_supply_orders_date', 'Date'),
+        # Latest order per supply (its preferred supplier) for the reorder plan
+        db.Index('ix_supply_orders_supply_order', 'Supply_ID', 'Order_ID'),
+    )
     Order_ID = db.Column(db.Integer, primary_key=True)
     Date = db.Column(db.Date, default=datetime.now().date())
     Supplier_ID = db.Column(db.Integer, db.ForeignKey('Suppliers.Supplier_ID', ondelete='CASCADE'))
     Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'))
     Quantity_Received = db.Column(db.Float)
     Total_Cost = db.Column(db.Float)
+    # Expiry of this delivery; the supply's Expiry_Date when not given
+    Expiry_Date = db.Column(db.Date)
 
     def to_dict(self):
         return {
@@ -66,18 +105,59 @@ class SupplyOrders(db.Model):
             'Supply_ID': self.Supply_ID,
             'Quantity_Received': self.Quantity_Received,
             'Total_Cost': self.Total_Cost,
+            'Expiry_Date': self.Expiry_Date.isoformat() if self.Expiry_Date else None,
             'Supplier_Name': self.supplier.Name if self.supplier else None,
             'Supply_Name': self.supply.Name if self.supply else None
         }
 
+# Supply Lots Table
+# One delivery of a supply with its own expiry, opened by an order (or as the
+# opening quantity of a supply) and consumed by usage first-expired-first-out
+# (see lots.py). Depleted lots are closed, so both indexes lead with Is_Open
+# and keep the open lots in expiry order.
+class SupplyLots(db.Model):
+    __tablename__ = 'Supply_Lots'
+    __table_args__ = (
+        db.Index('ix_supply_lots_open_expiry', 'Is_Open', 'Expiry_Date'),
+        db.Index('ix_supply_lots_supply_open_expiry', 'Supply_ID', 'Is_Open', 'Expiry_Date'),
+    )
+    Lot_ID = db.Column(db.Integer, primary_key=True)
+    Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), nullable=False)
+    Order_ID = db.Column(db.Integer, db.ForeignKey('Supply_Orders.Order_ID', ondelete='CASCADE'))
+    Received_Date = db.Column(db.Date)
+    Expiry_Date = db.Column(db.Date)
+    Quantity_Received = db.Column(db.Float, nullable=False)
+    Quantity_Remaining = db.Column(db.Float, nullable=False)
+    Is_Open = db.Column(db.Boolean, nullable=False, default=True)
+
+    supply = db.relationship('Supplies', viewonly=True)
+
+    def to_dict(self):
+        return {
+            'Lot_ID': self.Lot_ID,
+            'Supply_ID': self.Supply_ID,
+            'Order_ID': self.Order_ID,
+            'Received_Date': self.Received_Date.isoformat() if self.Received_Date else None,
+            'Expiry_Date': self.Expiry_Date.isoformat() if self.Expiry_Date else None,
+            'Quantity_Received': self.Quantity_Received,
+            'Quantity_Remaining': self.Quantity_Remaining,
+            'Is_Open': self.Is_Open,
+            'Supply_Name': self.supply.Name if self.supply else None
+        }
+
 # Usage Records Table
 class UsageRecords(db.Model):
     __tablename__ = 'Usage_Records'
+    __table_args__ = (
+        db.Index('ix_usage_records_supply_date', 'Supply_ID', 'Date'),
+        db.Index('ix_usage_records_date', 'Date'),
+    )
     Usage_ID = db.Column(db.Integer, primary_key=True)
     Date = db.Column(db.Date, default=datetime.now().date())
     Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'))
     Quantity_Used = db.Column(db.Float)
     Location = db.Column(db.String(100))
+    Location_ID = db.Column(db.Integer, db.ForeignKey('Locations.Location_ID', ondelete='SET NULL'))
 
     def to_dict(self):
         return {
@@ -86,12 +166,16 @@ class UsageRecords(db.Model):
             'Supply_ID': self.Supply_ID,
             'Quantity_Used': self.Quantity_Used,
             'Location': self.Location,
+            'Location_ID': self.Location_ID,
             'Supply_Name': self.supply.Name if self.supply else None
         }
 
 # Expenses Table
 class Expenses(db.Model):
     __tablename__ = 'Expenses'
+    __table_args__ = (
+        db.Index('ix_expenses_date_category', 'Date', 'Category'),
+    )
     Expense_ID = db.Column(db.Integer, primary_key=True)
     Date = db.Column(db.Date, default=datetime.now().date())
     Category = db.Column(db.String(50))
@@ -108,8 +192,15 @@ class Expenses(db.Model):
 # Store Stock Table
 class StoreStock(db.Model):
     __tablename__ = 'Store_Stock'
+    __table_args__ = (
+        db.Index('ix_store_stock_supply', 'Supply_ID'),
+        db.Index('ix_store_stock_quantity', 'Quantity_Available'),
+        db.Index('ix_store_stock_location_supply', 'Location_ID', 'Supply_ID', unique=True),
+        db.Index('ix_store_stock_location_quantity', 'Location_ID', 'Quantity_Available'),
+    )
     Stock_ID = db.Column(db.Integer, primary_key=True)
     Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'))
+    Location_ID = db.Column(db.Integer, db.ForeignKey('Locations.Location_ID', ondelete='SET NULL'))
     Quantity_Available = db.Column(db.Float)
     Last_Updated = db.Column(db.DateTime, default=datetime.now)
 
@@ -117,6 +208,7 @@ class StoreStock(db.Model):
         return {
             'Stock_ID': self.Stock_ID,
             'Supply_ID': self.Supply_ID,
+            'Location_ID': self.Location_ID,
             'Quantity_Available': self.Quantity_Available,
             'Last_Updated': self.Last_Updated.isoformat() if self.Last_Updated else None,
             'Supply_Name': self.supply.Name if self.supply else None
@@ -125,25 +217,39 @@ class StoreStock(db.Model):
 # Restock Requests Table
 class RestockRequests(db.Model):
     __tablename__ = 'Restock_Requests'
+    __table_args__ = (
+        db.Index('ix_restock_requests_date', 'Date'),
+        db.Index('ix_restock_requests_location', 'Location_ID'),
+        # Open requests per supply, the reorder plan's scheduled receipts
+        db.Index('ix_restock_requests_status_supply', 'Status', 'Supply_ID'),
+    )
     Request_ID = db.Column(db.Integer, primary_key=True)
     Date = db.Column(db.Date, default=datetime.now().date())
     Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'))
     Quantity_Requested = db.Column(db.Float)
     Request_Type = db.Column(db.Enum('Transfer from Inventory', 'Purchase from Supplier'))
+    Location_ID = db.Column(db.Integer, db.ForeignKey('Locations.Location_ID', ondelete='SET NULL'))
+    # 'Open' until the goods arrive; only a 'Received' request moves stock
+    Status = db.Column(db.Enum('Open', 'Received'), nullable=False, default='Received', server_default='Received')
 
     def to_dict(self):
         return {
             'Request_ID': self.Request_ID,
             'Date': self.Date.isoformat() if self.Date else None,
             'Supply_ID': self.Supply_ID,
+            'Location_ID': self.Location_ID,
             'Quantity_Requested': self.Quantity_Requested,
             'Request_Type': self.Request_Type,
+            'Status': self.Status,
             'Supply_Name': self.supply.Name if self.supply else None
         }
 
 # Market Purchases Table
 class MarketPurchases(db.Model):
     __tablename__ = 'Market_Purchases'
+    __table_args__ = (
+        db.Index('ix_market_purchases_date', 'Date'),
+    )
     Purchase_ID = db.Column(db.Integer, primary_key=True)
     Date = db.Column(db.Date, default=datetime.now().date())
     Item_Name = db.Column(db.String(100))
@@ -160,3 +266,266 @@ class MarketPurchases(db.Model):
             'Cost': self.Cost,
             'Category': self.Category
         }
+
+# Archive Tables
+# Closed months of usage and expenses moved out of the hot tables by
+# archive.py, with their original ids. MySQL keeps them compressed.
+class UsageRecordsArchive(db.Model):
+    __tablename__ = 'Usage_Records_Archive'
+    __table_args__ = (
+        db.Index('ix_usage_records_archive_date', 'Date'),
+        db.Index('ix_usage_records_archive_supply_date', 'Supply_ID', 'Date'),
+        {'mysql_row_format': 'COMPRESSED'},
+    )
+    Usage_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    Date = db.Column(db.Date)
+    Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'))
+    Quantity_Used = db.Column(db.Float)
+    Location = db.Column(db.String(100))
+    Location_ID = db.Column(db.Integer, db.ForeignKey('Locations.Location_ID', ondelete='SET NULL'))
+
+    supply = db.relationship('Supplies', viewonly=True)
+
+    to_dict = UsageRecords.to_dict
+
+class ExpensesArchive(db.Model):
+    __tablename__ = 'Expenses_Archive'
+    __table_args__ = (
+        db.Index('ix_expenses_archive_date_category', 'Date', 'Category'),
+        {'mysql_row_format': 'COMPRESSED'},
+    )
+    Expense_ID = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    Date = db.Column(db.Date)
+    Category = db.Column(db.String(50))
+    Amount = db.Column(db.Float)
+
+    to_dict = Expenses.to_dict
+
+# Daily Usage Rollup Table
+# One row per (day, supply, location), kept in step with Usage_Records by the
+# write paths in rollups.py. A missing location is stored as ''.
+class UsageDaily(db.Model):
+    __tablename__ = 'Usage_Daily'
+    __table_args__ = (
+        db.Index('ix_usage_daily_location_day', 'Location', 'Day'),
+    )
+    Day = db.Column(db.Date, primary_key=True)
+    Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), primary_key=True)
+    Location = db.Column(db.String(100), primary_key=True, default='')
+    Quantity_Used = db.Column(db.Float, nullable=False, default=0)
+    Record_Count = db.Column(db.Integer, nullable=False, default=0)
+
+# Spend Cube
+# Monthly spend per (source, category, supplier) across Expenses (and their
+# archive), Supply_Orders and Market_Purchases, kept up to date by every write
+# to them (see spend.py). Source is 'expenses', 'orders' or 'purchases'; ''
+# and 0 stand for no category and no supplier, as key columns cannot be NULL.
+# Frozen rows belong to closed months and are never changed again.
+class SpendMonthly(db.Model):
+    __tablename__ = 'Spend_Monthly'
+    __table_args__ = (
+        db.Index('ix_spend_monthly_source_month', 'Source', 'Month'),
+        db.Index('ix_spend_monthly_frozen_month', 'Frozen', 'Month'),
+    )
+    Month = db.Column(db.Date, primary_key=True)
+    Source = db.Column(db.String(16), primary_key=True)
+    Category = db.Column(db.String(50), primary_key=True, default='')
+    Supplier_ID = db.Column(db.Integer, primary_key=True, default=0)
+    Amount = db.Column(db.Float, nullable=False, default=0)
+    Record_Count = db.Column(db.Integer, nullable=False, default=0)
+    Frozen = db.Column(db.Boolean, nullable=False, default=False)
+
+# Table Versions
+# One counter per table, bumped in the committing transaction whenever rows of
+# that table are inserted, updated or deleted. ETags are derived from these.
+class TableVersions(db.Model):
+    __tablename__ = 'Table_Versions'
+    Table_Name = db.Column(db.String(64), primary_key=True)
+    Version = db.Column(db.BigInteger, nullable=False, default=0)
+
+# Stock Movements
+# Append-only ledger of every change to a stock balance: Supplies.Total_Quantity
+# ('inventory') or Store_Stock.Quantity_Available ('store', per location).
+# Summing a supply's movements gives its balance; see ledger.py.
+class StockMovements(db.Model):
+    __tablename__ = 'Stock_Movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_supply_balance', 'Supply_ID', 'Balance'),
+        db.Index('ix_stock_movements_source', 'Source_Table', 'Source_ID'),
+    )
+    Movement_ID = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    Created_At = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    Supply_ID = db.Column(db.Integer, db.ForeignKey('Supplies.Supply_ID', ondelete='CASCADE'), nullable=False)
+    Balance = db.Column(db.String(16), nullable=False)
+    Location_ID = db.Column(db.Integer, db.ForeignKey('Locations.Location_ID', ondelete='SET NULL'))
+    Quantity = db.Column(db.Float, nullable=False)
+    Reason = db.Column(db.String(32), nullable=False)
+    Source_Table = db.Column(db.String(64))
+    Source_ID = db.Column(db.Integer)
+    # The lot a usage movement was taken from (or given back to)
+    Lot_ID = db.Column(db.Integer, db.ForeignKey('Supply_Lots.Lot_ID', ondelete='SET NULL'))
+
+    def to_dict(self):
+        return {
+            'Movement_ID': self.Movement_ID,
+            'Created_At': self.Created_At.isoformat() if self.Created_At else None,
+            'Supply_ID': self.Supply_ID,
+            'Balance': self.Balance,
+            'Location_ID': self.Location_ID,
+            'Quantity': self.Quantity,
+            'Reason': self.Reason,
+            'Source_Table': self.Source_Table,
+            'Source_ID': self.Source_ID,
+            'Lot_ID': self.Lot_ID
+        }
+
+# Change Events
+# Row-level change feed, appended in the committing transaction (see
+# changefeed.py). Event_ID orders events for SSE clients resuming a stream.
+class ChangeEvents(db.Model):
+    __tablename__ = 'Change_Events'
+    __table_args__ = (
+        db.Index('ix_change_events_created_at', 'Created_At'),
+    )
+    Event_ID = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    Created_At = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    Table_Name = db.Column(db.String(64), nullable=False)
+    Action = db.Column(db.String(16), nullable=False)
+    Row_ID = db.Column(db.Integer)
+    Payload = db.Column(db.Text)
+
+# Relationships read by to_dict(); list queries join them into the same SELECT
+# so serializing N rows costs one query instead of N + 1.
+SERIALIZED_RELATIONSHIPS = {
+    SupplyOrders: ('supply', 'supplier'),
+    UsageRecords: ('supply',),
+    StoreStock: ('supply',),
+    RestockRequests: ('supply',),
+    UsageRecordsArchive: ('supply',),
+    SupplyLots: ('supply',),
+}
+
+def serialization_options(model):
+    options = []
+    for name in SERIALIZED_RELATIONSHIPS.get(model, ()):
+        relationship = getattr(model, name)
+        target = relationship.property.mapper.class_
+        options.append(db.joinedload(relationship).load_only(target.Name))
+    return options
+
+# ---------- Change tracking ----------
+# Names of the tables written in the current transaction are collected on the
+# session, from ORM flushes and from Core INSERT/UPDATE/DELETE statements run
+# through session.execute(), and announced through `tables_committed` once
+# the transaction commits. Tables some of whose written rows are not known,
+# from Core statements and ON DELETE actions, are also kept apart as
+# 'bulk_tables' for the change feed. A Core statement run with
+# execution_options(rows_logged=True) is not counted there: its caller logs
+# the rows it wrote (changefeed.log_rows).
+signals = Namespace()
+tables_committed = signals.signal('tables-committed')
+
+def _changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+def _bulk_tables(session):
+    return session.info.setdefault('bulk_tables', set())
+
+# Tables the database also writes when rows of `name` are deleted, through
+# ON DELETE CASCADE / SET NULL foreign keys, followed transitively
+@lru_cache(maxsize=None)
+def cascade_tables(name):
+    found = set()
+    pending = [name]
+    while pending:
+        target = pending.pop()
+        for table in db.metadata.sorted_tables:
+            if table.name not in found and any(
+                fk.ondelete and fk.column.table.name == target for fk in table.foreign_keys
+            ):
+                found.add(table.name)
+                pending.append(table.name)
+    found.discard(name)
+    return frozenset(found)
+
+@event.listens_for(Session, 'after_flush')
+def _track_flush(session, flush_context):
+    tables = _changed_tables(session)
+    for obj in session.new:
+        tables.add(obj.__table__.name)
+    for obj in session.deleted:
+        tables.add(obj.__table__.name)
+        tables.update(cascade_tables(obj.__table__.name))
+        _bulk_tables(session).update(cascade_tables(obj.__table__.name))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            tables.add(obj.__table__.name)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _track_execute(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        name = orm_execute_state.statement.table.name
+        cascades = cascade_tables(name) if orm_execute_state.is_delete else frozenset()
+        _changed_tables(orm_execute_state.session).update({name, *cascades})
+        bulk = _bulk_tables(orm_execute_state.session)
+        bulk.update(cascades)
+        if not orm_execute_state.execution_options.get('rows_logged'):
+            bulk.add(name)
+
+# SQLite only enforces foreign keys, and so runs their ON DELETE actions,
+# on connections that ask for it
+@event.listens_for(Engine, 'connect')
+def _sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+# Bump the version counter of every written table once the transaction has
+# committed, in one UPDATE of its own. Its row locks last for that statement
+# only, so writers of the same table do not queue behind each other's open
+# transactions. Readers see the new rows a moment before the new version,
+# which at worst stores fresh data under the old version; every table has its
+# row from the migrations (or from create_all), so nothing is inserted here.
+def _bump_versions(tables):
+    versions = TableVersions.__table__
+    try:
+        with db.engine.begin() as connection:
+            bumped = connection.execute(
+                update(versions).where(versions.c.Table_Name.in_(sorted(tables)))
+                .values(Version=versions.c.Version + 1)
+            ).rowcount
+    except SQLAlchemyError:
+        # The write is committed; only cached responses may lag behind it
+        logger.exception('Could not bump the versions of %s', ', '.join(sorted(tables)))
+        return
+    if bumped < len(tables):
+        logger.warning('Table_Versions lacks rows for some of %s; run flask db-upgrade', ', '.join(sorted(tables)))
+
+# Current version of each table, e.g. {'Supplies': 12, 'Usage_Records': 3}
+def table_versions(tables):
+    rows = db.session.execute(
+        select(TableVersions.Table_Name, TableVersions.Version).where(TableVersions.Table_Name.in_(tables))
+    ).all()
+    versions = dict.fromkeys(tables, 0)
+    versions.update(rows)
+    return versions
+
+@event.listens_for(Session, 'after_commit')
+def _announce_commit(session):
+    session.info.pop('bulk_tables', None)
+    tables = session.info.pop('changed_tables', None)
+    if tables:
+        _bump_versions(tables)
+        tables_committed.send(session, tables=frozenset(tables))
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_rollback(session):
+    session.info.pop('changed_tables', None)
+    session.info.pop('bulk_tables', None)
+
+# Start every table's counter at 0 when the schema is created
+@event.listens_for(TableVersions.__table__, 'after_create')
+def _seed_versions(target, connection, **kw):
+    names = sorted(t.name for t in db.metadata.sorted_tables if t is not target)
+    connection.execute(insert(target), [{'Table_Name': name, 'Version': 0} for name in names])
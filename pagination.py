@@ -0,0 +1,194 @@
+import base64
+import json
+from datetime import datetime, date, timedelta
+
+from flask import request, current_app
+from sqlalchemy import Select, and_, false, or_, select
+
+from models import db, Supplies, Locations
+
+
+class QueryParamError(ValueError):
+    pass
+
+
+# ---------- Cursors ----------
+def encode_cursor(values):
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+# The list of values encode_cursor() was given, still as JSON values
+def cursor_values(token):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise QueryParamError('Invalid cursor')
+    if not isinstance(values, list):
+        raise QueryParamError('Invalid cursor')
+    return values
+
+
+def decode_cursor(token, columns):
+    values = cursor_values(token)
+    if len(values) != len(columns):
+        raise QueryParamError('Invalid cursor')
+
+    decoded = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        if value is not None and python_type is date:
+            value = _parse_date(value, 'cursor')
+        elif value is not None and python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise QueryParamError('Invalid cursor')
+        elif value is not None and python_type is int and not isinstance(value, int):
+            raise QueryParamError('Invalid cursor')
+        decoded.append(value)
+    return decoded
+
+
+# ---------- Request arguments ----------
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise QueryParamError(f"'{name}' must be a date in YYYY-MM-DD format")
+
+
+def _parse_int(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise QueryParamError(f"'{name}' must be an integer")
+
+
+# Optional non-negative integer query parameter, e.g. an analytics threshold
+def int_arg(name, default):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    value = _parse_int(value, name)
+    if value < 0:
+        raise QueryParamError(f"'{name}' must not be negative")
+    return value
+
+
+def float_arg(name, default, minimum=None, maximum=None):
+    value = request.args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = float(value)
+    except ValueError:
+        raise QueryParamError(f"'{name}' must be a number")
+    if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+        raise QueryParamError(f"'{name}' must be between {minimum} and {maximum}")
+    return value
+
+
+def page_size():
+    limit = request.args.get('limit')
+    if limit is None:
+        return current_app.config['DEFAULT_PAGE_SIZE']
+    limit = _parse_int(limit, 'limit')
+    if limit < 1:
+        raise QueryParamError("'limit' must be positive")
+    return min(limit, current_app.config['MAX_PAGE_SIZE'])
+
+
+# Shared list filters: date range, supply, supplier, category and location
+def apply_filters(query, model, date_column=None):
+    args = request.args
+    if date_column is not None:
+        if args.get('start_date'):
+            query = query.filter(date_column >= _parse_date(args['start_date'], 'start_date'))
+        if args.get('end_date'):
+            end_date = _parse_date(args['end_date'], 'end_date')
+            if date_column.type.python_type is datetime:
+                # Inclusive end day for timestamp columns
+                query = query.filter(date_column < end_date + timedelta(days=1))
+            else:
+                query = query.filter(date_column <= end_date)
+
+    if args.get('supply_id') and hasattr(model, 'Supply_ID'):
+        query = query.filter(model.Supply_ID == _parse_int(args['supply_id'], 'supply_id'))
+
+    if args.get('supplier_id') and hasattr(model, 'Supplier_ID'):
+        query = query.filter(model.Supplier_ID == _parse_int(args['supplier_id'], 'supplier_id'))
+
+    if args.get('category'):
+        if hasattr(model, 'Category'):
+            query = query.filter(model.Category == args['category'])
+        elif hasattr(model, 'Supply_ID'):
+            query = query.filter(model.Supply_ID.in_(
+                select(Supplies.Supply_ID).where(Supplies.Category == args['category'])
+            ))
+
+    if args.get('location'):
+        if hasattr(model, 'Location'):
+            query = query.filter(model.Location == args['location'])
+        elif hasattr(model, 'Location_ID'):
+            query = query.filter(model.Location_ID == location_id(args['location']))
+
+    return query
+
+
+# Location_ID of the named location as a scalar subquery, so a location-scoped
+# query stays one statement and still reads only that location's index range
+def location_id(name):
+    return select(Locations.Location_ID).where(Locations.Name == name).scalar_subquery()
+
+
+# ---------- Keyset pagination ----------
+def _after(columns, values, descending):
+    # Row-value comparison spelled out so it works on every dialect:
+    # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+    # NULL sorts before every value, so NULL-dated rows page like the rest
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j].is_(None) if values[j] is None else columns[j] == values[j] for j in range(i)]
+        clauses.append(and_(*equal, _beyond(column, values[i], descending)))
+    return or_(*clauses)
+
+
+def _beyond(column, value, descending):
+    if descending:
+        if value is None:
+            return false()
+        return or_(column < value, column.is_(None)) if column.nullable else column < value
+    return column > value if value is not None else column.isnot(None)
+
+
+# NULLs first ascending and last descending, which MySQL and SQLite do by
+# themselves (and so can walk the index); other databases are told to
+def _order_by(column, descending):
+    order = column.desc() if descending else column.asc()
+    if column.nullable and db.session.get_bind().dialect.name not in ('mysql', 'sqlite'):
+        order = order.nulls_last() if descending else order.nulls_first()
+    return order
+
+
+# Returns one page of `query` ordered by `columns` plus the cursor for the next page.
+# `columns` must end with the primary key so the ordering is total. `query` is
+# an ORM query, or a Core select returning rows that include `columns`.
+def keyset_page(query, columns):
+    descending = request.args.get('order', 'asc').lower() == 'desc'
+    limit = page_size()
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        query = query.filter(_after(columns, decode_cursor(cursor, columns), descending))
+
+    query = query.order_by(*[_order_by(c, descending) for c in columns]).limit(limit + 1)
+    rows = (db.session.execute(query) if isinstance(query, Select) else query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([getattr(last, c.key) for c in columns])
+    return rows, next_cursor
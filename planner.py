@@ -0,0 +1,142 @@
+from datetime import timedelta
+from statistics import NormalDist
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, Supplies, Suppliers, SupplyOrders, StoreStock, RestockRequests, Locations
+from forecast import usage_matrix
+from changefeed import insert_logged
+from pagination import location_id
+
+
+# Every supply with its on-hand stock, scheduled receipts (open restock
+# requests) and the lead time of its preferred supplier (the one it was last
+# ordered from), in one query. With a location, on hand is that location's
+# store stock; otherwise it is Total_Quantity plus all store stock.
+def planning_rows(today, location=None):
+    stock = db.session.query(
+        StoreStock.Supply_ID,
+        func.sum(StoreStock.Quantity_Available).label('quantity')
+    )
+    scheduled = db.session.query(
+        RestockRequests.Supply_ID,
+        func.sum(RestockRequests.Quantity_Requested).label('quantity')
+    ).filter(
+        RestockRequests.Status == 'Open'
+    )
+    if location:
+        stock = stock.filter(StoreStock.Location_ID == location_id(location))
+        scheduled = scheduled.filter(RestockRequests.Location_ID == location_id(location))
+    stock = stock.group_by(StoreStock.Supply_ID).subquery()
+    scheduled = scheduled.group_by(RestockRequests.Supply_ID).subquery()
+
+    latest_order = db.session.query(
+        SupplyOrders.Supply_ID,
+        func.max(SupplyOrders.Order_ID).label('order_id')
+    ).group_by(
+        SupplyOrders.Supply_ID
+    ).subquery()
+
+    on_hand = func.coalesce(stock.c.quantity, 0)
+    if not location:
+        on_hand = on_hand + func.coalesce(Supplies.Total_Quantity, 0)
+
+    return db.session.query(
+        Supplies.Supply_ID,
+        Supplies.Name,
+        on_hand.label('on_hand'),
+        func.coalesce(scheduled.c.quantity, 0).label('scheduled'),
+        Suppliers.Supplier_ID,
+        Suppliers.Name.label('supplier_name'),
+        Suppliers.Lead_Time
+    ).outerjoin(
+        stock, stock.c.Supply_ID == Supplies.Supply_ID
+    ).outerjoin(
+        scheduled, scheduled.c.Supply_ID == Supplies.Supply_ID
+    ).outerjoin(
+        latest_order, latest_order.c.Supply_ID == Supplies.Supply_ID
+    ).outerjoin(
+        SupplyOrders, SupplyOrders.Order_ID == latest_order.c.order_id
+    ).outerjoin(
+        Suppliers, Suppliers.Supplier_ID == SupplyOrders.Supplier_ID
+    ).order_by(
+        Supplies.Supply_ID
+    ).all()
+
+
+# Reorder point, safety stock and order quantity for every supply in one
+# NumPy pass over the last `window_days` of daily usage:
+#   safety stock  = z(service_level) * std(daily usage) * sqrt(lead time)
+#   reorder point = mean daily usage * lead time + safety stock
+#   order         = up to reorder point + `review_days` of usage, once on hand
+#                   plus scheduled receipts is at or below the reorder point
+# Received restocks are in on hand already (see ledger.py); open ones are the
+# scheduled receipts, so a plan written as requests is not ordered again.
+# Returns the supplies that need an order, fewest days of cover first.
+def reorder_plan(today, window_days=30, service_level=0.95, review_days=7, default_lead_time=7, location=None):
+    rows = planning_rows(today, location)
+    if not rows:
+        return []
+    supply_ids = np.fromiter((r.Supply_ID for r in rows), dtype=np.int64, count=len(rows))
+    on_hand = np.fromiter((r.on_hand or 0 for r in rows), dtype=np.float64, count=len(rows))
+    inventory_position = on_hand + np.fromiter((r.scheduled or 0 for r in rows), dtype=np.float64, count=len(rows))
+    lead_time = np.fromiter((default_lead_time if r.Lead_Time is None else r.Lead_Time for r in rows),
+                            dtype=np.float64, count=len(rows))
+
+    # Daily usage rows aligned with `rows`; supplies without usage stay zero
+    ids, matrix = usage_matrix(today - timedelta(days=window_days - 1), today, location)
+    mean = np.zeros(len(rows))
+    std = np.zeros(len(rows))
+    if len(ids):
+        position = np.searchsorted(supply_ids, ids)
+        found = (position < len(supply_ids)) & (supply_ids[np.minimum(position, len(supply_ids) - 1)] == ids)
+        mean[position[found]] = matrix[found].mean(axis=1)
+        std[position[found]] = matrix[found].std(axis=1)
+
+    z = NormalDist().inv_cdf(service_level)
+    safety_stock = z * std * np.sqrt(lead_time)
+    reorder_point = mean * lead_time + safety_stock
+    order_up_to = reorder_point + mean * review_days
+    order = np.where(inventory_position <= reorder_point,
+                     np.ceil(np.maximum(order_up_to - inventory_position, 0)), 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cover = np.where(mean > 0, on_hand / mean, np.inf)
+
+    plan = []
+    for i in np.flatnonzero(order > 0)[np.argsort(cover[order > 0], kind='stable')]:
+        r = rows[i]
+        plan.append({
+            'supply_id': r.Supply_ID,
+            'supply_name': r.Name,
+            'supplier_id': r.Supplier_ID,
+            'supplier_name': r.supplier_name,
+            'lead_time_days': float(lead_time[i]),
+            'on_hand': float(on_hand[i]),
+            'scheduled_restocks': float(r.scheduled or 0),
+            'avg_daily_usage': float(mean[i]),
+            'safety_stock': float(safety_stock[i]),
+            'reorder_point': float(reorder_point[i]),
+            'order_quantity': float(order[i]),
+            'days_of_cover': float(cover[i]) if np.isfinite(cover[i]) else None,
+        })
+    return plan
+
+
+# Records one open 'Purchase from Supplier' restock request per planned
+# supply with a single executemany in the caller's transaction. Nothing moves
+# until a request is received (POST /restocks/<id>/receive); until then it is
+# a scheduled receipt of the next plan. Returns the number of requests.
+def write_restocks(plan, today, location=None):
+    location = db.session.query(Locations.Location_ID).filter(Locations.Name == location).scalar() if location else None
+    rows = [{
+        'Date': today,
+        'Supply_ID': p['supply_id'],
+        'Quantity_Requested': p['order_quantity'],
+        'Request_Type': 'Purchase from Supplier',
+        'Location_ID': location,
+        'Status': 'Open',
+    } for p in plan]
+    if rows:
+        insert_logged(RestockRequests, rows)
+    return len(rows)
@@ -0,0 +1,91 @@
+import threading
+import time
+from functools import wraps
+
+from flask import current_app
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import QueuePool
+
+REPLICA_BIND = 'replica'
+
+
+# ---------- Pool instrumentation ----------
+# QueuePool that records how long checkouts wait for a free connection and how
+# many give up with a timeout. Enabled through SQLALCHEMY_ENGINE_OPTIONS.
+class TimedQueuePool(QueuePool):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except Exception:
+            timed_out = True
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.timeouts += timed_out
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+# Size, usage and checkout wait statistics for every engine (default and binds)
+def pool_status(engines):
+    status = {}
+    for key, engine in engines.items():
+        pool = engine.pool
+        entry = {'pool_class': type(pool).__name__}
+        if isinstance(pool, QueuePool):
+            entry.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'checked_in': pool.checkedin(),
+                'overflow': pool.overflow(),
+                'max_overflow': pool._max_overflow,
+                'timeout': pool.timeout()
+            })
+        if isinstance(pool, TimedQueuePool):
+            with pool._stats_lock:
+                entry.update({
+                    'checkouts': pool.checkouts,
+                    'checkout_timeouts': pool.timeouts,
+                    'checkout_wait_avg_ms': round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+                    'checkout_wait_max_ms': round(pool.wait_max * 1000, 3)
+                })
+        status[key or 'default'] = entry
+    return status
+
+
+# ---------- Read replica routing ----------
+# Session that sends reads to the "replica" bind while the `use_replica` flag
+# is set on it. Flushes always go to the primary.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get('use_replica') and not self._flushing:
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Runs a read-only view against the read replica when one is configured
+def read_replica(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        session = current_app.extensions['sqlalchemy'].session
+        previous = session.info.get('use_replica', False)
+        session.info['use_replica'] = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            session.info['use_replica'] = previous
+    return wrapper
@@ -0,0 +1,109 @@
+import re
+
+from sqlalchemy import event
+
+from models import db
+from cache import response_cache
+
+# Filtered reads the indexes from migrations/0002, 0005, 0006, 0007, 0008 and 0009 exist for. Each one is
+# requested through the test client and every SELECT it runs is EXPLAINed.
+PLAN_CHECKS = [
+    '/usage?supply_id=1&start_date=2025-01-01&end_date=2025-01-31',
+    '/usage?start_date=2025-01-01&end_date=2025-01-31',
+    '/expenses?start_date=2025-01-01&end_date=2025-01-31&category=Rent',
+    '/orders?start_date=2025-01-01&end_date=2025-01-31',
+    '/purchases?start_date=2025-01-01&end_date=2025-01-31',
+    '/restocks?start_date=2025-01-01&end_date=2025-01-31',
+    '/stock?supply_id=1',
+    '/lots?supply_id=1',
+    '/supplies?start_date=2025-01-01&end_date=2025-01-31',
+    '/analytics/expiring-soon',
+    '/analytics/stock-alerts',
+    '/analytics/spending-trends',
+    '/analytics/reorder-plan',
+    '/analytics/spend?source=expenses,orders&start_month=2025-01&end_month=2025-12&group_by=month,source',
+    '/analytics/spend?start_month=2025-01&end_month=2025-03&group_by=supplier',
+    # A delta, and whole tables (a snapshot, or a table a bulk delete made
+    # complete) paged by primary key
+    '/sync?since=0&tables=Supplies',
+    '/sync?tables=Usage_Records',
+    '/archive/usage?supply_id=1&start_date=2020-01-01&end_date=2020-01-31',
+    '/archive/expenses?start_date=2020-01-01&end_date=2020-01-31&category=Rent',
+    # Location-scoped reads: only that location's index range
+    '/stock?location=Main%20Store',
+    '/restocks?location=Main%20Store',
+    '/analytics/expiring-soon?location=Main%20Store',
+    '/analytics/stock-alerts?location=Main%20Store',
+    '/analytics/forecast?location=Main%20Store',
+]
+
+# Full scans that are the point of the query (whole-table aggregates), or
+# where the planner may rightly prefer the primary key order: without table
+# statistics SQLite walks Store_Stock by Stock_ID instead of sorting the rows
+# found through ix_store_stock_quantity. Keyed by the exact URL, so the
+# location-scoped variants must not scan.
+ALLOWED_SCANS = {
+    '/analytics/stock-alerts': {'Store_Stock'},
+    '/analytics/reorder-plan': {'Supplies'},
+}
+
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?(.*)$')
+
+
+# Tables read without an index by one statement
+def _sqlite_scans(connection, statement, parameters):
+    scans = set()
+    for row in connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters):
+        match = SQLITE_SCAN.match(row[-1])
+        if match and 'USING' not in match.group(2):
+            scans.add(match.group(1))
+    return scans
+
+
+def _mysql_scans(connection, statement, parameters):
+    rows = connection.exec_driver_sql(f'EXPLAIN {statement}', parameters).mappings()
+    return {row['table'] for row in rows if row['type'] == 'ALL'}
+
+
+EXPLAINERS = {
+    'sqlite': _sqlite_scans,
+    'mysql': _mysql_scans,
+}
+
+
+# Runs every URL in `urls` and reports the full table scans in the SELECTs it
+# issued, as [{'url', 'table', 'statement'}]. Only real tables count, so scans
+# of derived tables and subqueries are ignored.
+def full_scans(app, urls=PLAN_CHECKS, allowed=ALLOWED_SCANS):
+    problems = []
+    with app.app_context():
+        engine = db.engine
+        explain = EXPLAINERS.get(engine.dialect.name)
+        if explain is None:
+            raise RuntimeError(f'No query plan check for the {engine.dialect.name} dialect')
+        tables = set(db.metadata.tables)
+
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            if not executemany and statement.lstrip().upper().startswith('SELECT'):
+                statements.append((statement, parameters))
+
+        client = app.test_client()
+        for url in urls:
+            response_cache.clear()
+            statements.clear()
+            event.listen(engine, 'before_cursor_execute', capture)
+            try:
+                response = client.get(url)
+            finally:
+                event.remove(engine, 'before_cursor_execute', capture)
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+
+            with engine.connect() as connection:
+                for statement, parameters in statements:
+                    scanned = explain(connection, statement, parameters) & tables
+                    for table in sorted(scanned - allowed.get(url, set())):
+                        problems.append({'url': url, 'table': table, 'statement': statement})
+    return problems
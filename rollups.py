@@ -0,0 +1,123 @@
+from collections import defaultdict
+from datetime import datetime
+
+from sqlalchemy import delete, func, insert, select, union_all
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+from models import db, UsageRecords, UsageRecordsArchive, UsageDaily
+
+
+# ---------- Upsert ----------
+# INSERT ... ON DUPLICATE KEY / ON CONFLICT that adds `increment_columns` onto
+# an existing row instead of overwriting it. Runs as a single executemany.
+def upsert_increment(table, rows, key_columns, increment_columns):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({
+            c: table.c[c] + stmt.inserted[c] for c in increment_columns
+        })
+    elif dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c[c] for c in key_columns],
+            set_={c: table.c[c] + stmt.excluded[c] for c in increment_columns}
+        )
+    else:
+        raise NotImplementedError(f'Upsert is not supported on {dialect}')
+    db.session.execute(stmt, rows)
+
+
+# INSERT that skips rows whose `key_columns` already exist, e.g. when a
+# concurrent transaction inserted the same key first. Runs as a single
+# executemany.
+def insert_ignore(table, rows, key_columns, **execution_options):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'mysql':
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({key_columns[0]: table.c[key_columns[0]]})
+    elif dialect in ('sqlite', 'postgresql'):
+        stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+        stmt = stmt.on_conflict_do_nothing(index_elements=[table.c[c] for c in key_columns])
+    else:
+        raise NotImplementedError(f'Upsert is not supported on {dialect}')
+    db.session.execute(stmt.execution_options(**execution_options), rows)
+
+
+def _day(value):
+    if value is None:
+        return datetime.now().date()
+    return value.date() if isinstance(value, datetime) else value
+
+
+# ---------- Usage rollup ----------
+# Applies usage rows (dicts or UsageRecords) to Usage_Daily in the caller's
+# transaction. sign=-1 backs rows out again when they are deleted.
+def apply_usage(records, sign=1):
+    totals = defaultdict(lambda: [0.0, 0])
+    for r in records:
+        get = r.get if isinstance(r, dict) else lambda k: getattr(r, k)
+        key = (_day(get('Date')), get('Supply_ID'), get('Location') or '')
+        totals[key][0] += sign * (get('Quantity_Used') or 0)
+        totals[key][1] += sign
+
+    _increment([
+        {'Day': day, 'Supply_ID': supply_id, 'Location': location,
+         'Quantity_Used': quantity, 'Record_Count': count}
+        for (day, supply_id, location), (quantity, count) in totals.items()
+    ], sign)
+
+
+def _increment(rows, sign):
+    if not rows:
+        return
+    table = UsageDaily.__table__
+    upsert_increment(table, rows, ['Day', 'Supply_ID', 'Location'], ['Quantity_Used', 'Record_Count'])
+    if sign < 0:
+        db.session.execute(delete(table).where(table.c.Record_Count <= 0))
+
+
+# Backs every Usage_Records row matching `whereclause` out of Usage_Daily with
+# one grouped SELECT, before a bulk delete removes them in the same transaction
+def back_out_usage(whereclause):
+    location_key = func.coalesce(UsageRecords.Location, '')
+    totals = select(
+        UsageRecords.Date, UsageRecords.Supply_ID, location_key,
+        func.coalesce(func.sum(UsageRecords.Quantity_Used), 0), func.count()
+    ).where(
+        UsageRecords.Date.isnot(None),
+        UsageRecords.Supply_ID.isnot(None)
+    ).group_by(UsageRecords.Date, UsageRecords.Supply_ID, location_key)
+    if whereclause is not None:
+        totals = totals.where(whereclause)
+    _increment([
+        {'Day': day, 'Supply_ID': supply_id, 'Location': location,
+         'Quantity_Used': -quantity, 'Record_Count': -count}
+        for day, supply_id, location, quantity, count in db.session.execute(totals)
+    ], -1)
+
+
+# Recomputes Usage_Daily from the full usage history, archived months included
+def rebuild_usage_rollup():
+    table = UsageDaily.__table__
+    usage = union_all(*[
+        select(model.Date, model.Supply_ID, model.Location, model.Quantity_Used)
+        for model in (UsageRecords, UsageRecordsArchive)
+    ]).subquery()
+    db.session.execute(delete(table))
+    db.session.execute(insert(table).from_select(
+        ['Day', 'Supply_ID', 'Location', 'Quantity_Used', 'Record_Count'],
+        select(
+            usage.c.Date,
+            usage.c.Supply_ID,
+            func.coalesce(usage.c.Location, ''),
+            func.coalesce(func.sum(usage.c.Quantity_Used), 0),
+            func.count()
+        ).where(
+            usage.c.Date.isnot(None),
+            usage.c.Supply_ID.isnot(None)
+        ).group_by(
+            usage.c.Date, usage.c.Supply_ID, func.coalesce(usage.c.Location, '')
+        )
+    ))
+    db.session.commit()
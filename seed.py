@@ -0,0 +1,203 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import delete, insert, select
+
+from models import db, Supplies, Suppliers, Locations, SupplyOrders, UsageRecords, Expenses, StoreStock, RestockRequests, MarketPurchases, StockMovements, SupplyLots, UsageRecordsArchive, ExpensesArchive, SpendMonthly
+from rollups import rebuild_usage_rollup
+from spend import rebuild_spend_cube
+from ledger import reconcile_ledger
+from lots import open_untracked_stock
+
+SEED_CHUNK_SIZE = 50000
+
+# Row counts per table. "large" is the volume to check before a deploy.
+PROFILES = {
+    'small': {
+        'suppliers': 20, 'supplies': 200, 'stock': 400, 'orders': 2000,
+        'usage': 50000, 'expenses': 2000, 'restocks': 500, 'purchases': 2000,
+    },
+    'large': {
+        'suppliers': 200, 'supplies': 5000, 'stock': 15000, 'orders': 200000,
+        'usage': 10000000, 'expenses': 50000, 'restocks': 20000, 'purchases': 100000,
+    },
+}
+
+CATEGORIES = ['Tea', 'Dairy', 'Flavoring', 'Sweetener', 'Toppings', 'Packaging', 'Fruit', 'Cleaning']
+EXPENSE_CATEGORIES = ['Rent', 'Utilities', 'Wages', 'Supplies', 'Maintenance', 'Marketing', None]
+LOCATIONS = ['Main Store', 'Downtown', 'Airport', 'Campus', 'Mall', None]
+REQUEST_TYPES = ['Transfer from Inventory', 'Purchase from Supplier']
+
+
+# Generates rows with NumPy, chunk by chunk, and inserts each chunk with one
+# executemany in its own transaction so large volumes stay within memory.
+class Seeder:
+    def __init__(self, years=3, seed=None, today=None):
+        self.rng = np.random.default_rng(seed)
+        self.today = today or datetime.now().date()
+        start = self.today - timedelta(days=365 * years - 1)
+        self.days = np.array([start + timedelta(days=i) for i in range(365 * years)], dtype=object)
+
+    def _dates(self, n):
+        # Weighted towards recent days, like a growing business
+        weights = np.linspace(0.5, 1.5, len(self.days))
+        return self.days[self.rng.choice(len(self.days), size=n, p=weights / weights.sum())]
+
+    def _pick(self, options, n):
+        return np.array(options, dtype=object)[self.rng.integers(0, len(options), n)]
+
+    def _money(self, low, high, n):
+        return np.round(self.rng.uniform(low, high, n), 2)
+
+    def _insert(self, model, total, make_columns):
+        table = model.__table__
+        for offset in range(0, total, SEED_CHUNK_SIZE):
+            n = min(SEED_CHUNK_SIZE, total - offset)
+            columns = make_columns(n, offset)
+            names = list(columns)
+            rows = [dict(zip(names, values)) for values in zip(*(columns[k].tolist() for k in names))]
+            db.session.execute(insert(table), rows)
+            db.session.commit()
+
+    def _ids(self, column):
+        return np.array(db.session.execute(select(column)).scalars().all(), dtype=np.int64)
+
+    # Creates the named locations that do not exist yet; returns {name: id}
+    def locations(self, names):
+        existing = set(db.session.execute(select(Locations.Name)).scalars())
+        new = [{'Name': n} for n in names if n not in existing]
+        if new:
+            db.session.execute(insert(Locations.__table__), new)
+            db.session.commit()
+        return dict(db.session.execute(select(Locations.Name, Locations.Location_ID)).all())
+
+    # Random LOCATIONS for n rows: their names and Location_IDs
+    def _locations(self, location_ids, n):
+        pick = self.rng.integers(0, len(LOCATIONS), n)
+        names = np.array(LOCATIONS, dtype=object)[pick]
+        return names, np.array([location_ids.get(l) for l in LOCATIONS], dtype=object)[pick]
+
+    def suppliers(self, n):
+        self._insert(Suppliers, n, lambda k, o: {
+            'Name': np.array([f'Supplier {o + i + 1}' for i in range(k)], dtype=object),
+            'Contact': np.array([f'555-{self.rng.integers(1000, 9999)}' for _ in range(k)], dtype=object),
+            'Lead_Time': self.rng.integers(1, 15, k),
+        })
+
+    def supplies(self, n):
+        def columns(k, o):
+            category = self._pick(CATEGORIES, k)
+            return {
+                'Name': np.array([f'{c} item {o + i + 1}' for i, c in enumerate(category)], dtype=object),
+                'Category': category,
+                'Expiry_Date': np.array([self.today + timedelta(days=int(d))
+                                         for d in self.rng.integers(-30, 365, k)], dtype=object),
+                'Total_Quantity': self._money(10, 500, k),
+                'Cost_Per_Unit': self._money(0.5, 40, k),
+            }
+        self._insert(Supplies, n, columns)
+
+    # Distinct (supply, location) pairs, one Store_Stock row each
+    def stock(self, n, supply_ids, location_ids):
+        now = datetime.now()
+        n = min(n, len(supply_ids) * len(LOCATIONS))
+        pairs = self.rng.choice(len(supply_ids) * len(LOCATIONS), n, replace=False)
+        locations = np.array([location_ids.get(l) for l in LOCATIONS], dtype=object)
+        self._insert(StoreStock, n, lambda k, o: {
+            'Supply_ID': supply_ids[pairs[o:o + k] // len(LOCATIONS)],
+            'Location_ID': locations[pairs[o:o + k] % len(LOCATIONS)],
+            # A tail of low quantities so stock alerts have work to do
+            'Quantity_Available': np.round(self.rng.exponential(60, k), 2),
+            'Last_Updated': np.array([now - timedelta(minutes=int(m))
+                                      for m in self.rng.integers(0, 60 * 24 * 30, k)], dtype=object),
+        })
+
+    def orders(self, n, supply_ids, supplier_ids):
+        self._insert(SupplyOrders, n, lambda k, o: {
+            'Date': self._dates(k),
+            'Supplier_ID': supplier_ids[self.rng.integers(0, len(supplier_ids), k)],
+            'Supply_ID': supply_ids[self.rng.integers(0, len(supply_ids), k)],
+            'Quantity_Received': self._money(5, 200, k),
+            'Total_Cost': self._money(20, 2000, k),
+        })
+
+    def usage(self, n, supply_ids, location_ids):
+        # Some supplies are used far more than others
+        popularity = self.rng.pareto(1.5, len(supply_ids)) + 1
+        p = popularity / popularity.sum()
+
+        def columns(k, o):
+            names, ids = self._locations(location_ids, k)
+            return {
+                'Date': self._dates(k),
+                'Supply_ID': supply_ids[self.rng.choice(len(supply_ids), size=k, p=p)],
+                'Quantity_Used': self._money(0.1, 20, k),
+                'Location': names,
+                'Location_ID': ids,
+            }
+        self._insert(UsageRecords, n, columns)
+
+    def expenses(self, n):
+        self._insert(Expenses, n, lambda k, o: {
+            'Date': self._dates(k),
+            'Category': self._pick(EXPENSE_CATEGORIES, k),
+            'Amount': self._money(10, 5000, k),
+        })
+
+    def restocks(self, n, supply_ids, location_ids):
+        self._insert(RestockRequests, n, lambda k, o: {
+            'Date': self._dates(k),
+            'Supply_ID': supply_ids[self.rng.integers(0, len(supply_ids), k)],
+            'Location_ID': self._locations(location_ids, k)[1],
+            'Quantity_Requested': self._money(1, 100, k),
+            'Request_Type': self._pick(REQUEST_TYPES, k),
+        })
+
+    def purchases(self, n):
+        def columns(k, o):
+            category = self._pick(CATEGORIES, k)
+            return {
+                'Date': self._dates(k),
+                'Item_Name': np.array([f'{c} (market)' for c in category], dtype=object),
+                'Quantity': self._money(1, 20, k),
+                'Cost': self._money(2, 300, k),
+                'Category': category,
+            }
+        self._insert(MarketPurchases, n, columns)
+
+
+# Empties every data table, children first. Table_Versions and the migration
+# history are kept.
+def clear_data():
+    for model in (StockMovements, SupplyLots, UsageRecordsArchive, ExpensesArchive, UsageRecords, SupplyOrders, StoreStock, RestockRequests, MarketPurchases,
+                  Expenses, Supplies, Suppliers, Locations, SpendMonthly):
+        db.session.execute(delete(model.__table__))
+    rebuild_usage_rollup()
+
+
+# Fills every table with `volumes` rows (see PROFILES) spread over `years`
+# of history, then rebuilds the Usage_Daily rollup and the spend cube and
+# opens the stock ledger and one lot per supply at the seeded balances.
+def seed(volumes, years=3, random_seed=None, reset=False):
+    if reset:
+        clear_data()
+    seeder = Seeder(years=years, seed=random_seed)
+
+    location_ids = seeder.locations([l for l in LOCATIONS if l])
+    seeder.suppliers(volumes['suppliers'])
+    seeder.supplies(volumes['supplies'])
+    supply_ids = seeder._ids(Supplies.Supply_ID)
+    supplier_ids = seeder._ids(Suppliers.Supplier_ID)
+    if len(supply_ids):
+        seeder.stock(volumes['stock'], supply_ids, location_ids)
+        seeder.usage(volumes['usage'], supply_ids, location_ids)
+        seeder.restocks(volumes['restocks'], supply_ids, location_ids)
+        if len(supplier_ids):
+            seeder.orders(volumes['orders'], supply_ids, supplier_ids)
+    seeder.expenses(volumes['expenses'])
+    seeder.purchases(volumes['purchases'])
+
+    rebuild_usage_rollup()
+    rebuild_spend_cube()
+    reconcile_ledger()
+    open_untracked_stock()
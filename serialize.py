@@ -0,0 +1,81 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+from flask import current_app, request
+from sqlalchemy import select
+
+from models import Supplies, Suppliers, SERIALIZED_RELATIONSHIPS
+from pagination import QueryParamError
+
+# orjson encodes dates natively and several times faster than json; the
+# standard library is the fallback where it is not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+
+# ---------- Encoding ----------
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+# Compact JSON with sorted keys, byte for byte what jsonify() sends
+def dumps(obj):
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SORT_KEYS)
+    return json.dumps(obj, default=_default, sort_keys=True, separators=(',', ':')).encode()
+
+
+def json_response(obj, status=200):
+    return current_app.response_class(dumps(obj), status=status, mimetype='application/json')
+
+
+# ---------- Row statements ----------
+# Related names that to_dict() adds: relationship -> (output key, column, join)
+RELATED_NAMES = {
+    'supply': ('Supply_Name', lambda: Supplies.Name, lambda model: Supplies.Supply_ID == model.Supply_ID),
+    'supplier': ('Supplier_Name', lambda: Suppliers.Name, lambda model: Suppliers.Supplier_ID == model.Supplier_ID),
+}
+
+
+# Output key -> column for every field model.to_dict() returns
+def output_columns(model):
+    columns = {c.key: c for c in model.__table__.columns}
+    for relationship in SERIALIZED_RELATIONSHIPS.get(model, ()):
+        key, column, _ = RELATED_NAMES[relationship]
+        columns[key] = column().label(key)
+    return columns
+
+
+# ?fields=Usage_ID,Date,Supply_Name: the output keys to return, all by default
+def requested_fields(model):
+    available = output_columns(model)
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise QueryParamError(f"Unknown field(s) {', '.join(unknown)}; expected some of {', '.join(available)}")
+    return fields or list(available)
+
+
+# SELECT of `fields` (and the `extra` columns keyset paging needs, after
+# them) as plain rows, joining a related table only when its name is wanted
+def row_statement(model, fields, extra=()):
+    available = output_columns(model)
+    columns = [available[f] for f in fields]
+    columns += [c for c in extra if c.key not in fields]
+    stmt = select(*columns)
+    for relationship in SERIALIZED_RELATIONSHIPS.get(model, ()):
+        key, column, onclause = RELATED_NAMES[relationship]
+        if key in fields:
+            stmt = stmt.outerjoin(column().class_, onclause(model))
+    return stmt
+
+
+def row_dicts(rows, fields):
+    return [dict(zip(fields, row)) for row in rows]
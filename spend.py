@@ -0,0 +1,274 @@
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import delete, extract, func, insert, select, update
+from sqlalchemy.orm import aliased
+
+from models import db, Expenses, ExpensesArchive, SupplyOrders, MarketPurchases, Supplies, Suppliers, SpendMonthly
+from pagination import QueryParamError
+from rollups import upsert_increment
+
+
+class ClosedMonthError(ValueError):
+    pass
+
+
+# Source -> (model, amount column, category column). A supply order has no
+# category of its own and takes its supply's.
+SPEND_SOURCES = {
+    'expenses': (Expenses, 'Amount', 'Category'),
+    'orders': (SupplyOrders, 'Total_Cost', None),
+    'purchases': (MarketPurchases, 'Cost', 'Category'),
+}
+SPEND_MODELS = {model: source for source, (model, _, _) in SPEND_SOURCES.items()}
+
+# Dimensions a slice can be grouped by
+SPEND_DIMENSIONS = ('year', 'month', 'source', 'category', 'supplier')
+
+KEY_COLUMNS = ['Month', 'Source', 'Category', 'Supplier_ID']
+
+
+def _month(value):
+    if value is None:
+        value = datetime.now().date()
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.replace(day=1)
+
+
+def _next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+# Last month closed by freeze_spend_months(), or None
+def frozen_through():
+    return db.session.execute(
+        select(func.max(SpendMonthly.Month)).where(SpendMonthly.Frozen.is_(True))
+    ).scalar()
+
+
+# ---------- Maintenance ----------
+# Applies spend rows of `source` (dicts or model instances) to Spend_Monthly
+# in the caller's transaction; sign=-1 backs deleted rows out again. New spend
+# dated in a frozen month is refused with ClosedMonthError, while deleting
+# such a row leaves the closed month as it was.
+def apply_spend(source, records, sign=1):
+    _, amount_column, category_column = SPEND_SOURCES[source]
+    rows = []
+    for r in records:
+        get = r.get if isinstance(r, dict) else lambda k: getattr(r, k, None)
+        rows.append((_month(get('Date')), get(amount_column) or 0,
+                     get(category_column) if category_column else None, get('Supply_ID'), get('Supplier_ID')))
+    if not rows:
+        return
+
+    frozen = frozen_through()
+    if frozen is not None:
+        closed = sorted({month for month, *_ in rows if month <= frozen})
+        if closed and sign > 0:
+            raise ClosedMonthError(f"Spend for {closed[0]:%Y-%m} is closed; months up to {frozen:%Y-%m} are frozen")
+        rows = [r for r in rows if r[0] > frozen]
+
+    if not category_column:
+        supply_ids = {supply_id for *_, supply_id, _ in rows if supply_id is not None}
+        categories = dict(db.session.execute(
+            select(Supplies.Supply_ID, Supplies.Category).where(Supplies.Supply_ID.in_(supply_ids))
+        ).all()) if supply_ids else {}
+        rows = [(month, amount, categories.get(supply_id), supply_id, supplier_id)
+                for month, amount, _, supply_id, supplier_id in rows]
+
+    totals = defaultdict(lambda: [0.0, 0])
+    for month, amount, category, _, supplier_id in rows:
+        key = (month, category or '', supplier_id or 0)
+        totals[key][0] += sign * amount
+        totals[key][1] += sign
+    _increment([
+        {'Month': month, 'Source': source, 'Category': category, 'Supplier_ID': supplier_id,
+         'Amount': amount, 'Record_Count': count}
+        for (month, category, supplier_id), (amount, count) in totals.items()
+    ], sign)
+
+
+def _increment(rows, sign):
+    if not rows:
+        return
+    table = SpendMonthly.__table__
+    upsert_increment(table, rows, KEY_COLUMNS, ['Amount', 'Record_Count'])
+    if sign < 0:
+        db.session.execute(delete(table).where(table.c.Record_Count <= 0, table.c.Frozen.is_(False)))
+
+
+# Monthly totals of `model` (a source's table or its archive) as (month,
+# category, supplier, amount, count) rows, from one grouped SELECT. Supplies
+# is joined under an alias, so a `whereclause` with its own Supplies
+# subquery (?category= on orders) is not correlated to it.
+def _totals(source, model, whereclause=None, after=None):
+    _, amount_column, category_column = SPEND_SOURCES[source]
+    year, month = extract('year', model.Date), extract('month', model.Date)
+    supply = aliased(Supplies)
+    if category_column:
+        category = func.coalesce(getattr(model, category_column), '')
+    else:
+        category = func.coalesce(supply.Category, '')
+    keys = [year, month, category]
+    if hasattr(model, 'Supplier_ID'):
+        keys.append(func.coalesce(model.Supplier_ID, 0))
+
+    stmt = select(
+        *keys, func.coalesce(func.sum(getattr(model, amount_column)), 0), func.count()
+    ).select_from(model).where(model.Date.isnot(None))
+    if not category_column:
+        stmt = stmt.outerjoin(supply, supply.Supply_ID == model.Supply_ID)
+    if whereclause is not None:
+        stmt = stmt.where(whereclause)
+    if after is not None:
+        stmt = stmt.where(model.Date >= after)
+    for row in db.session.execute(stmt.group_by(*keys)):
+        supplier_id = row[3] if len(keys) == 4 else 0
+        yield date(int(row[0]), int(row[1]), 1), row[2], supplier_id, row[-2], row[-1]
+
+
+# Backs every row of `source` matching `whereclause` out of Spend_Monthly with
+# one grouped SELECT, before a bulk or cascading delete removes them in the
+# same transaction. Frozen months keep their totals.
+def back_out_spend(source, whereclause):
+    model = SPEND_SOURCES[source][0]
+    frozen = frozen_through()
+    _increment([
+        {'Month': month, 'Source': source, 'Category': category, 'Supplier_ID': supplier_id,
+         'Amount': -amount, 'Record_Count': -count}
+        for month, category, supplier_id, amount, count in _totals(
+            source, model, whereclause, _next_month(frozen) if frozen else None)
+    ], -1)
+
+
+# Recomputes the open months of Spend_Monthly from the spend tables, archived
+# expenses included. Frozen months are left as they are. Returns the number
+# of cells written.
+def rebuild_spend_cube():
+    table = SpendMonthly.__table__
+    frozen = frozen_through()
+    after = _next_month(frozen) if frozen else None
+    totals = defaultdict(lambda: [0.0, 0])
+    for source, model in (('expenses', Expenses), ('expenses', ExpensesArchive),
+                          ('orders', SupplyOrders), ('purchases', MarketPurchases)):
+        for month, category, supplier_id, amount, count in _totals(source, model, after=after):
+            cell = totals[(month, source, category, supplier_id)]
+            cell[0] += amount
+            cell[1] += count
+
+    db.session.execute(delete(table).where(table.c.Frozen.is_(False)))
+    if totals:
+        db.session.execute(insert(table), [
+            {'Month': month, 'Source': source, 'Category': category, 'Supplier_ID': supplier_id,
+             'Amount': amount, 'Record_Count': count, 'Frozen': False}
+            for (month, source, category, supplier_id), (amount, count) in totals.items()
+        ])
+    db.session.commit()
+    return len(totals)
+
+
+# Freezes every month before `cutoff`: their cells are never rebuilt or
+# backed out again, and new spend dated in them is refused. Returns the
+# number of cells frozen.
+def freeze_spend_months(cutoff):
+    table = SpendMonthly.__table__
+    frozen = db.session.execute(
+        update(table).where(table.c.Month < cutoff, table.c.Frozen.is_(False)).values(Frozen=True)
+    ).rowcount
+    db.session.commit()
+    return frozen
+
+
+# ---------- Slices ----------
+# ?group_by=month,category: the dimensions to roll up to, none for a grand total
+def spend_dimensions(value):
+    names = [d.strip() for d in (value or '').split(',') if d.strip()]
+    unknown = [d for d in names if d not in SPEND_DIMENSIONS]
+    if unknown:
+        raise QueryParamError(f"Unknown dimension(s) {', '.join(unknown)}; expected some of {', '.join(SPEND_DIMENSIONS)}")
+    return list(dict.fromkeys(names))
+
+
+# ?source=expenses,orders: the sources to include, all by default
+def spend_sources(value):
+    names = [s.strip() for s in (value or '').split(',') if s.strip()]
+    unknown = [s for s in names if s not in SPEND_SOURCES]
+    if unknown:
+        raise QueryParamError(f"Unknown source(s) {', '.join(unknown)}; expected some of {', '.join(SPEND_SOURCES)}")
+    return names or None
+
+
+# ?start_month=2024-01: the first day of that month
+def spend_month(value, name):
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m').date()
+    except ValueError:
+        raise QueryParamError(f"'{name}' must be a month in YYYY-MM format")
+
+
+# Totals of the cube cells matching the filters, rolled up to `group_by`:
+#   {'rows': [{<dimension>: value, ..., 'total', 'count'}], 'total', 'count',
+#    'frozen_through'}
+# month comes back as 'YYYY-MM', supplier as supplier_id and supplier_name;
+# spend without a category or supplier has None there.
+def spend_slice(group_by=(), sources=None, categories=None, supplier_ids=None, start=None, end=None):
+    cube = SpendMonthly
+    expressions = {
+        'year': extract('year', cube.Month),
+        'month': cube.Month,
+        'source': cube.Source,
+        'category': cube.Category,
+        'supplier': cube.Supplier_ID,
+    }
+    keys = [expressions[d] for d in group_by]
+    columns = [expressions[d].label(d) for d in group_by]
+    if 'supplier' in group_by:
+        columns.append(Suppliers.Name.label('supplier_name'))
+        keys.append(Suppliers.Name)
+
+    stmt = select(*columns, func.sum(cube.Amount).label('total'), func.sum(cube.Record_Count).label('count'))
+    if 'supplier' in group_by:
+        stmt = stmt.select_from(cube).outerjoin(Suppliers, Suppliers.Supplier_ID == cube.Supplier_ID)
+    if sources:
+        stmt = stmt.where(cube.Source.in_(sources))
+    if categories:
+        stmt = stmt.where(cube.Category.in_(categories))
+    if supplier_ids:
+        stmt = stmt.where(cube.Supplier_ID.in_(supplier_ids))
+    if start:
+        stmt = stmt.where(cube.Month >= start)
+    if end:
+        stmt = stmt.where(cube.Month <= end)
+    if keys:
+        stmt = stmt.group_by(*keys).order_by(*keys)
+
+    rows = []
+    for r in db.session.execute(stmt):
+        if r.count is None:
+            continue
+        item = {'total': float(r.total or 0), 'count': int(r.count)}
+        for d in group_by:
+            value = getattr(r, d)
+            if d == 'year':
+                item[d] = int(value)
+            elif d == 'month':
+                item[d] = f'{value:%Y-%m}'
+            elif d == 'category':
+                item[d] = value or None
+            elif d == 'supplier':
+                item['supplier_id'] = value or None
+                item['supplier_name'] = r.supplier_name
+            else:
+                item[d] = value
+        rows.append(item)
+
+    frozen = frozen_through()
+    return {
+        'rows': rows,
+        'total': sum(r['total'] for r in rows),
+        'count': sum(r['count'] for r in rows),
+        'frozen_through': f'{frozen:%Y-%m}' if frozen else None,
+    }
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from models import (db, Supplies, Suppliers, Locations, Expenses, UsageRecords, SupplyOrders, SupplyLots, StoreStock,
+                    RestockRequests, MarketPurchases, ChangeEvents)
+from changefeed import GAP_GRACE_SECONDS
+from pagination import QueryParamError, cursor_values, encode_cursor
+
+# Tables a client can keep a local copy of, by table name. Archives, rollups
+# and bookkeeping tables are not synced.
+SYNC_MODELS = {m.__tablename__: m for m in (
+    Supplies, Suppliers, Locations, Expenses, UsageRecords, SupplyOrders, SupplyLots, StoreStock, RestockRequests,
+    MarketPurchases,
+)}
+
+# Events read per sync; a client that is further behind calls again
+SYNC_MAX_EVENTS = 5000
+# Rows of whole tables (a snapshot, or a table that came back complete) sent
+# per sync; the rest follow page by page through the returned cursor
+SYNC_MAX_ROWS = 5000
+# Row ids per IN (...) when reading changed rows
+SYNC_CHUNK_SIZE = 500
+
+
+# ?tables=Supplies,Usage_Records: the synced tables a client asks for, all by default
+def sync_tables(value):
+    names = [t.strip() for t in (value or '').split(',') if t.strip()]
+    unknown = [t for t in names if t not in SYNC_MODELS]
+    if unknown:
+        raise QueryParamError(f"Unknown table(s) {', '.join(unknown)}; expected some of {', '.join(SYNC_MODELS)}")
+    return names or list(SYNC_MODELS)
+
+
+# ?cursor=: the whole tables still to send, as [(table, last key sent)], the
+# key None for a table not started yet
+def sync_cursor(value):
+    if not value:
+        return []
+    values = cursor_values(value)
+    if not values or not (values[0] is None or isinstance(values[0], int)) \
+            or any(t not in SYNC_MODELS for t in values[1:]):
+        raise QueryParamError('Invalid cursor')
+    return [(t, values[0] if i == 0 else None) for i, t in enumerate(values[1:])]
+
+
+def _encode_sync_cursor(pending):
+    if not pending:
+        return None
+    return encode_cursor([pending[0][1], *(t for t, _ in pending)])
+
+
+def _rows(model, where=None, limit=None):
+    table = model.__table__
+    stmt = select(*table.columns).order_by(*table.primary_key.columns)
+    if where is not None:
+        stmt = stmt.where(where)
+    if limit is not None:
+        stmt = stmt.limit(limit)
+    return [dict(r._mapping) for r in db.session.execute(stmt)]
+
+
+# Pages through the whole tables in `pending` by primary key, up to `budget`
+# rows in all. A table's first page is `complete`, replacing the client's
+# copy; later ones add to it. Returns ({table: entry}, tables still pending).
+def _table_pages(pending, budget):
+    result = {}
+    pending = list(pending)
+    while pending and budget > 0:
+        name, after = pending[0]
+        key = SYNC_MODELS[name].__table__.primary_key.columns[0]
+        rows = _rows(SYNC_MODELS[name], key > (after or 0), budget)
+        entry = result.setdefault(name, {'rows': [], 'deleted': [], 'complete': after is None})
+        entry['rows'] += rows
+        budget -= len(rows)
+        if budget > 0:
+            pending.pop(0)
+        else:
+            pending[0] = (name, rows[-1][key.key])
+    return result, pending
+
+
+def _changed_rows(model, ids):
+    key = model.__table__.primary_key.columns[0]
+    ids = sorted(ids)
+    rows = []
+    for start in range(0, len(ids), SYNC_CHUNK_SIZE):
+        rows += _rows(model, key.in_(ids[start:start + SYNC_CHUNK_SIZE]))
+    return rows, key.key
+
+
+# Change_Events after `since`, oldest first, up to the first id that is
+# missing while later events are younger than GAP_GRACE_SECONDS: that id may
+# belong to a transaction still committing, so it and everything after it
+# wait for the next sync. An older gap is a rollback (or pruned) and skipped.
+def _settled_events(since, limit):
+    rows = db.session.execute(
+        select(ChangeEvents.Event_ID, ChangeEvents.Created_At, ChangeEvents.Table_Name, ChangeEvents.Row_ID)
+        .where(ChangeEvents.Event_ID > since).order_by(ChangeEvents.Event_ID).limit(limit)
+    ).all()
+    young = datetime.now() - timedelta(seconds=GAP_GRACE_SECONDS)
+    settled = []
+    for row in rows:
+        if row.Event_ID != since + 1 and row.Created_At > young:
+            return settled, False
+        settled.append(row)
+        since = row.Event_ID
+    return settled, len(rows) == limit
+
+
+# Newest event id a full snapshot read now is complete up to
+def _snapshot_token():
+    young = datetime.now() - timedelta(seconds=GAP_GRACE_SECONDS)
+    base = db.session.execute(
+        select(ChangeEvents.Event_ID).where(ChangeEvents.Created_At <= young)
+        .order_by(ChangeEvents.Created_At.desc(), ChangeEvents.Event_ID.desc()).limit(1)
+    ).scalar() or 0
+    while True:
+        events, more = _settled_events(base, SYNC_MAX_EVENTS)
+        base = events[-1].Event_ID if events else base
+        if not more:
+            return base
+
+
+# Rows of `tables` created, updated or deleted since the token `since`, read
+# from Change_Events in one transaction:
+#   tables: {name: {'rows': [...], 'deleted': [ids], 'complete': bool}}
+# `rows` hold the current column values of every changed row and `deleted`
+# the ids of changed rows that no longer exist (tombstones). A table written
+# by a bulk delete or a database cascade has no row ids in the log and is
+# sent whole, replacing the client's copy. Without a token, or when the
+# events after it were pruned, every table is sent whole and `reset` is set.
+# Whole tables go out at most `max_rows` rows at a time: the first page is
+# `complete`, and `cursor` (sent back as ?cursor= with the same token) asks
+# for the next. `more` asks the client to call again.
+def sync(since=None, tables=None, cursor=(), max_events=SYNC_MAX_EVENTS, max_rows=SYNC_MAX_ROWS):
+    tables = list(SYNC_MODELS) if tables is None else tables
+    if since is not None:
+        oldest, newest = db.session.execute(
+            select(func.min(ChangeEvents.Event_ID), func.max(ChangeEvents.Event_ID))
+        ).one()
+        if since > (newest or 0) or (oldest is not None and since + 1 < oldest):
+            since, cursor = None, ()
+
+    if since is None:
+        token = _snapshot_token()
+        result, pending = _table_pages([(t, None) for t in tables], max_rows)
+        return _response(token, True, bool(pending), result, pending)
+
+    # Still sending whole tables: the next page, then deltas from the token
+    if cursor:
+        result, pending = _table_pages(cursor, max_rows)
+        more = bool(pending) or db.session.execute(
+            select(ChangeEvents.Event_ID).where(ChangeEvents.Event_ID > since).limit(1)
+        ).first() is not None
+        return _response(since, False, more, result, pending)
+
+    events, more = _settled_events(since, max_events)
+    complete = set()
+    changed = defaultdict(set)
+    for e in events:
+        if e.Table_Name not in tables:
+            continue
+        if e.Row_ID is None:
+            complete.add(e.Table_Name)
+        else:
+            changed[e.Table_Name].add(e.Row_ID)
+
+    result = {}
+    for t in tables:
+        if t in changed and t not in complete:
+            rows, key = _changed_rows(SYNC_MODELS[t], changed[t])
+            found = {r[key] for r in rows}
+            result[t] = {'rows': rows, 'deleted': sorted(changed[t] - found), 'complete': False}
+    pages, pending = _table_pages([(t, None) for t in tables if t in complete], max_rows)
+    result.update(pages)
+    return _response(events[-1].Event_ID if events else since, False, more or bool(pending), result, pending)
+
+
+def _response(token, reset, more, result, pending):
+    return {
+        'token': token,
+        'cursor': _encode_sync_cursor(pending),
+        'reset': reset,
+        'more': more,
+        'tables': result,
+    }
@@ -0,0 +1,92 @@
+from datetime import date, timedelta
+
+from conftest import count_queries
+from lots import open_untracked_stock
+from models import db, Supplies, Suppliers, StoreStock
+
+
+def seed_stock():
+    today = date.today()
+    db.session.add_all([
+        Supplies(Name='Milk', Category='Dairy', Expiry_Date=today + timedelta(days=3)),
+        Supplies(Name='Tea', Category='Tea', Expiry_Date=today + timedelta(days=10)),
+        Supplies(Name='Syrup', Category='Flavoring', Expiry_Date=today + timedelta(days=20)),
+        Supplies(Name='Cups', Category='Packaging', Expiry_Date=today + timedelta(days=90)),
+    ])
+    db.session.flush()
+    db.session.add_all([
+        StoreStock(Supply_ID=1, Quantity_Available=2),
+        StoreStock(Supply_ID=1, Quantity_Available=50),
+        StoreStock(Supply_ID=2, Quantity_Available=8),
+        StoreStock(Supply_ID=4, Quantity_Available=40),
+    ])
+    db.session.commit()
+
+
+def test_stock_alerts(app, client):
+    seed_stock()
+    # Usage draws down store stock, so top it up first to keep Milk at 2
+    client.post('/restocks', json={'Supply_ID': 1, 'Quantity_Requested': 30, 'Request_Type': 'Purchase from Supplier'})
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 30, 'Date': date.today().isoformat()})
+    with count_queries() as statements:
+        alerts = client.get('/analytics/stock-alerts').get_json()
+    assert len(statements) == 2
+    assert alerts == [
+        {'Supply_ID': 1, 'Location_ID': None, 'Location': None, 'Name': 'Milk', 'Category': 'Dairy',
+         'Current_Stock': 2.0, 'Daily_Usage': 1.0, 'Days_Remaining': 2, 'Status': 'Critical'},
+        {'Supply_ID': 2, 'Location_ID': None, 'Location': None, 'Name': 'Tea', 'Category': 'Tea',
+         'Current_Stock': 8.0, 'Daily_Usage': 0.1, 'Days_Remaining': 80, 'Status': 'Low'},
+    ]
+
+    alerts = client.get('/analytics/stock-alerts?threshold=5&window_days=10').get_json()
+    assert [(a['Supply_ID'], a['Daily_Usage']) for a in alerts] == [(1, 3.0)]
+
+
+def test_expiring_soon(app, client):
+    seed_stock()
+    # Stock on hand becomes one lot per supply; Syrup has none
+    assert open_untracked_stock() == 3
+    db.session.add(Suppliers(Name='Dairy Partners'))
+    db.session.commit()
+    expiry = (date.today() + timedelta(days=12)).isoformat()
+    client.post('/orders', json={'Supplier_ID': 1, 'Supply_ID': 1, 'Quantity_Received': 6, 'Total_Cost': 9,
+                                 'Expiry_Date': expiry})
+
+    with count_queries() as statements:
+        items = client.get('/analytics/expiring-soon').get_json()
+    assert len(statements) == 2
+    assert [(i['Name'], i['days_until_expiry'], i['current_stock'], i['priority']) for i in items] == [
+        ('Milk', 3, 52.0, 'High'),
+        ('Tea', 10, 8.0, 'Medium'),
+        ('Milk', 12, 6.0, 'Medium'),
+    ]
+    assert items[2]['Expiry_Date'] == expiry and items[2]['Order_ID'] == 1
+
+    items = client.get('/analytics/expiring-soon?days=15&high_days=2&medium_days=5').get_json()
+    assert [(i['Name'], i['priority']) for i in items] == [('Milk', 'Medium'), ('Tea', 'Low'), ('Milk', 'Low')]
+
+
+def test_analytics_reject_bad_parameters(app, client):
+    assert client.get('/analytics/stock-alerts?threshold=abc').status_code == 400
+    assert client.get('/analytics/expiring-soon?days=-1').status_code == 400
+
+
+def test_spending_trends_pivot(app, client):
+    client.post('/expenses/bulk', json=[
+        {'Date': '2025-03-05', 'Category': 'Rent', 'Amount': 1000},
+        {'Date': '2025-03-20', 'Category': 'Rent', 'Amount': 200},
+        {'Date': '2025-03-09', 'Category': 'Utilities', 'Amount': 80},
+        {'Date': '2025-04-02', 'Amount': 15},
+        {'Date': '2024-12-31', 'Category': 'Utilities', 'Amount': 60},
+    ])
+    with count_queries() as statements:
+        data = client.get('/analytics/spending-trends').get_json()
+    assert len(statements) == 2
+    assert data == {
+        'trends': [
+            {'date': '2024-12', 'Utilities': 60.0},
+            {'date': '2025-03', 'Rent': 1200.0, 'Utilities': 80.0},
+            {'date': '2025-04', 'Uncategorized': 15.0},
+        ],
+        'categories': ['Rent', 'Uncategorized', 'Utilities'],
+    }
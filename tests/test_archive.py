@@ -0,0 +1,74 @@
+from datetime import date
+
+from archive import archive_cutoff, archive_before
+from models import db, Supplies, Suppliers, Expenses, UsageRecords, UsageRecordsArchive, ExpensesArchive, StockMovements
+from rollups import rebuild_usage_rollup
+from conftest import count_queries
+from test_rollups import rollup_rows
+
+
+def add_usage(client, *days):
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 2, 'Date': d.isoformat()} for d in days])
+
+
+def test_supply_delete_cascades_in_the_database(app, client):
+    db.session.add(Suppliers(Name='Dairy Partners'))
+    db.session.commit()
+    client.post('/supplies', json={'Name': 'Milk', 'Total_Quantity': 10})
+    add_usage(client, *[date(2024, 1, d) for d in range(1, 21)])
+    client.post('/orders', json={'Supplier_ID': 1, 'Supply_ID': 1, 'Quantity_Received': 5, 'Total_Cost': 9})
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 3})
+    etag = client.get('/usage').headers['ETag']
+
+    with count_queries() as statements:
+        assert client.delete('/supplies/1').status_code == 204
+    # Children are never loaded into the session
+    assert not any('FROM "Usage_Records"' in s for s in statements)
+    assert UsageRecords.query.count() == 0
+    assert StockMovements.query.count() == 0
+    assert client.get('/usage', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_bulk_delete_by_filter(app, client):
+    db.session.add_all([Supplies(Name='Milk'), Supplies(Name='Tea')])
+    db.session.commit()
+    add_usage(client, date(2024, 1, 5), date(2024, 1, 6), date(2024, 3, 1))
+    client.post('/usage/bulk', json=[{'Supply_ID': 2, 'Quantity_Used': 1, 'Date': '2024-01-05'}])
+
+    assert client.delete('/usage/bulk').status_code == 400
+    response = client.delete('/usage/bulk?supply_id=1&end_date=2024-01-31')
+    assert response.get_json() == {'deleted': 2}
+    assert rollup_rows() == [(date(2024, 1, 5), 2, '', 1.0, 1), (date(2024, 3, 1), 1, '', 2.0, 1)]
+
+    db.session.add(Expenses(Date=date(2024, 1, 5), Category='Rent', Amount=100))
+    db.session.commit()
+    assert client.delete('/expenses/bulk?category=Wages').get_json() == {'deleted': 0}
+    assert client.delete('/expenses/bulk?category=Rent').get_json() == {'deleted': 1}
+
+
+def test_archive_moves_closed_months(app, client):
+    db.session.add(Supplies(Name='Milk'))
+    db.session.commit()
+    client.post('/expenses/bulk', json=[{'Date': '2023-11-30', 'Category': 'Rent', 'Amount': 100},
+                                        {'Date': '2024-02-01', 'Category': 'Rent', 'Amount': 50}])
+    add_usage(client, date(2023, 11, 2), date(2023, 12, 31), date(2024, 1, 31), date(2024, 2, 1))
+    before = rollup_rows()
+    trends = client.get('/analytics/spending-trends').get_json()
+    assert [t['date'] for t in trends['trends']] == ['2023-11', '2024-02']
+
+    cutoff = archive_cutoff(1, today=date(2024, 3, 15))
+    assert cutoff == date(2024, 2, 1)
+    assert archive_before(cutoff) == {'usage': 3, 'expenses': 1}
+    assert archive_before(cutoff) == {'usage': 0, 'expenses': 0}
+
+    assert [u.Date for u in UsageRecords.query.all()] == [date(2024, 2, 1)]
+    assert UsageRecordsArchive.query.count() == 3
+    assert ExpensesArchive.query.one().Amount == 100
+
+    # History stays queryable and the aggregates do not change
+    archived = client.get('/archive/usage?start_date=2023-12-01').get_json()['items']
+    assert [(u['Date'], u['Supply_Name']) for u in archived] == [('2023-12-31', 'Milk'), ('2024-01-31', 'Milk')]
+    assert client.get('/analytics/spending-trends').get_json() == trends
+    assert rollup_rows() == before
+    rebuild_usage_rollup()
+    assert rollup_rows() == before
@@ -0,0 +1,37 @@
+from sqlalchemy import func
+
+from bench import first_ids, regressions, run, scenarios, uncovered_endpoints
+from models import db, UsageRecords, UsageDaily, StoreStock
+from seed import seed
+
+VOLUMES = {
+    'suppliers': 3, 'supplies': 10, 'stock': 20, 'orders': 50,
+    'usage': 500, 'expenses': 50, 'restocks': 20, 'purchases': 50,
+}
+
+
+def test_seed_fills_tables_and_rollup(app):
+    seed(VOLUMES, years=1, random_seed=7)
+    assert UsageRecords.query.count() == 500
+    assert StoreStock.query.count() == 20
+    assert db.session.query(func.sum(UsageDaily.Record_Count)).scalar() == 500
+
+
+def test_every_route_has_a_scenario(app):
+    assert uncovered_endpoints(app, scenarios(first_ids())) == []
+
+
+def test_benchmark_runs_every_scenario(app):
+    seed(VOLUMES, years=1, random_seed=7)
+    results = run(app, requests=2, warmup=0)
+    assert len(results) == len(scenarios(first_ids()))
+    for name, result in results.items():
+        assert all(200 <= s < 300 for s in result['status']), name
+        assert result['p50_ms'] <= result['p95_ms'] <= result['p99_ms']
+
+
+def test_regressions_compare_p95_and_query_count():
+    baseline = {'GET /usage': {'p95_ms': 10.0, 'queries': 2}}
+    assert regressions({'GET /usage': {'p95_ms': 12.0, 'queries': 2}}, baseline) == []
+    found = regressions({'GET /usage': {'p95_ms': 40.0, 'queries': 3}}, baseline)
+    assert len(found) == 2
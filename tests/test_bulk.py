@@ -0,0 +1,56 @@
+import time
+
+from conftest import count_queries
+from models import db, Supplies, UsageRecords, Expenses, StockMovements
+
+
+def add_supply():
+    db.session.add(Supplies(Name='Milk', Category='Dairy'))
+    db.session.commit()
+
+
+def test_bulk_usage_json(app, client):
+    add_supply()
+    rows = [{'Supply_ID': 1, 'Quantity_Used': i, 'Date': '2025-04-01', 'Location': 'Main Store'} for i in range(10000)]
+    started = time.perf_counter()
+    response = client.post('/usage/bulk', json=rows)
+    elapsed = time.perf_counter() - started
+    assert response.status_code == 201
+    assert response.get_json()['inserted'] == 10000
+    assert UsageRecords.query.count() == 10000
+    assert elapsed < 1.0
+
+
+def test_bulk_usage_is_one_insert_with_its_keys_read_back(app, client):
+    add_supply()
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 1})
+    rows = [{'Supply_ID': 1, 'Quantity_Used': i + 2} for i in range(500)]
+    with count_queries() as statements:
+        assert client.post('/usage/bulk', json=rows).status_code == 201
+    assert len([s for s in statements if s.startswith('INSERT INTO "Usage_Records"')]) == 1
+    # Every movement points at the usage row it was written for
+    movements = {m.Source_ID: -m.Quantity for m in StockMovements.query.filter_by(Reason='usage')}
+    assert movements == {u.Usage_ID: u.Quantity_Used for u in UsageRecords.query}
+
+
+def test_bulk_rejects_batch_with_per_row_errors(app, client):
+    add_supply()
+    rows = [
+        {'Supply_ID': 1, 'Quantity_Used': 2},
+        {'Supply_ID': 99, 'Quantity_Used': 2},
+        {'Quantity_Used': 'lots'},
+    ]
+    response = client.post('/usage/bulk', json=rows)
+    assert response.status_code == 400
+    errors = response.get_json()['errors']
+    assert [e['row'] for e in errors] == [1, 2]
+    assert "does not exist" in errors[0]['error']
+    assert "'Supply_ID' is required" in errors[1]['error']
+    assert UsageRecords.query.count() == 0
+
+
+def test_bulk_expenses_csv_upload(app, client):
+    body = 'Date,Category,Amount\n2025-04-01,Rent,1200\n2025-04-02,,35.5\n'
+    response = client.post('/expenses/bulk', data=body, content_type='text/csv')
+    assert response.status_code == 201
+    assert [e.Amount for e in Expenses.query.order_by(Expenses.Expense_ID)] == [1200.0, 35.5]
@@ -0,0 +1,77 @@
+import threading
+import time
+
+from cache import MemoryBackend, ResponseCache, MISSING
+from models import db, Supplies, StoreStock
+
+
+def test_memory_backend_lru_and_ttl():
+    backend = MemoryBackend(max_entries=2, ttl=60)
+    backend.set('a', 1, {'T'})
+    backend.set('b', 2, {'T'})
+    backend.get('a')
+    backend.set('c', 3, {'U'})
+    assert backend.get('b') is MISSING
+    assert backend.get('a') == 1
+
+    backend.invalidate(frozenset({'T'}))
+    assert backend.get('a') is MISSING
+    assert backend.get('c') == 3
+
+    expiring = MemoryBackend(ttl=0)
+    expiring.set('a', 1, set())
+    assert expiring.get('a') is MISSING
+
+
+def test_concurrent_misses_are_coalesced():
+    cache = ResponseCache()
+    cache.backend = MemoryBackend()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 'value'
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get_or_compute('k', {'T'}, compute)[0]))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert results == ['value'] * 8
+
+
+def test_dashboard_cached_until_write(app, client):
+    first = client.get('/dashboard/summary')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert client.get('/dashboard/summary').headers['X-Cache'] == 'HIT'
+
+    db.session.add(Supplies(Name='Milk'))
+    db.session.commit()
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 3})
+
+    refreshed = client.get('/dashboard/summary')
+    assert refreshed.headers['X-Cache'] == 'MISS'
+    assert refreshed.get_json()['low_stock_count'] == 1
+
+
+def test_unrelated_write_keeps_entry(app, client):
+    client.get('/analytics/spending-trends')
+    client.post('/supplies', json={'Name': 'Honey'})
+    assert client.get('/analytics/spending-trends').headers['X-Cache'] == 'HIT'
+    client.post('/expenses', json={'Amount': 5})
+    assert client.get('/analytics/spending-trends').headers['X-Cache'] == 'MISS'
+
+
+def test_bulk_write_invalidates(app, client):
+    db.session.add(Supplies(Name='Milk'))
+    db.session.add(StoreStock(Supply_ID=1, Quantity_Available=1))
+    db.session.commit()
+    assert client.get('/analytics/stock-alerts').get_json()[0]['Daily_Usage'] == 0.1
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 30}])
+    assert client.get('/analytics/stock-alerts').get_json()[0]['Daily_Usage'] == 1.0
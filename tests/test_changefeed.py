@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+from changefeed import change_feed
+from models import db, StoreStock, Supplies
+
+
+@pytest.fixture
+def feed(app, monkeypatch):
+    # Poll by hand instead of from the background thread
+    monkeypatch.setattr(change_feed, '_ensure_poller', lambda: None)
+    monkeypatch.setattr(change_feed, 'heartbeat', 0)
+    monkeypatch.setattr(change_feed, '_last_id', None)
+    yield change_feed
+
+
+def _events(chunks):
+    return [json.loads(c.split('data: ', 1)[1]) for c in chunks if c.startswith('id: ')]
+
+
+def test_writes_are_recorded_as_row_events(client, feed):
+    supply_id = client.post('/supplies', json={'Name': 'Milk'}).get_json()['Supply_ID']
+    stock_id = client.post('/stock', json={'Supply_ID': supply_id, 'Quantity_Available': 4}).get_json()['Stock_ID']
+    client.delete(f'/stock/{stock_id}')
+
+    body = client.get('/events?last_event_id=0&once=1').get_data(as_text=True)
+    events = _events(body.split('\n\n'))
+    assert [(e['table'], e['action'], e['row_id']) for e in events] == [
+        ('Supplies', 'created', supply_id),
+        ('Store_Stock', 'created', stock_id),
+        ('Store_Stock', 'deleted', stock_id),
+    ]
+    assert events[1]['row']['Quantity_Available'] == 4
+
+
+def test_resume_from_last_event_id(client, feed):
+    client.post('/supplies', json={'Name': 'Milk'})
+    client.post('/supplies', json={'Name': 'Tea'})
+    first = _events(client.get('/events?last_event_id=0&once=1').get_data(as_text=True).split('\n\n'))[0]
+
+    body = client.get('/events?once=1', headers={'Last-Event-ID': str(first['id'])}).get_data(as_text=True)
+    assert [e['row']['Name'] for e in _events(body.split('\n\n'))] == ['Tea']
+
+
+def test_live_events_reach_subscribers(app, feed):
+    with app.test_request_context():
+        stream = feed.stream(tables={'Store_Stock'})
+        assert next(stream).startswith('retry:')
+
+        db.session.add(Supplies(Name='Milk'))
+        db.session.commit()
+        db.session.add(StoreStock(Supply_ID=1, Quantity_Available=2))
+        db.session.commit()
+        feed.poll()
+
+        events = _events([next(stream)])
+        assert events[0]['table'] == 'Store_Stock'
+        assert next(stream) == ': keep-alive\n\n'
+        stream.close()
+    assert feed._subscribers == 0
+
+
+def test_bulk_inserts_produce_row_events(client, feed):
+    client.post('/supplies', json={'Name': 'Milk'})
+    client.post('/expenses/bulk', json=[{'Amount': 1}, {'Amount': 2}])
+    events = _events(client.get('/events?last_event_id=0&once=1').get_data(as_text=True).split('\n\n'))
+    assert [(e['table'], e['action'], e['row']['Amount']) for e in events[1:]] == [
+        ('Expenses', 'created', 1.0), ('Expenses', 'created', 2.0),
+    ]
+
+
+def test_streams_past_the_limit_are_refused(client, feed, monkeypatch):
+    monkeypatch.setattr(feed, 'max_subscribers', 2)
+    monkeypatch.setattr(feed, '_subscribers', 2)
+    response = client.get('/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    assert client.get('/events?last_event_id=0&once=1').status_code == 200
@@ -0,0 +1,45 @@
+from conftest import count_queries
+from models import db, Supplies, table_versions
+
+
+def test_list_answers_304_until_table_changes(app, client):
+    client.post('/supplies', json={'Name': 'Milk'})
+    first = client.get('/supplies')
+    etag = first.headers['ETag']
+
+    with count_queries() as statements:
+        cached = client.get('/supplies', headers={'If-None-Match': etag})
+    assert cached.status_code == 304
+    assert cached.headers['ETag'] == etag
+    assert len(statements) == 1
+    assert 'Table_Versions' in statements[0]
+
+    client.post('/supplies', json={'Name': 'Tea'})
+    changed = client.get('/supplies', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert len(changed.get_json()['items']) == 2
+
+
+def test_etag_depends_on_query_string(app, client):
+    assert client.get('/supplies?limit=1').headers['ETag'] != client.get('/supplies?limit=2').headers['ETag']
+
+
+def test_versions_bumped_by_orm_and_bulk_writes(app, client):
+    db.session.add(Supplies(Name='Milk'))
+    db.session.commit()
+    before = table_versions(['Supplies', 'Usage_Records', 'Usage_Daily', 'Expenses'])
+
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 1}])
+    after = table_versions(['Supplies', 'Usage_Records', 'Usage_Daily', 'Expenses'])
+    assert after['Usage_Records'] == before['Usage_Records'] + 1
+    assert after['Usage_Daily'] == before['Usage_Daily'] + 1
+    assert after['Supplies'] == before['Supplies']
+    assert after['Expenses'] == before['Expenses']
+
+
+def test_analytics_etag(app, client):
+    etag = client.get('/analytics/spending-trends').headers['ETag']
+    assert client.get('/analytics/spending-trends', headers={'If-None-Match': etag}).status_code == 304
+    client.post('/expenses', json={'Amount': 3})
+    assert client.get('/analytics/spending-trends', headers={'If-None-Match': etag}).status_code == 200
@@ -0,0 +1,49 @@
+import csv
+import io
+import json
+from datetime import date
+
+import exports
+from models import db, Supplies, UsageRecords, UsageRecordsArchive
+
+
+def seed_usage(rows):
+    db.session.add(Supplies(Name='Milk', Category='Dairy'))
+    db.session.flush()
+    db.session.add_all([
+        UsageRecords(Date=date(2025, 4, 1 + i % 28), Supply_ID=1, Quantity_Used=i, Location='Main Store')
+        for i in range(rows)
+    ])
+    db.session.commit()
+
+
+def test_ndjson_export_streams_in_chunks(app, client, monkeypatch):
+    monkeypatch.setattr(exports, 'EXPORT_CHUNK_SIZE', 10)
+    seed_usage(25)
+    response = client.get('/export/usage.ndjson')
+    assert response.is_streamed
+    chunks = list(response.response)
+    assert len(chunks) == 3
+    rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+    assert [r['Usage_ID'] for r in rows] == list(range(1, 26))
+    assert rows[0]['Supply_Name'] == 'Milk'
+
+
+def test_csv_export_applies_filters(app, client):
+    seed_usage(28)
+    response = client.get('/export/usage.csv?start_date=2025-04-20')
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert len(rows) == 9
+    assert all(r['Date'] >= '2025-04-20' for r in rows)
+
+
+def test_exports_include_archived_months(app, client):
+    seed_usage(3)
+    db.session.add(UsageRecordsArchive(Usage_ID=100, Date=date(2024, 1, 5), Supply_ID=1, Quantity_Used=9))
+    db.session.commit()
+    rows = [json.loads(line) for line in client.get('/export/usage.ndjson').get_data(as_text=True).splitlines()]
+    assert [r['Usage_ID'] for r in rows] == [100, 1, 2, 3]
+    assert rows[0]['Supply_Name'] == 'Milk'
+
+    response = client.get('/export/usage.csv?start_date=2025-01-01')
+    assert [r['Usage_ID'] for r in csv.DictReader(io.StringIO(response.get_data(as_text=True)))] == ['1', '2', '3']
@@ -0,0 +1,42 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from conftest import count_queries
+from forecast import exponential_smoothing
+from models import db, Supplies, StoreStock
+
+
+def test_exponential_smoothing_matches_recursion():
+    matrix = np.random.default_rng(7).uniform(0, 10, size=(4, 30))
+    alpha = 0.3
+    level = matrix[:, 0].copy()
+    for t in range(1, matrix.shape[1]):
+        level = alpha * matrix[:, t] + (1 - alpha) * level
+    assert np.allclose(exponential_smoothing(matrix, alpha), level)
+
+
+def test_forecast_endpoint(app, client):
+    db.session.add_all([Supplies(Name='Milk'), Supplies(Name='Tea')])
+    db.session.flush()
+    db.session.add(StoreStock(Supply_ID=1, Quantity_Available=120))
+    db.session.commit()
+    today = date.today()
+    client.post('/usage/bulk', json=[
+        {'Supply_ID': 1, 'Quantity_Used': 4, 'Date': (today - timedelta(days=d)).isoformat()}
+        for d in range(20)
+    ])
+
+    with count_queries() as statements:
+        data = client.get('/analytics/forecast?history_days=20&window=7').get_json()
+    assert len(statements) == 3
+
+    [milk] = data['forecasts']
+    assert milk['supply_name'] == 'Milk'
+    # 120 less the 80 used
+    assert milk['current_stock'] == 40.0
+    assert milk['moving_average'] == 4.0
+    assert abs(milk['smoothed_daily_usage'] - 4.0) < 1e-9
+    assert milk['days_until_stockout'] == 10
+    assert abs(milk['predicted_30day_need'] - 120.0) < 1e-9
+    assert milk['avg_daily_usage'] == 80 / 19
@@ -0,0 +1,92 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+import pytest
+
+from jobs import JOB_ENDPOINTS, job_runner
+from models import db, Expenses
+
+
+@pytest.fixture
+def runner(app, tmp_path, monkeypatch):
+    monkeypatch.setattr(job_runner, 'directory', str(tmp_path))
+    monkeypatch.setattr(job_runner, '_executor', ThreadPoolExecutor(max_workers=1))
+    yield job_runner
+    job_runner.join(timeout=5)
+    job_runner._executor.shutdown()
+
+
+@pytest.fixture
+def blocked(runner):
+    # Occupies the only job thread until set()
+    release = threading.Event()
+    runner._executor.submit(release.wait)
+    yield release
+    release.set()
+
+
+def test_job_result_matches_the_view(client, runner):
+    db.session.add(Expenses(Date=date(2024, 3, 5), Category='Rent', Amount=100))
+    db.session.commit()
+
+    response = client.post('/jobs', json={'path': '/analytics/spending-trends'})
+    assert response.status_code == 202
+    job_id = response.get_json()['id']
+    runner.join(timeout=5)
+
+    job = client.get(f'/jobs/{job_id}').get_json()
+    assert job['status'] == 'done'
+    result = client.get(job['result_url'])
+    assert result.status_code == 200
+    assert result.get_json() == client.get('/analytics/spending-trends').get_json()
+
+
+def test_export_job_with_params(client, runner):
+    db.session.add_all([Expenses(Date=date(2024, 3, d), Category='Rent', Amount=d) for d in (1, 2, 3)])
+    db.session.commit()
+
+    job_id = client.post('/jobs', json={
+        'path': '/export/expenses.csv', 'params': {'start_date': '2024-03-02'}
+    }).get_json()['id']
+    runner.join(timeout=5)
+
+    result = client.get(f'/jobs/{job_id}/result')
+    assert result.mimetype == 'text/csv'
+    assert len(result.get_data(as_text=True).strip().splitlines()) == 3
+    assert 'expenses.csv' in result.headers['Content-Disposition']
+
+
+def test_only_analytics_and_exports_run_as_jobs(client, runner):
+    assert client.post('/jobs', json={'path': '/supplies'}).status_code == 400
+    assert client.post('/jobs', json={'path': '/nope'}).status_code == 400
+    assert client.get('/jobs/0123456789abcdef0123456789abcdef').status_code == 404
+    assert client.get('/jobs/../../etc').status_code == 404
+
+
+def test_every_analytics_route_runs_as_a_job(app):
+    endpoints = {rule.endpoint for rule in app.url_map.iter_rules() if rule.rule.startswith('/analytics/')}
+    assert endpoints <= JOB_ENDPOINTS
+
+
+def test_queued_job_can_be_cancelled(client, runner, blocked):
+    job_id = client.post('/jobs', json={'path': '/analytics/forecast'}).get_json()['id']
+    assert client.get(f'/jobs/{job_id}/result').status_code == 409
+
+    response = client.delete(f'/jobs/{job_id}')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'cancelled'
+
+
+def test_queue_is_bounded(client, runner, blocked, monkeypatch):
+    monkeypatch.setattr(runner, 'max_pending', 1)
+    assert client.post('/jobs', json={'path': '/analytics/forecast'}).status_code == 202
+    assert client.post('/jobs', json={'path': '/analytics/forecast'}).status_code == 429
+
+
+def test_finished_jobs_expire(client, runner, monkeypatch):
+    monkeypatch.setattr(runner, 'result_ttl', -1)
+    job_id = client.post('/jobs', json={'path': '/analytics/expiring-soon'}).get_json()['id']
+    runner.join(timeout=5)
+    runner.purge_expired()
+    assert client.get(f'/jobs/{job_id}').status_code == 404
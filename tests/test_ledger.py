@@ -0,0 +1,171 @@
+import os
+import threading
+
+from flask import Flask
+
+from config import TestConfig
+from ledger import ledger_drift, reconcile_ledger
+from models import db, Locations, Supplies, Suppliers, StoreStock, StockMovements, SupplyLots
+from app import create_restock, create_usage
+
+
+def balances(supply_id):
+    db.session.expire_all()
+    stock = sum(s.Quantity_Available for s in StoreStock.query.filter_by(Supply_ID=supply_id))
+    return db.session.get(Supplies, supply_id).Total_Quantity, stock
+
+
+def test_writes_apply_movements_to_balances(app, client):
+    db.session.add(Suppliers(Name='Dairy Partners'))
+    db.session.commit()
+    client.post('/supplies', json={'Name': 'Milk', 'Total_Quantity': 100})
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 10})
+
+    usage = client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 3}).get_json()
+    assert balances(1) == (100, 7)
+    client.post('/orders', json={'Supplier_ID': 1, 'Supply_ID': 1, 'Quantity_Received': 20, 'Total_Cost': 40})
+    assert balances(1) == (120, 7)
+    client.post('/restocks', json={'Supply_ID': 1, 'Quantity_Requested': 5})
+    assert balances(1) == (115, 12)
+    client.post('/restocks', json={'Supply_ID': 1, 'Quantity_Requested': 4, 'Request_Type': 'Purchase from Supplier'})
+    assert balances(1) == (115, 16)
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 1}] * 3)
+    assert balances(1) == (115, 13)
+    client.delete(f"/usage/{usage['Usage_ID']}")
+    assert balances(1) == (115, 16)
+
+    assert ledger_drift() == []
+    movements = client.get('/stock/movements?supply_id=1&limit=50').get_json()['items']
+    assert [m['Reason'] for m in movements][:3] == ['opening', 'opening', 'usage']
+    assert len(movements) == 11
+
+
+def test_restock_without_store_row_creates_one(app, client):
+    client.post('/supplies', json={'Name': 'Milk'})
+    client.post('/restocks', json={'Supply_ID': 1, 'Quantity_Requested': 6, 'Request_Type': 'Purchase from Supplier'})
+    assert balances(1) == (0, 6)
+    assert StoreStock.query.count() == 1
+    assert ledger_drift() == []
+
+
+def test_usage_without_store_row_is_drift_until_counted(app, client):
+    client.post('/supplies', json={'Name': 'Milk'})
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 2})
+    assert StoreStock.query.count() == 0
+    assert ledger_drift() == [{'Supply_ID': 1, 'Balance': 'store', 'Location_ID': None, 'expected': -2, 'actual': 0}]
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 10})
+    assert balances(1) == (0, 10)
+    assert ledger_drift() == []
+
+
+def test_reconcile_records_adjustments(app):
+    db.session.add(Supplies(Name='Milk', Total_Quantity=40))
+    db.session.commit()
+    assert ledger_drift() == [{'Supply_ID': 1, 'Balance': 'inventory', 'Location_ID': None, 'expected': 0, 'actual': 40}]
+    assert reconcile_ledger() == 1
+    assert ledger_drift() == []
+    assert StockMovements.query.one().Reason == 'adjustment'
+
+
+# ---------- Concurrency ----------
+# Many tills post usage for the same supply at once, each request on its own
+# connection. No update may be lost: the final balance, ledger and lot must be
+# exact. On the default SQLite file, writers take turns on the database lock,
+# so this checks the bookkeeping only; the lot row locks are exercised when
+# STRESS_DATABASE_URL points at a MySQL database.
+THREADS = 8
+REQUESTS_PER_THREAD = 25
+
+
+class StressConfig(TestConfig):
+    SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+
+
+def make_stress_app(tmp_path):
+    url = os.getenv('STRESS_DATABASE_URL')
+    stress_app = Flask(__name__)
+    stress_app.config.from_object(StressConfig)
+    stress_app.config['SQLALCHEMY_DATABASE_URI'] = url or f"sqlite:///{tmp_path / 'stress.db'}"
+    if url:
+        stress_app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {'pool_size': THREADS}
+    db.init_app(stress_app)
+    with stress_app.app_context():
+        db.drop_all()
+        db.create_all()
+    return stress_app
+
+
+# Runs `view` REQUESTS_PER_THREAD times on each of THREADS threads at once,
+# returning the exceptions raised
+def run_concurrently(stress_app, view, path, json):
+    errors = []
+    start = threading.Barrier(THREADS)
+
+    def till():
+        start.wait()
+        for _ in range(REQUESTS_PER_THREAD):
+            with stress_app.test_request_context(path, method='POST', json=json):
+                try:
+                    view()
+                except Exception as e:
+                    db.session.rollback()
+                    errors.append(e)
+                finally:
+                    db.session.remove()
+
+    threads = [threading.Thread(target=till) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return errors
+
+
+def test_concurrent_usage_loses_no_updates(tmp_path):
+    stress_app = make_stress_app(tmp_path)
+    with stress_app.app_context():
+        db.session.add(Supplies(Name='Milk', Total_Quantity=0))
+        db.session.add(StoreStock(Supply_ID=1, Quantity_Available=10000))
+        db.session.add(SupplyLots(Supply_ID=1, Quantity_Received=10000, Quantity_Remaining=10000, Is_Open=True))
+        db.session.commit()
+
+    errors = run_concurrently(stress_app, create_usage, '/usage', {'Supply_ID': 1, 'Quantity_Used': 2})
+
+    with stress_app.app_context():
+        try:
+            assert errors == []
+            total = THREADS * REQUESTS_PER_THREAD
+            assert StoreStock.query.one().Quantity_Available == 10000 - 2 * total
+            assert StockMovements.query.filter_by(Reason='usage', Lot_ID=1).count() == total
+            assert SupplyLots.query.one().Quantity_Remaining == 10000 - 2 * total
+        finally:
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+
+# The first deliveries of a supply race to create its Store_Stock row: each
+# pair must end up with exactly one row, unassigned stock included
+def test_concurrent_first_writes_create_one_row(tmp_path):
+    stress_app = make_stress_app(tmp_path)
+    with stress_app.app_context():
+        db.session.add(Supplies(Name='Milk', Total_Quantity=0))
+        db.session.add(Locations(Name='Main Store'))
+        db.session.commit()
+
+    errors = []
+    for location_id in (None, 1):
+        errors += run_concurrently(stress_app, create_restock, '/restocks', {
+            'Supply_ID': 1, 'Location_ID': location_id, 'Quantity_Requested': 1, 'Request_Type': 'Purchase from Supplier'
+        })
+
+    with stress_app.app_context():
+        try:
+            assert errors == []
+            total = THREADS * REQUESTS_PER_THREAD
+            assert sorted((s.Location_ID or 0, s.Quantity_Available) for s in StoreStock.query.all()) == [(0, total), (1, total)]
+            assert ledger_drift() == []
+        finally:
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
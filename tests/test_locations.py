@@ -0,0 +1,74 @@
+from datetime import date
+
+from ledger import ledger_drift
+from models import db, Supplies, StoreStock, UsageRecords
+
+
+def stock_by_location():
+    db.session.expire_all()
+    return sorted(((s.Location_ID, s.Quantity_Available) for s in StoreStock.query.all()), key=lambda r: r[0] or 0)
+
+
+def test_stock_moves_per_location(app, client):
+    client.post('/supplies', json={'Name': 'Milk', 'Category': 'Dairy', 'Total_Quantity': 100})
+    main = client.post('/locations', json={'Name': 'Main Store'}).get_json()['Location_ID']
+    branch = client.post('/locations', json={'Name': 'Branch A'}).get_json()['Location_ID']
+    assert client.post('/locations', json={'Name': 'Main Store'}).status_code == 400
+
+    client.post('/stock', json={'Supply_ID': 1, 'Location_ID': main, 'Quantity_Available': 20})
+    assert client.post('/stock', json={'Supply_ID': 1, 'Location_ID': main, 'Quantity_Available': 5}).status_code == 409
+    client.post('/restocks', json={'Supply_ID': 1, 'Location_ID': branch, 'Quantity_Requested': 8})
+    assert stock_by_location() == [(main, 20), (branch, 8)]
+
+    # By name or by id; an unknown name stays free text on the unassigned row
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 3, 'Location': 'Main Store'})
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 2, 'Location_ID': branch})
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 1, 'Location': 'Branch A'}])
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 1, 'Location': 'Food truck'})
+    # Usage at a location without a stock row moves no balance, only the ledger
+    assert stock_by_location() == [(main, 17), (branch, 5)]
+    assert sorted((u.Location, u.Location_ID) for u in UsageRecords.query.all()) == [
+        ('Branch A', branch), ('Branch A', branch), ('Food truck', None), ('Main Store', main)
+    ]
+    assert client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 1, 'Location_ID': 99}).status_code == 400
+    assert ledger_drift() == [{'Supply_ID': 1, 'Balance': 'store', 'Location_ID': None, 'expected': -1, 'actual': 0}]
+
+    # Counting stock in creates the missing row, or adopts the one the ledger
+    # created when the restock arrived, and settles the ledger on the count
+    assert client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 4}).status_code == 201
+    adopted = client.post('/stock', json={'Supply_ID': 1, 'Location_ID': branch, 'Quantity_Available': 7})
+    assert (adopted.status_code, adopted.get_json()['Quantity_Available']) == (201, 7)
+    assert client.post('/stock', json={'Supply_ID': 1, 'Location_ID': branch, 'Quantity_Available': 7}).status_code == 409
+    assert stock_by_location() == [(None, 4), (main, 17), (branch, 7)]
+    assert ledger_drift() == []
+
+    items = client.get('/stock?location=Branch%20A').get_json()['items']
+    assert [(i['Location_ID'], i['Quantity_Available']) for i in items] == [(branch, 7)]
+
+
+def test_analytics_take_a_location_scope(app, client):
+    db.session.add(Supplies(Name='Milk', Category='Dairy'))
+    db.session.commit()
+    for name in ('Main Store', 'Branch A'):
+        client.post('/locations', json={'Name': name})
+    client.post('/stock', json={'Supply_ID': 1, 'Location_ID': 1, 'Quantity_Available': 50})
+    client.post('/stock', json={'Supply_ID': 1, 'Location_ID': 2, 'Quantity_Available': 9})
+    today = date.today().isoformat()
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 30, 'Location': 'Main Store', 'Date': today})
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 3, 'Location': 'Branch A', 'Date': today})
+
+    alerts = client.get('/analytics/stock-alerts?location=Branch%20A').get_json()
+    assert [(a['Current_Stock'], a['Daily_Usage']) for a in alerts] == [(6.0, 0.1)]
+    assert client.get('/analytics/stock-alerts?location=Main%20Store').get_json() == []
+    # Unscoped, each location's row is set against that location's usage only
+    alerts = client.get('/analytics/stock-alerts?threshold=25').get_json()
+    assert [(a['Location'], a['Current_Stock'], a['Daily_Usage']) for a in alerts] == [
+        ('Main Store', 20.0, 1.0), ('Branch A', 6.0, 0.1)
+    ]
+
+    [milk] = client.get('/analytics/forecast?location=Main%20Store').get_json()['forecasts']
+    assert (milk['current_stock'], milk['smoothed_daily_usage'] > 0) == (20.0, True)
+
+    summary = client.get('/dashboard/summary?location=Branch%20A').get_json()
+    assert summary['low_stock_count'] == 1
+    assert summary['top_supplies'] == [{'id': 1, 'name': 'Milk', 'quantity_used': 3.0}]
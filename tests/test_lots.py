@@ -0,0 +1,97 @@
+from datetime import date, timedelta
+
+import lots as lots_module
+from conftest import count_queries
+from ledger import ledger_drift
+from models import db, Suppliers, SupplyLots, StockMovements
+
+
+def lots():
+    db.session.expire_all()
+    return [(l.Lot_ID, l.Quantity_Remaining, l.Is_Open) for l in SupplyLots.query.order_by(SupplyLots.Lot_ID)]
+
+
+def usage_lots(usage_id):
+    movements = StockMovements.query.filter_by(Source_ID=usage_id, Reason='usage')
+    return sorted(((m.Lot_ID, m.Quantity) for m in movements), key=lambda m: m[0] or 0)
+
+
+def test_usage_consumes_lots_first_expired_first_out(app, client):
+    today = date.today()
+    db.session.add(Suppliers(Name='Dairy Partners'))
+    db.session.commit()
+    order = {'Supplier_ID': 1, 'Supply_ID': 1, 'Quantity_Received': 5, 'Total_Cost': 10}
+    # Lot 1: opening stock, lot 2: a delivery expiring first, lot 3: the supply's expiry
+    client.post('/supplies', json={'Name': 'Milk', 'Total_Quantity': 10,
+                                   'Expiry_Date': (today + timedelta(days=20)).isoformat()})
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 30})
+    client.post('/orders', json={**order, 'Expiry_Date': (today + timedelta(days=5)).isoformat()})
+    client.post('/orders/bulk', json=[order])
+    assert [l.Expiry_Date for l in SupplyLots.query.order_by(SupplyLots.Lot_ID)] == [
+        today + timedelta(days=20), today + timedelta(days=5), today + timedelta(days=20)
+    ]
+
+    first = client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 7}).get_json()
+    assert usage_lots(first['Usage_ID']) == [(1, -2), (2, -5)]
+    assert lots() == [(1, 8, True), (2, 0, False), (3, 5, True)]
+
+    second = client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 15}).get_json()
+    assert usage_lots(second['Usage_ID']) == [(None, -2), (1, -8), (3, -5)]
+    assert lots() == [(1, 0, False), (2, 0, False), (3, 0, False)]
+
+    # Deleting usage gives its units back to the lots they came from
+    client.delete(f"/usage/{first['Usage_ID']}")
+    assert lots() == [(1, 2, True), (2, 5, True), (3, 0, False)]
+    assert ledger_drift() == []
+
+    expiring = client.get('/analytics/expiring-soon?days=10').get_json()
+    assert [(i['Lot_ID'], i['current_stock']) for i in expiring] == [(2, 5)]
+    assert client.get('/lots?supply_id=1&fields=Lot_ID,Quantity_Remaining').get_json()['items'] == [
+        {'Lot_ID': 1, 'Quantity_Remaining': 2}, {'Lot_ID': 2, 'Quantity_Remaining': 5},
+        {'Lot_ID': 3, 'Quantity_Remaining': 0},
+    ]
+
+    # Lots of a deleted order go with it
+    client.delete('/orders/1')
+    assert [l[0] for l in lots()] == [1, 3]
+
+
+def test_bulk_rows_delete_like_single_ones(app, client):
+    db.session.add(Suppliers(Name='Dairy Partners'))
+    db.session.commit()
+    client.post('/supplies', json={'Name': 'Milk'})
+    client.post('/stock', json={'Supply_ID': 1, 'Quantity_Available': 10})
+    order = {'Supplier_ID': 1, 'Supply_ID': 1, 'Quantity_Received': 5, 'Total_Cost': 10}
+    client.post('/orders/bulk', json=[order, order])
+    assert [(l.Lot_ID, l.Order_ID) for l in SupplyLots.query.order_by(SupplyLots.Lot_ID)] == [(1, 1), (2, 2)]
+
+    client.post('/usage/bulk', json=[{'Supply_ID': 1, 'Quantity_Used': 3}, {'Supply_ID': 1, 'Quantity_Used': 4}])
+    assert usage_lots(1) == [(1, -3)] and usage_lots(2) == [(1, -2), (2, -2)]
+
+    # Deleted bulk usage returns its units to its lots; a deleted bulk order takes its lot
+    client.delete('/usage/2')
+    assert lots() == [(1, 2, True), (2, 5, True)]
+    client.delete('/orders/2')
+    assert lots() == [(1, 2, True)]
+    assert ledger_drift() == []
+
+
+def test_usage_locks_only_the_lots_it_reaches(app, client, monkeypatch):
+    monkeypatch.setattr(lots_module, 'LOT_LOCK_BATCH', 2)
+    today = date.today()
+    client.post('/supplies', json={'Name': 'Milk'})
+    db.session.add_all([SupplyLots(Supply_ID=1, Quantity_Received=2, Quantity_Remaining=2, Is_Open=True,
+                                   Expiry_Date=None if days is None else today + timedelta(days=days))
+                        for days in (None, 9, 3, 6, 12, 1)])
+    db.session.commit()
+
+    with count_queries() as statements:
+        client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 3})
+    reads = [s for s in statements if s.startswith('SELECT') and 'FROM "Supply_Lots"' in s and 'ORDER BY' in s]
+    assert len(reads) == 1 and 'LIMIT' in reads[0]
+    assert usage_lots(1) == [(3, -1), (6, -2)]
+
+    # Past every dated lot, page by page, to the undated one last
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 8})
+    assert usage_lots(2) == [(1, -1), (2, -2), (3, -1), (4, -2), (5, -2)]
+    assert lots() == [(1, 1, True), (2, 0, False), (3, 0, False), (4, 0, False), (5, 0, False), (6, 0, False)]
@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+
+from metrics import Histogram, metrics
+
+
+def _sample(body, line_prefix):
+    return [line for line in body.splitlines() if line.startswith(line_prefix)]
+
+
+def test_requests_are_recorded_per_endpoint(client):
+    client.get('/supplies')
+    body = client.get('/metrics').get_data(as_text=True)
+
+    assert 'greatea_http_requests_total{endpoint="get_supplies",method="GET",status="200"}' in body
+    # Table_Versions lookup plus the list query
+    assert _sample(body, 'greatea_db_statements_per_request_bucket{endpoint="get_supplies",le="2"}')
+    assert _sample(body, 'greatea_http_response_size_bytes_count{endpoint="get_supplies"}')
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('h', 'help', ('endpoint',), buckets=(1, 5))
+    for value in (0.5, 1, 3, 10):
+        histogram.observe(value, 'x')
+    lines = histogram.render()
+    assert 'h_bucket{endpoint="x",le="1"} 2' in lines
+    assert 'h_bucket{endpoint="x",le="5"} 3' in lines
+    assert 'h_bucket{endpoint="x",le="+Inf"} 4' in lines
+    assert 'h_count{endpoint="x"} 4' in lines
+
+
+def test_slow_queries_are_logged(client, caplog, monkeypatch):
+    monkeypatch.setattr(metrics, 'slow_query_seconds', 0)
+    with caplog.at_level(logging.WARNING, logger='greatea.slow_query'):
+        client.get('/supplies')
+    assert any('Slow query' in r.getMessage() and 'get_supplies' in r.getMessage() for r in caplog.records)
+    body = client.get('/metrics').get_data(as_text=True)
+    assert _sample(body, 'greatea_db_slow_queries_total{endpoint="get_supplies"}')
+
+
+def test_unhandled_exceptions_count_as_errors(app, client, monkeypatch):
+    def broken():
+        raise RuntimeError('boom')
+    monkeypatch.setitem(app.view_functions, 'api.get_suppliers', broken)
+    monkeypatch.setitem(app.config, 'PROPAGATE_EXCEPTIONS', False)
+    assert client.get('/suppliers').status_code == 500
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'greatea_http_requests_total{endpoint="get_suppliers",method="GET",status="500"} 1' in body
+
+
+def test_samples_of_other_workers_are_added(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, 'directory', str(tmp_path))
+    metrics.reset()
+    other = {'greatea_http_requests_total': [[['get_supplies', 'GET', '200'], 4]]}
+    (tmp_path / '1.json').write_text(json.dumps(other))
+    client.get('/supplies')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'greatea_http_requests_total{endpoint="get_supplies",method="GET",status="200"} 5' in body
+    assert (tmp_path / f'{os.getpid()}.json').exists()
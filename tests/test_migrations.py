@@ -0,0 +1,93 @@
+import importlib
+
+import pytest
+from sqlalchemy import inspect
+
+from migrate import available_migrations, schema_drift, schema_migrations, upgrade
+from models import db
+from query_plans import full_scans
+from seed import seed
+
+
+@pytest.fixture
+def empty_db(app):
+    db.drop_all()
+    yield app
+    schema_migrations.drop(db.engine, checkfirst=True)
+
+
+def test_migrations_build_the_models_schema(empty_db):
+    assert upgrade(db.engine) == [revision for revision, _ in available_migrations()]
+    assert upgrade(db.engine) == []
+    with db.engine.connect() as connection:
+        assert schema_drift(connection, db.metadata) == []
+        versions = set(connection.exec_driver_sql('SELECT Table_Name FROM Table_Versions').scalars())
+    assert versions == {t.name for t in db.metadata.sorted_tables} - {'Table_Versions'}
+
+
+def test_drift_reports_missing_indexes(empty_db):
+    with db.engine.begin() as connection:
+        importlib.import_module('migrations.0001_baseline').upgrade(connection)
+        drift = schema_drift(connection, db.metadata)
+    assert 'missing index Usage_Records.ix_usage_records_supply_date' in drift
+
+
+def test_duplicate_stock_rows_are_merged(empty_db):
+    with db.engine.begin() as connection:
+        for revision, module in available_migrations():
+            if revision < '0010':
+                module.upgrade(connection)
+        connection.exec_driver_sql("INSERT INTO Supplies (Name) VALUES ('Milk'), ('Tea')")
+        connection.exec_driver_sql("INSERT INTO Locations (Name) VALUES ('Main Store')")
+        connection.exec_driver_sql(
+            "INSERT INTO Store_Stock (Supply_ID, Location_ID, Quantity_Available) "
+            "VALUES (1, 1, 2), (1, 1, 3), (1, NULL, 1), (1, NULL, 4), (2, 1, 5)"
+        )
+        importlib.import_module('migrations.0010_unique_store_stock').upgrade(connection)
+        rows = connection.exec_driver_sql(
+            'SELECT Stock_ID, Supply_ID, Location_ID, Quantity_Available FROM Store_Stock ORDER BY Stock_ID'
+        ).all()
+    assert rows == [(1, 1, 1, 5.0), (3, 1, None, 5.0), (5, 2, 1, 5.0)]
+
+
+def test_sqlite_tables_are_rebuilt_with_foreign_keys(empty_db):
+    with db.engine.begin() as connection:
+        for revision, module in available_migrations():
+            module.upgrade(connection)
+            if revision == '0004':
+                connection.exec_driver_sql("INSERT INTO Supplies (Name) VALUES ('Milk')")
+                connection.exec_driver_sql('INSERT INTO Store_Stock (Supply_ID, Quantity_Available) VALUES (1, 7)')
+        foreign_keys = {(fk['constrained_columns'][0], fk['referred_table'], fk['options'].get('ondelete'))
+                        for fk in inspect(connection).get_foreign_keys('Store_Stock')}
+        assert ('Location_ID', 'Locations', 'SET NULL') in foreign_keys
+        assert schema_drift(connection, db.metadata) == []
+
+        connection.exec_driver_sql("INSERT INTO Locations (Name) VALUES ('Campus')")
+        connection.exec_driver_sql('UPDATE Store_Stock SET Location_ID = 1')
+        connection.exec_driver_sql('DELETE FROM Locations')
+        rows = connection.exec_driver_sql('SELECT Supply_ID, Location_ID, Quantity_Available FROM Store_Stock').all()
+    assert rows == [(1, None, 7.0)]
+
+
+def test_filtered_queries_use_indexes(empty_db):
+    upgrade(db.engine)
+    assert full_scans(empty_db) == []
+
+
+def test_filtered_queries_use_indexes_on_seeded_data(empty_db):
+    upgrade(db.engine)
+    seed({'suppliers': 3, 'supplies': 10, 'stock': 20, 'orders': 50,
+          'usage': 500, 'expenses': 50, 'restocks': 20, 'purchases': 50}, years=1, random_seed=7)
+    # Seeding logs whole-table events, which /sync answers with the table's rows
+    assert full_scans(empty_db) == []
+
+
+def test_plan_check_flags_unindexed_filters(empty_db):
+    # Every migration but the hot path indexes
+    with db.engine.begin() as connection:
+        for revision, module in available_migrations():
+            if revision != '0002':
+                module.upgrade(connection)
+    scanned = {(p['url'].split('?')[0], p['table']) for p in full_scans(empty_db)}
+    assert ('/usage', 'Usage_Records') in scanned
+    assert ('/expenses', 'Expenses') in scanned
@@ -0,0 +1,32 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import insert, update
+
+from models import db, Expenses, StoreStock
+from pagination import QueryParamError, decode_cursor, encode_cursor
+
+
+def walk(client, url):
+    ids, cursor = [], None
+    while True:
+        page = client.get(url + (f'&cursor={cursor}' if cursor else '')).get_json()
+        ids += [e['Expense_ID'] for e in page['items']]
+        cursor = page['next_cursor']
+        if not cursor:
+            return ids
+
+
+def test_pages_include_null_dates(app, client):
+    db.session.execute(insert(Expenses), [{'Date': date(2025, 1, d), 'Amount': 1} for d in (2, 3, 1, 3, 2)])
+    db.session.execute(update(Expenses).where(Expenses.Date == date(2025, 1, 3)).values(Date=None))
+    db.session.commit()
+    assert walk(client, '/expenses?limit=2') == [2, 4, 3, 1, 5]
+    assert walk(client, '/expenses?limit=2&order=desc') == [5, 1, 3, 4, 2]
+
+
+def test_tampered_cursor_is_rejected(app, client):
+    assert client.get(f"/stock?cursor={encode_cursor(['1; DROP TABLE'])}").status_code == 400
+    columns = [StoreStock.Last_Updated, StoreStock.Stock_ID]
+    with pytest.raises(QueryParamError):
+        decode_cursor(encode_cursor(['not a time', 1]), columns)
@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+
+import pytest
+
+from conftest import count_queries
+from models import db, Supplies, Suppliers, SupplyOrders, UsageDaily, RestockRequests, StoreStock, StockMovements
+
+
+def seed_usage(supply_id, daily):
+    today = date.today()
+    db.session.add_all([
+        UsageDaily(Day=today - timedelta(days=i), Supply_ID=supply_id, Location='', Quantity_Used=q, Record_Count=1)
+        for i, q in enumerate(daily) if q
+    ])
+
+
+@pytest.fixture
+def stocked(app):
+    db.session.add_all([
+        Suppliers(Name='Slow Farms', Lead_Time=10),
+        Suppliers(Name='Dairy Partners', Lead_Time=4),
+        Supplies(Name='Milk', Total_Quantity=5),
+        Supplies(Name='Tea', Total_Quantity=500),
+        Supplies(Name='Syrup', Total_Quantity=0),
+    ])
+    db.session.flush()
+    # Milk was last ordered from Dairy Partners; Syrup was never ordered
+    db.session.add_all([
+        SupplyOrders(Supplier_ID=1, Supply_ID=1, Quantity_Received=10, Total_Cost=10),
+        SupplyOrders(Supplier_ID=2, Supply_ID=1, Quantity_Received=10, Total_Cost=10),
+        SupplyOrders(Supplier_ID=1, Supply_ID=2, Quantity_Received=10, Total_Cost=10),
+    ])
+    seed_usage(1, [2] * 30)
+    seed_usage(2, [1] * 30)
+    seed_usage(3, [0, 4] * 15)
+    db.session.commit()
+
+
+def test_reorder_plan(stocked, client):
+    with count_queries() as statements:
+        data = client.get('/analytics/reorder-plan').get_json()
+    assert len(statements) == 3
+    plan = {p['supply_name']: p for p in data['plan']}
+    assert [p['supply_name'] for p in data['plan']] == ['Syrup', 'Milk']
+
+    milk = plan['Milk']
+    assert (milk['supplier_name'], milk['lead_time_days'], milk['safety_stock']) == ('Dairy Partners', 4, 0)
+    assert (milk['reorder_point'], milk['order_quantity'], milk['days_of_cover']) == (8, 17, 2.5)
+
+    # std 2 over a default 7-day lead time at 95% service: 1.645 * 2 * sqrt(7)
+    syrup = plan['Syrup']
+    assert syrup['supplier_id'] is None and syrup['lead_time_days'] == 7
+    assert syrup['safety_stock'] == pytest.approx(8.704, abs=1e-3)
+    assert syrup['order_quantity'] == 37
+
+    looser = client.get('/analytics/reorder-plan?service_level=0.5&review_days=0').get_json()['plan']
+    assert [(p['supply_name'], p['order_quantity']) for p in looser] == [('Syrup', 14), ('Milk', 3)]
+    assert client.get('/analytics/reorder-plan?service_level=2').status_code == 400
+
+
+def test_planned_restocks_are_written_in_one_transaction(stocked, client):
+    response = client.post('/restocks/plan')
+    assert response.status_code == 201
+    assert response.get_json()['created'] == 2
+    requests = RestockRequests.query.order_by(RestockRequests.Request_ID).all()
+    assert [(r.Supply_ID, r.Quantity_Requested, r.Request_Type, r.Status) for r in requests] == [
+        (3, 37, 'Purchase from Supplier', 'Open'), (1, 17, 'Purchase from Supplier', 'Open')
+    ]
+    # Nothing has arrived yet, but the open requests are scheduled receipts,
+    # so nothing is left to order
+    assert StoreStock.query.count() == 0 and StockMovements.query.count() == 0
+    assert client.get('/analytics/reorder-plan').get_json()['plan'] == []
+    assert client.post('/restocks/plan').get_json()['created'] == 0
+    assert client.get('/dashboard/summary').get_json()['pending_restocks'] == 2
+
+    # Receiving one moves its stock, recorded against the request
+    milk = requests[1].Request_ID
+    assert client.post(f'/restocks/{milk}/receive').get_json()['Status'] == 'Received'
+    assert [(m.Source_ID, m.Quantity) for m in StockMovements.query] == [(milk, 17)]
+    assert StoreStock.query.one().Quantity_Available == 17
+    assert client.post(f'/restocks/{milk}/receive').status_code == 409
+    assert client.get('/analytics/reorder-plan').get_json()['plan'] == []
+
+    # Deleting an open request moves nothing back
+    client.delete(f'/restocks/{requests[0].Request_ID}')
+    assert StockMovements.query.count() == 1
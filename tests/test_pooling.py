@@ -0,0 +1,49 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, exc
+from sqlalchemy.pool import StaticPool
+
+from models import db, Expenses, SpendMonthly
+from pooling import TimedQueuePool, pool_status
+
+
+@pytest.fixture
+def replica(app):
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    db.metadata.create_all(engine)
+    db.engines['replica'] = engine
+    yield engine
+    db.session.remove()
+    del db.engines['replica']
+    engine.dispose()
+
+
+def test_analytics_read_from_replica(app, client, replica):
+    with replica.begin() as connection:
+        connection.execute(Expenses.__table__.insert(), [{'Date': date(2025, 4, 1), 'Category': 'Rent', 'Amount': 900}])
+        connection.execute(SpendMonthly.__table__.insert(), [{'Month': date(2025, 4, 1), 'Source': 'expenses',
+                                                              'Category': 'Rent', 'Amount': 900, 'Record_Count': 1}])
+    client.post('/expenses', json={'Date': '2025-04-01', 'Category': 'Utilities', 'Amount': 50})
+
+    trends = client.get('/analytics/spending-trends').get_json()
+    assert trends['categories'] == ['Rent']
+    items = client.get('/expenses').get_json()['items']
+    assert [e['Category'] for e in items] == ['Utilities']
+    assert db.session.info['use_replica'] is False
+
+
+def test_timed_pool_records_waits_and_timeouts(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/pool.db', poolclass=TimedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    held = engine.connect()
+    with pytest.raises(exc.TimeoutError):
+        engine.connect()
+    held.close()
+
+    status = pool_status({None: engine})['default']
+    assert status['checkouts'] == 2
+    assert status['checkout_timeouts'] == 1
+    assert status['checkout_wait_max_ms'] >= 50
+    assert status['size'] == 1
+    engine.dispose()
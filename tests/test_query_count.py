@@ -0,0 +1,50 @@
+from datetime import date
+
+import pytest
+
+from conftest import count_queries
+from models import db, Supplies, Suppliers, UsageRecords, SupplyOrders, StoreStock, RestockRequests
+
+
+def seed(rows):
+    supplier = Suppliers(Name='Dairy Partners')
+    db.session.add(supplier)
+    supplies = [Supplies(Name=f'Supply {i}', Category='Dairy') for i in range(rows)]
+    db.session.add_all(supplies)
+    db.session.flush()
+    for i, supply in enumerate(supplies):
+        db.session.add_all([
+            UsageRecords(Date=date(2025, 4, 1), Supply_ID=supply.Supply_ID, Quantity_Used=i, Location='Main Store'),
+            SupplyOrders(Date=date(2025, 4, 1), Supplier_ID=supplier.Supplier_ID, Supply_ID=supply.Supply_ID,
+                         Quantity_Received=10, Total_Cost=25),
+            StoreStock(Supply_ID=supply.Supply_ID, Quantity_Available=5),
+            RestockRequests(Date=date(2025, 4, 1), Supply_ID=supply.Supply_ID, Quantity_Requested=3,
+                            Request_Type='Transfer from Inventory'),
+        ])
+    db.session.commit()
+    db.session.expunge_all()
+
+
+# 'core' selects the response columns directly; 'orm' builds model instances
+# through their serialization_options() joinedloads
+@pytest.mark.parametrize('serializer', ['core', 'orm'])
+@pytest.mark.parametrize('endpoint', ['usage', 'orders', 'stock', 'restocks'])
+def test_list_query_count_is_independent_of_row_count(app, client, monkeypatch, endpoint, serializer):
+    monkeypatch.setitem(app.config, 'LIST_SERIALIZER', serializer)
+    counts = []
+    for rows in (3, 30):
+        seed(rows)
+        with count_queries() as statements:
+            response = client.get(f'/{endpoint}?limit=500')
+        assert response.status_code == 200
+        items = response.get_json()['items']
+        assert all(item['Supply_Name'] for item in items)
+        counts.append(len(statements))
+    # The Table_Versions lookup for the ETag plus the joined list query
+    assert counts[0] == counts[1] == 2
+
+
+def test_orders_include_supplier_name(app, client):
+    seed(2)
+    items = client.get('/orders').get_json()['items']
+    assert {item['Supplier_Name'] for item in items} == {'Dairy Partners'}
@@ -0,0 +1,47 @@
+from datetime import date, timedelta
+
+from models import db, Supplies, UsageDaily
+from rollups import rebuild_usage_rollup
+
+
+def rollup_rows():
+    return sorted(
+        (r.Day, r.Supply_ID, r.Location, r.Quantity_Used, r.Record_Count)
+        for r in UsageDaily.query.all()
+    )
+
+
+def test_usage_writes_maintain_rollup(app, client):
+    db.session.add_all([Supplies(Name='Milk'), Supplies(Name='Tea')])
+    db.session.commit()
+    today = date.today().isoformat()
+
+    client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 4, 'Date': today, 'Location': 'Main Store'})
+    second = client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 6, 'Date': today, 'Location': 'Main Store'})
+    client.post('/usage/bulk', json=[
+        {'Supply_ID': 2, 'Quantity_Used': 1, 'Date': today},
+        {'Supply_ID': 2, 'Quantity_Used': 2, 'Date': today},
+        {'Supply_ID': 1, 'Quantity_Used': 3, 'Date': today, 'Location': 'Branch A'},
+    ])
+    client.delete(f"/usage/{second.get_json()['Usage_ID']}")
+
+    incremental = rollup_rows()
+    assert incremental == [
+        (date.today(), 1, 'Branch A', 3.0, 1),
+        (date.today(), 1, 'Main Store', 4.0, 1),
+        (date.today(), 2, '', 3.0, 2),
+    ]
+    rebuild_usage_rollup()
+    assert rollup_rows() == incremental
+
+    top = client.get('/dashboard/summary').get_json()['top_supplies']
+    assert [(s['name'], s['quantity_used']) for s in top] == [('Milk', 7.0), ('Tea', 3.0)]
+
+
+def test_rollup_row_removed_when_last_record_deleted(app, client):
+    db.session.add(Supplies(Name='Milk'))
+    db.session.commit()
+    day = (date.today() - timedelta(days=3)).isoformat()
+    created = client.post('/usage', json={'Supply_ID': 1, 'Quantity_Used': 5, 'Date': day}).get_json()
+    client.delete(f"/usage/{created['Usage_ID']}")
+    assert rollup_rows() == []
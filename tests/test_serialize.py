@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from bench import compare_serializers
+from seed import seed
+from test_bench import VOLUMES
+
+LISTS = ['/supplies', '/suppliers', '/locations', '/expenses', '/usage', '/orders', '/stock',
+         '/restocks', '/purchases', '/stock/movements', '/archive/usage', '/archive/expenses']
+
+
+@pytest.fixture
+def serializer(app):
+    yield lambda name: app.config.update(LIST_SERIALIZER=name)
+    app.config['LIST_SERIALIZER'] = 'core'
+
+
+def test_plain_rows_match_to_dict(app, client, serializer):
+    seed(VOLUMES, years=1, random_seed=3)
+    for url in LISTS:
+        for query in ('?limit=50', '?limit=7&order=desc&category=Tea', '?limit=5&fields=Supply_ID'):
+            if 'Supply_ID' in query and url in ('/suppliers', '/locations', '/expenses', '/purchases', '/archive/expenses'):
+                continue
+            serializer('orm')
+            expected = client.get(url + query)
+            serializer('core')
+            actual = client.get(url + query)
+            assert actual.status_code == expected.status_code == 200, url + query
+            assert json.loads(actual.data) == json.loads(expected.data), url + query
+
+
+def test_fields_projection(app, client):
+    seed(VOLUMES, years=1, random_seed=3)
+    page = client.get('/orders?limit=3&fields=Order_ID,Supplier_Name').get_json()
+    assert [sorted(item) for item in page['items']] == [['Order_ID', 'Supplier_Name']] * 3
+    following = client.get(f"/orders?limit=3&fields=Order_ID&cursor={page['next_cursor']}").get_json()
+    assert following['items'][0]['Order_ID'] > page['items'][-1]['Order_ID']
+
+    response = client.get('/usage?fields=Usage_ID,Cost')
+    assert response.status_code == 400
+    assert 'Cost' in response.get_json()['error']
+
+
+def test_compare_serializers(app):
+    seed(VOLUMES, years=1, random_seed=3)
+    results = compare_serializers(app, requests=1, warmup=0)
+    assert 'GET /usage?limit=500' in results
+    for name, r in results.items():
+        assert r['orm']['status'] == r['core']['status'] == [200], name
+        assert r['core']['queries'] <= r['orm']['queries'], name
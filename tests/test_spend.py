@@ -0,0 +1,90 @@
+from datetime import date
+
+from sqlalchemy import update
+
+from models import db, Expenses, Supplies, Suppliers, SpendMonthly
+from spend import rebuild_spend_cube, freeze_spend_months
+
+
+def cube_rows():
+    return [(r.Month, r.Source, r.Category, r.Supplier_ID, r.Amount, r.Record_Count)
+            for r in SpendMonthly.query.order_by(SpendMonthly.Month, SpendMonthly.Source, SpendMonthly.Category,
+                                                 SpendMonthly.Supplier_ID)]
+
+
+def add_spend(client):
+    db.session.add_all([Suppliers(Name='Dairy Partners'), Supplies(Name='Milk', Category='Dairy')])
+    db.session.commit()
+    client.post('/expenses/bulk', json=[
+        {'Date': '2025-03-05', 'Category': 'Rent', 'Amount': 1000},
+        {'Date': '2025-04-02', 'Amount': 15},
+    ])
+    client.post('/orders', json={'Date': '2025-03-10', 'Supplier_ID': 1, 'Supply_ID': 1,
+                                 'Quantity_Received': 5, 'Total_Cost': 40})
+    client.post('/orders/bulk', json=[{'Date': '2025-03-20', 'Supplier_ID': 1, 'Supply_ID': 1,
+                                       'Quantity_Received': 5, 'Total_Cost': 60}])
+    client.post('/purchases', json={'Date': '2025-04-11', 'Item_Name': 'Honey', 'Cost': 12, 'Category': 'Sweeteners'})
+
+
+def test_writes_keep_the_cube_in_step(app, client):
+    add_spend(client)
+    rows = cube_rows()
+    assert rows == [
+        (date(2025, 3, 1), 'expenses', 'Rent', 0, 1000.0, 1),
+        (date(2025, 3, 1), 'orders', 'Dairy', 1, 100.0, 2),
+        (date(2025, 4, 1), 'expenses', '', 0, 15.0, 1),
+        (date(2025, 4, 1), 'purchases', 'Sweeteners', 0, 12.0, 1),
+    ]
+    rebuild_spend_cube()
+    assert cube_rows() == rows
+
+    data = client.get('/analytics/spend?group_by=month,source&source=orders,purchases').get_json()
+    assert data['rows'] == [
+        {'month': '2025-03', 'source': 'orders', 'total': 100.0, 'count': 2},
+        {'month': '2025-04', 'source': 'purchases', 'total': 12.0, 'count': 1},
+    ]
+    assert data['total'] == 112.0
+    data = client.get('/analytics/spend?group_by=supplier,category&start_month=2025-03&end_month=2025-03').get_json()
+    assert data['rows'] == [
+        {'supplier_id': None, 'supplier_name': None, 'category': 'Rent', 'total': 1000.0, 'count': 1},
+        {'supplier_id': 1, 'supplier_name': 'Dairy Partners', 'category': 'Dairy', 'total': 100.0, 'count': 2},
+    ]
+    assert client.get('/analytics/spend?group_by=week').status_code == 400
+    assert client.get('/analytics/spend?start_month=2025-3-1').status_code == 400
+
+    # Single, bulk and cascading deletes back their rows out
+    client.delete('/purchases/1')
+    client.delete('/expenses/bulk?category=Rent')
+    client.delete('/suppliers/1')
+    assert cube_rows() == [(date(2025, 4, 1), 'expenses', '', 0, 15.0, 1)]
+
+
+def test_rebuild_refreshes_cached_trends(app, client):
+    add_spend(client)
+    assert client.get('/analytics/spending-trends').get_json()['trends'][0]['Rent'] == 1000.0
+    # A write the cube missed, put right by a rebuild
+    with db.engine.begin() as connection:
+        connection.execute(update(Expenses.__table__).values(Amount=Expenses.Amount * 2))
+    rebuild_spend_cube()
+    assert client.get('/analytics/spending-trends').get_json()['trends'][0]['Rent'] == 2000.0
+
+
+def test_frozen_months_do_not_change(app, client):
+    add_spend(client)
+    assert freeze_spend_months(date(2025, 4, 1)) == 2
+    assert client.get('/analytics/spend').get_json()['frozen_through'] == '2025-03'
+
+    response = client.post('/expenses', json={'Date': '2025-03-31', 'Amount': 5})
+    assert response.status_code == 400
+    assert 'closed' in response.get_json()['error']
+    assert client.post('/expenses/bulk', json=[{'Date': '2025-02-01', 'Amount': 5}]).status_code == 400
+    assert client.post('/expenses', json={'Date': '2025-04-30', 'Amount': 5}).status_code == 201
+
+    client.delete('/orders/1')
+    rebuild_spend_cube()
+    march = client.get('/analytics/spend?group_by=source&end_month=2025-03').get_json()['rows']
+    assert march == [
+        {'source': 'expenses', 'total': 1000.0, 'count': 1},
+        {'source': 'orders', 'total': 100.0, 'count': 2},
+    ]
+    assert client.get('/analytics/spend?start_month=2025-04').get_json()['total'] == 32.0
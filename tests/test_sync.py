@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta
+
+from models import db, ChangeEvents
+from sync import sync, sync_cursor
+
+
+def _sync(client, since=None, **params):
+    if since is not None:
+        params['since'] = since
+    response = client.get('/sync', query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_snapshot_then_deltas_with_tombstones(client, app):
+    supply_id = client.post('/supplies', json={'Name': 'Milk'}).get_json()['Supply_ID']
+    snapshot = _sync(client)
+    assert snapshot['reset'] and not snapshot['more']
+    assert [s['Name'] for s in snapshot['tables']['Supplies']['rows']] == ['Milk']
+    assert snapshot['tables']['Store_Stock'] == {'rows': [], 'deleted': [], 'complete': True}
+
+    kept = client.post('/stock', json={'Supply_ID': supply_id, 'Quantity_Available': 4}).get_json()['Stock_ID']
+    location_id = client.post('/locations', json={'Name': 'Campus'}).get_json()['Location_ID']
+    gone = client.post('/stock', json={'Supply_ID': supply_id, 'Location_ID': location_id,
+                                       'Quantity_Available': 1}).get_json()['Stock_ID']
+    client.delete(f'/stock/{gone}')
+
+    delta = _sync(client, snapshot['token'])
+    assert not delta['reset']
+    stock = delta['tables']['Store_Stock']
+    assert [(s['Stock_ID'], s['Quantity_Available']) for s in stock['rows']] == [(kept, 4)]
+    assert stock['deleted'] == [gone] and not stock['complete']
+    assert 'Suppliers' not in delta['tables']
+
+    assert _sync(client, delta['token'])['tables'] == {}
+    # ?tables= limits the response
+    assert set(_sync(client, snapshot['token'], tables='Store_Stock')['tables']) == {'Store_Stock'}
+
+
+def test_whole_tables_are_sent_a_page_at_a_time(client, app):
+    for name in ('Milk', 'Tea', 'Honey'):
+        client.post('/supplies', json={'Name': name})
+    for name in ('Dairy Partners', 'Tea Co'):
+        client.post('/suppliers', json={'Name': name})
+    tables = ['Supplies', 'Suppliers']
+
+    first = sync(None, tables, max_rows=2)
+    assert first['reset'] and first['more']
+    assert list(first['tables']) == ['Supplies'] and first['tables']['Supplies']['complete']
+    assert [s['Name'] for s in first['tables']['Supplies']['rows']] == ['Milk', 'Tea']
+
+    second = sync(first['token'], tables, sync_cursor(first['cursor']), max_rows=2)
+    assert not second['reset'] and second['more'] and second['token'] == first['token']
+    assert [s['Name'] for s in second['tables']['Supplies']['rows']] == ['Honey']
+    assert not second['tables']['Supplies']['complete']
+    assert second['tables']['Suppliers']['complete']
+
+    third = sync(first['token'], tables, sync_cursor(second['cursor']), max_rows=2)
+    assert [s['Name'] for s in third['tables']['Suppliers']['rows']] == ['Tea Co']
+    assert third['cursor'] is None and not third['more']
+    assert client.get(f"/sync?since={first['token']}&cursor=nope").status_code == 400
+
+
+def test_cascades_return_whole_tables(client, app):
+    supply_id = client.post('/supplies', json={'Name': 'Milk'}).get_json()['Supply_ID']
+    client.post('/usage/bulk', json=[{'Supply_ID': supply_id, 'Quantity_Used': 1}])
+    token = _sync(client)['token']
+
+    client.delete(f'/supplies/{supply_id}')
+    delta = _sync(client, token)
+    assert delta['tables']['Supplies'] == {'rows': [], 'deleted': [supply_id], 'complete': False}
+    assert delta['tables']['Usage_Records'] == {'rows': [], 'deleted': [], 'complete': True}
+
+
+def test_bulk_inserts_sync_only_their_rows(client, app):
+    supply_id = client.post('/supplies', json={'Name': 'Milk'}).get_json()['Supply_ID']
+    client.post('/usage/bulk', json=[{'Supply_ID': supply_id, 'Quantity_Used': 1}] * 3)
+    token = _sync(client)['token']
+
+    client.post('/usage/bulk', json=[{'Supply_ID': supply_id, 'Quantity_Used': 2}])
+    client.post('/expenses/bulk', json=[{'Amount': 5}])
+    delta = _sync(client, token)
+    assert [u['Quantity_Used'] for u in delta['tables']['Usage_Records']['rows']] == [2.0]
+    assert [e['Amount'] for e in delta['tables']['Expenses']['rows']] == [5.0]
+    assert not any(t['complete'] for t in delta['tables'].values())
+
+
+def test_usage_syncs_the_stock_and_lots_it_changed(client, app):
+    supply_id = client.post('/supplies', json={'Name': 'Milk', 'Total_Quantity': 10}).get_json()['Supply_ID']
+    other_id = client.post('/supplies', json={'Name': 'Tea', 'Total_Quantity': 5}).get_json()['Supply_ID']
+    stock_id = client.post('/stock', json={'Supply_ID': supply_id, 'Quantity_Available': 4}).get_json()['Stock_ID']
+    client.post('/stock', json={'Supply_ID': other_id, 'Quantity_Available': 6})
+    token = _sync(client)['token']
+
+    usage_id = client.post('/usage', json={'Supply_ID': supply_id, 'Quantity_Used': 3}).get_json()['Usage_ID']
+    delta = _sync(client, token)
+    assert [(s['Stock_ID'], s['Quantity_Available']) for s in delta['tables']['Store_Stock']['rows']] == [(stock_id, 1)]
+    assert [(l['Supply_ID'], l['Quantity_Remaining']) for l in delta['tables']['Supply_Lots']['rows']] == [(supply_id, 7)]
+    assert [u['Usage_ID'] for u in delta['tables']['Usage_Records']['rows']] == [usage_id]
+    assert not any(t['complete'] for t in delta['tables'].values())
+
+    # A restock to a location without a stock row creates one, synced as a row too
+    location_id = client.post('/locations', json={'Name': 'Campus'}).get_json()['Location_ID']
+    client.post('/restocks', json={'Supply_ID': other_id, 'Quantity_Requested': 2, 'Location_ID': location_id,
+                                   'Request_Type': 'Purchase from Supplier'})
+    stock = _sync(client, delta['token'])['tables']['Store_Stock']
+    assert [(s['Location_ID'], s['Quantity_Available']) for s in stock['rows']] == [(location_id, 2)]
+    assert not stock['complete']
+
+
+def test_token_stops_before_events_that_may_still_commit(client, app):
+    now = datetime.now()
+    db.session.add_all([
+        ChangeEvents(Event_ID=1, Created_At=now - timedelta(minutes=5), Table_Name='Suppliers', Action='changed'),
+        # 2 was rolled back long ago; 4 may be a transaction still committing
+        ChangeEvents(Event_ID=3, Created_At=now - timedelta(minutes=5), Table_Name='Suppliers', Action='changed'),
+        ChangeEvents(Event_ID=5, Created_At=now, Table_Name='Suppliers', Action='changed'),
+    ])
+    db.session.commit()
+
+    assert _sync(client)['token'] == 3
+    assert _sync(client, 1)['token'] == 3
+    assert _sync(client, 3)['tables'] == {}
+
+    # Events after the token were pruned: start over from a snapshot
+    assert _sync(client, 0)['reset'] is False
+    db.session.query(ChangeEvents).filter(ChangeEvents.Event_ID < 3).delete()
+    db.session.commit()
+    assert _sync(client, 0)['reset'] is True
+    assert client.get('/sync?tables=Nope').status_code == 400
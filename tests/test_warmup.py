@@ -0,0 +1,13 @@
+from models import db, Supplies
+from warmup import warm_up
+
+
+def test_warm_up_primes_the_hot_reads(app, client):
+    db.session.add(Supplies(Name='Milk', Total_Quantity=5))
+    db.session.commit()
+
+    assert warm_up(app) == []
+    # The warm-up requests are not reported as traffic
+    assert 'get_spending_trends' not in client.get('/metrics').get_data(as_text=True)
+    assert client.get('/analytics/spending-trends').headers['X-Cache'] == 'HIT'
+    assert client.get('/dashboard/summary').headers['X-Cache'] == 'HIT'
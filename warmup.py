@@ -0,0 +1,61 @@
+import logging
+import time
+
+from sqlalchemy.orm import configure_mappers
+
+from models import db
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Hot reads requested once at startup. Each one configures the mappers it
+# uses, compiles its statements into the engine's compiled cache and, for the
+# cached analytics views, primes the response cache.
+WARMUP_URLS = [
+    '/dashboard/summary',
+    '/analytics/expiring-soon',
+    '/analytics/stock-alerts',
+    '/analytics/spending-trends',
+    '/analytics/spend?group_by=month,source',
+    '/analytics/forecast',
+    '/analytics/reorder-plan',
+    '/supplies',
+    '/usage',
+    '/orders',
+    '/stock',
+    '/restocks',
+    '/lots',
+]
+
+
+# Runs in the gunicorn master before it forks (preload_app), so every worker
+# starts with the mappers built, the statements compiled and the cache primed.
+# A URL that fails is logged and skipped; warm-up never stops startup.
+# Returns the URLs that did not answer 200.
+def warm_up(app, urls=WARMUP_URLS):
+    started = time.perf_counter()
+    configure_mappers()
+    client = app.test_client()
+    failed = []
+    for url in urls:
+        try:
+            status = client.get(url).status_code
+        except Exception:
+            logger.exception('Warm-up request %s failed', url)
+            status = None
+        if status != 200:
+            failed.append(url)
+    # The warm-up requests are not traffic
+    metrics.reset()
+    logger.info('Warmed up %d of %d URLs in %.0f ms', len(urls) - len(failed), len(urls),
+                (time.perf_counter() - started) * 1000)
+    return failed
+
+
+# Empties the connection pools of every engine. The master calls it before
+# forking; a forked worker calls it with close=False, dropping the inherited
+# connections without closing sockets the parent may still be using.
+def dispose_engines(app, close=True):
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=close)
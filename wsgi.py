@@ -0,0 +1,9 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+from app import create_app
+from warmup import warm_up, dispose_engines
+
+app = create_app()
+if app.config['WARM_UP']:
+    warm_up(app)
+# The master serves no requests; its workers open their own connections
+dispose_engines(app)